@@ -0,0 +1,157 @@
+"""Fingerprinted, precompressed static assets for the SPA.
+
+At startup every file in ``static_dir`` (except ``index.html``) is copied to
+``asset_build_dir`` as ``<stem>.<hash><suffix>`` together with ``.gz`` and,
+when the optional ``brotli`` package is installed, ``.br`` variants.
+``index.html`` is rewritten to reference the fingerprinted names and kept in
+memory. Fingerprinted files never change, so they are served as immutable.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from .cache import IMMUTABLE_CACHE, if_none_match, make_etag
+from .settings import settings
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are produced without it
+    brotli = None
+
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map"}
+# Preference order when the client accepts several encodings.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+@dataclass
+class Asset:
+    path: Path
+    media_type: str
+    variants: dict[str, Path] = field(default_factory=dict)
+
+
+@dataclass
+class IndexPage:
+    etag: str
+    bodies: dict[str, bytes]
+
+
+@dataclass
+class AssetManifest:
+    assets: dict[str, Asset] = field(default_factory=dict)
+    names: dict[str, str] = field(default_factory=dict)
+    index: Optional[IndexPage] = None
+
+
+manifest = AssetManifest()
+
+
+def _compress(data: bytes) -> dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def _write_atomic(path: Path, data: bytes):
+    # Several workers may build at once; they produce identical bytes.
+    if path.exists():
+        return
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_name, path)
+
+
+def build(static_dir: Path = None, build_dir: Path = None) -> AssetManifest:
+    static_dir = static_dir or settings.static_dir
+    build_dir = build_dir or settings.asset_build_dir
+    build_dir.mkdir(parents=True, exist_ok=True)
+    result = AssetManifest()
+    suffixes = dict(ENCODINGS)
+
+    for source in sorted(static_dir.iterdir()):
+        if not source.is_file() or source.name == "index.html":
+            continue
+        data = source.read_bytes()
+        name = f"{source.stem}.{hashlib.sha256(data).hexdigest()[:12]}{source.suffix}"
+        target = build_dir / name
+        _write_atomic(target, data)
+        asset = Asset(path=target, media_type=mimetypes.guess_type(source.name)[0] or "application/octet-stream")
+        if source.suffix in COMPRESSIBLE:
+            for encoding, body in _compress(data).items():
+                variant = build_dir / (name + suffixes[encoding])
+                _write_atomic(variant, body)
+                asset.variants[encoding] = variant
+        result.assets[name] = asset
+        result.names[source.name] = name
+
+    index_path = static_dir / "index.html"
+    if index_path.exists():
+        html = index_path.read_text(encoding="utf-8")
+        for original, fingerprinted in result.names.items():
+            html = html.replace(f"/static/{original}", f"/static/{fingerprinted}")
+        body = html.encode("utf-8")
+        result.index = IndexPage(etag=make_etag(body), bodies={"identity": body, **_compress(body)})
+
+    manifest.assets, manifest.names, manifest.index = result.assets, result.names, result.index
+    return manifest
+
+
+def negotiate(request: Request, available) -> str:
+    accepted = request.headers.get("accept-encoding", "")
+    tokens = {part.split(";")[0].strip().lower() for part in accepted.split(",")}
+    for encoding, _ in ENCODINGS:
+        if encoding in tokens and encoding in available:
+            return encoding
+    return "identity"
+
+
+def index_response(request: Request) -> Optional[Response]:
+    index = manifest.index
+    if index is None:
+        return None
+    headers = {"ETag": index.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if if_none_match(request.headers.get("if-none-match"), index.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate(request, index.bodies)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(index.bodies[encoding], media_type="text/html", headers=headers)
+
+
+def asset_response(request: Request, name: str) -> Optional[Response]:
+    """Serve a fingerprinted asset, or ``None`` when ``name`` is not one."""
+    asset = manifest.assets.get(name)
+    if asset is None:
+        return None
+    etag = f'"{name}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE, "Vary": "Accept-Encoding"}
+    if if_none_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate(request, asset.variants)
+    if encoding == "identity":
+        return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    return FileResponse(asset.variants[encoding], media_type=asset.media_type, headers=headers)
+
+
+def static_response(request: Request, name: str) -> Response:
+    """``/static/<name>``: fingerprinted assets, otherwise the plain file with revalidation."""
+    response = asset_response(request, name)
+    if response is not None:
+        return response
+    root = settings.static_dir.resolve()
+    path = (root / name).resolve()
+    if root not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(path, headers={"Cache-Control": "no-cache"})
@@ -1,19 +1,39 @@
+import asyncio
+import hashlib
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import models, schemas
-from .db import get_db
+from .cache import TTLCache
+from .db import get_async_db
+from .ratelimit import SlidingWindowLimiter
 from .settings import settings
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+ROLE_ORDER = {models.Role.viewer: 0, models.Role.editor: 1, models.Role.admin: 2}
+
+# token -> schemas.UserOut; see get_current_user.
+principal_cache = TTLCache(maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl)
+
+# pbkdf2 runs in OpenSSL with the GIL released, so a thread pool keeps it off the event loop.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="pwhash")
+_hash_queue_depth = 0
+
+login_ip_limiter = SlidingWindowLimiter(settings.login_attempts_per_ip, settings.login_window_seconds)
+login_user_limiter = SlidingWindowLimiter(settings.login_attempts_per_user, settings.login_window_seconds)
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -23,15 +43,63 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
-    user = db.query(models.User).filter(models.User.username == username).first()
+def hash_queue_depth() -> int:
+    """Password hash jobs submitted to the executor and not finished yet."""
+    return _hash_queue_depth
+
+
+async def _run_hash_job(fn, *args):
+    global _hash_queue_depth
+    if _hash_queue_depth >= settings.password_hash_queue_limit:
+        raise HTTPException(status_code=503, detail="Login service busy", headers={"Retry-After": "1"})
+    _hash_queue_depth += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_queue_depth -= 1
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password) -> str:
+    return await _run_hash_job(get_password_hash, password)
+
+
+async def get_user(db: AsyncSession, username: str) -> Optional[models.User]:
+    return (await db.execute(select(models.User).where(models.User.username == username))).scalar_one_or_none()
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[models.User]:
+    user = await get_user(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
 
+def password_fingerprint(hashed_password: str) -> str:
+    """Short digest of the stored hash, so a password change invalidates older tokens."""
+    return hashlib.sha256(hashed_password.encode()).hexdigest()[:16]
+
+
+def token_claims(user: models.User) -> dict:
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role.value,
+        "name": user.full_name or "",
+        "pwd": password_fingerprint(user.hashed_password),
+    }
+
+
+def invalidate_user(username: str):
+    """Drop cached principals of ``username`` after its role or password changed."""
+    principal_cache.discard_where(lambda principal: principal.username == username)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
@@ -40,7 +108,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> models.User:
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> schemas.UserOut:
+    """Resolve the bearer token to its user.
+
+    Verified tokens are cached for ``token_cache_ttl`` seconds, so repeated
+    requests cost no query. On a miss the claims are checked against the user
+    row: a changed role or password makes the token invalid.
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,27 +133,70 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    user = await get_user(db, token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+    if payload.get("role", user.role.value) != user.role.value:
+        raise credentials_exception
+    if payload.get("pwd", password_fingerprint(user.hashed_password)) != password_fingerprint(user.hashed_password):
+        raise credentials_exception
+    principal = schemas.UserOut.model_validate(user)
+    principal_cache.put(token, principal, ttl=payload["exp"] - time.time())
+    return principal
 
 
 def require_role(required: models.Role):
-    def _role(user: models.User = Depends(get_current_user)):
-        order = {models.Role.viewer: 0, models.Role.editor: 1, models.Role.admin: 2}
-        if order[user.role] < order[required]:
+    async def _role(user: schemas.UserOut = Depends(get_current_user)):
+        if ROLE_ORDER[user.role] < ROLE_ORDER[required]:
             raise HTTPException(status_code=403, detail="Forbidden")
         return user
 
     return _role
 
 
+def _login_keys(request: Request, username: str):
+    client = request.client.host if request.client else "unknown"
+    return ((login_ip_limiter, client), (login_user_limiter, username.lower()))
+
+
+def throttle_login(request: Request, username: str):
+    """Refuse with 429 once the client address or the account exceeds its budget of failed attempts.
+
+    The attempt is counted up front, so parallel guesses cannot overrun the
+    budget; ``release_login_attempt`` takes it back when no password check
+    failed. Only the limiters that counted it are charged when one refuses.
+    """
+    counted = []
+    for limiter, key in _login_keys(request, username):
+        retry_after = limiter.hit(key)
+        if retry_after is not None:
+            for hit_limiter, hit_key in counted:
+                hit_limiter.release(hit_key)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+        counted.append((limiter, key))
+
+
+def release_login_attempt(request: Request, username: str):
+    for limiter, key in _login_keys(request, username):
+        limiter.release(key)
+
+
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    throttle_login(request, form_data.username)
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except Exception:
+        # No password was checked (e.g. 503 from a full hash queue), so the attempt does not count.
+        release_login_attempt(request, form_data.username)
+        raise
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user.username})
+    release_login_attempt(request, form_data.username)
+    access_token = create_access_token(data=token_claims(user))
     return {"access_token": access_token, "token_type": "bearer", "role": user.role, "full_name": user.full_name}
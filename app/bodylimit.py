@@ -0,0 +1,44 @@
+"""Request body size limit.
+
+FastAPI parses a multipart form in full, spooling files to disk, before the
+endpoint runs, so the endpoint cannot refuse an oversize upload in time.
+This middleware answers 413 at once when Content-Length is over the limit,
+and stops a body without one as soon as the bytes received pass it.
+"""
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .settings import settings
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, max_size: int | None = None):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        max_size = settings.max_upload_size if self.max_size is None else self.max_size
+        length = Headers(scope=scope).get("content-length", "")
+        if length.isdigit() and int(length) > max_size:
+            await JSONResponse({"detail": "File too large"}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_size:
+                    # FastAPI re-raises HTTPException from body parsing, so this becomes a 413 response.
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
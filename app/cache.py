@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+
+from pydantic import BaseModel
+
+from . import metrics
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    version: int
+    body: bytes
+    etag: str
+    # Recent change log rows when built: a row committed late under an older id changes it, not the version.
+    recent: int = 0
+
+
+def make_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header matches ``etag`` (weak comparison, RFC 9110)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+
+class TreeCache:
+    """Serialized tree views (the full TreeResponse, the company summary) shared by all requests of this process.
+
+    Entries are keyed by the object change log version, so a write made by any
+    worker is picked up on the next read. Write paths of this process also call
+    ``invalidate`` to drop the entries for changes the log does not track.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entries: dict[str, CachedResponse] = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries = {}
+
+    def get(self, version: int, build: Callable[[], BaseModel], view: str = "tree", recent: int = 0) -> CachedResponse:
+        entry = self._entries.get(view)
+        if entry is not None and (entry.version, entry.recent) == (version, recent):
+            return entry
+        generation = self._generation
+        body = metrics.dump_json(build()).encode()
+        entry = CachedResponse(version=version, body=body, etag=make_etag(body), recent=recent)
+        with self._lock:
+            # A write that landed while we were building makes this body stale.
+            current = self._entries.get(view)
+            if self._generation == generation and (current is None or current.version <= version):
+                self._entries[view] = entry
+        return entry
+
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate: Callable[[Any], bool]):
+        with self._lock:
+            for key in [k for k, (_, value) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+tree_cache = TreeCache()
@@ -0,0 +1,71 @@
+"""Gzip for JSON API responses.
+
+Starlette's GZipMiddleware compresses every response type, which would break
+byte ranges on downloads and precompressed static files. This one touches only
+``application/json`` bodies that do not already carry a Content-Encoding.
+A body sent in one message is compressed if it has at least ``minimum_size``
+bytes; a streamed body is always compressed, chunk by chunk, so it stays
+streamed and is never held in memory whole.
+"""
+
+import gzip
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class JSONGZipMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        compressor = None
+        passthrough = False
+
+        async def wrapped_send(message: Message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith("application/json") and "content-encoding" not in headers:
+                    start = message
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    if len(body) >= self.minimum_size:
+                        body = gzip.compress(body, compresslevel=self.compresslevel)
+                        headers["Content-Encoding"] = "gzip"
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                # wbits=31: a gzip header and trailer around the deflate stream.
+                compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+                headers["Content-Encoding"] = "gzip"
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                await send(start)
+            body = compressor.compress(body)
+            if not more_body:
+                body += compressor.flush()
+            if body or not more_body:
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, wrapped_send)
@@ -1,78 +1,709 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from typing import List
-from datetime import datetime
-
-from . import models, schemas
-
-
-def get_tree(db: Session) -> schemas.TreeResponse:
-    companies_resp = []
-    companies = db.execute(select(models.Company)).scalars().all()
-    for company in companies:
-        dcs_resp = []
-        for dc in company.datacenters:
-            services = [
-                schemas.TreeNode(id=o.id, name=o.name, type=o.type, status=o.status, ip=o.ip)
-                for o in dc.objects
-                if o.type == models.ObjectType.service
-            ]
-            servers = [
-                schemas.TreeNode(id=o.id, name=o.name, type=o.type, status=o.status, ip=o.ip)
-                for o in dc.objects
-                if o.type == models.ObjectType.server
-            ]
-            network = [
-                schemas.TreeNode(id=o.id, name=o.name, type=o.type, status=o.status, ip=o.ip)
-                for o in dc.objects
-                if o.type == models.ObjectType.network
-            ]
-            dcs_resp.append(
-                schemas.TreeDatacenter(
-                    id=dc.id, name=dc.name, services=services, servers=servers, network=network
-                )
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import JSON, delete, func, insert, literal, or_, select, tuple_
+from typing import Iterator, List
+from datetime import datetime, timedelta
+import base64
+import json
+
+from . import events, models, patching, render, revisions, schemas, search
+from .cache import CachedResponse, tree_cache
+from .db import SessionLocal
+from .graph import relation_graph
+from .settings import settings
+
+
+_TREE_GROUPS = {
+    models.ObjectType.service: "services",
+    models.ObjectType.server: "servers",
+    models.ObjectType.network: "network",
+}
+
+
+_TREE_FIELDS = ("dc_id", "type", "name", "status", "ip")
+
+
+def get_tree_version(db: Session) -> int:
+    """The id of the newest change log row: every write that changes the tree, in any process, logs one."""
+    return db.execute(select(func.max(models.ObjectChange.id))).scalar() or 0
+
+
+def _overlap_start() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.tree_change_overlap_seconds)
+
+
+def _tree_state(db: Session) -> tuple[int, int]:
+    """The tree version and the number of change log rows inside the overlap window.
+
+    Ids are handed out before commit, so a row can commit after a newer one;
+    the version stays put then, but the count moves.
+    """
+    recent = select(func.count()).where(models.ObjectChange.created_at >= _overlap_start())
+    version, count = db.execute(
+        select(select(func.max(models.ObjectChange.id)).scalar_subquery(), recent.scalar_subquery())
+    ).one()
+    return version or 0, count
+
+
+def get_tree(db: Session, version: int | None = None) -> schemas.TreeResponse:
+    if version is None:
+        version = get_tree_version(db)
+    # One column-only outer join instead of lazy-loading company.datacenters and
+    # dc.objects; rows arrive ordered so companies and DCs can be grouped in one pass.
+    rows = db.execute(
+        select(
+            models.Company.id,
+            models.Company.name,
+            models.Datacenter.id,
+            models.Datacenter.name,
+            models.Object.id,
+            models.Object.name,
+            models.Object.type,
+            models.Object.status,
+            models.Object.ip,
+        )
+        .select_from(models.Company)
+        .outerjoin(models.Datacenter, models.Datacenter.company_id == models.Company.id)
+        .outerjoin(models.Object, models.Object.dc_id == models.Datacenter.id)
+        .order_by(models.Company.id, models.Datacenter.id, models.Object.id)
+    ).all()
+
+    companies = []
+    company = dc = None
+    for company_id, company_name, dc_id, dc_name, obj_id, obj_name, obj_type, obj_status, obj_ip in rows:
+        if company is None or company["id"] != company_id:
+            company = {"id": company_id, "name": company_name, "dcs": []}
+            companies.append(company)
+            dc = None
+        if dc_id is None:
+            continue
+        if dc is None or dc["id"] != dc_id:
+            dc = {"id": dc_id, "name": dc_name, "services": [], "servers": [], "network": []}
+            company["dcs"].append(dc)
+        if obj_id is None:
+            continue
+        dc[_TREE_GROUPS[obj_type]].append(
+            {"id": obj_id, "name": obj_name, "type": obj_type, "status": obj_status, "ip": obj_ip}
+        )
+    return schemas.TreeResponse.model_validate({"version": version, "companies": companies})
+
+
+def get_cached_tree(db: Session) -> CachedResponse:
+    version, recent = _tree_state(db)
+    return tree_cache.get(version, lambda: get_tree(db, version), recent=recent)
+
+
+def get_company_summaries(db: Session) -> schemas.CompanySummaries:
+    """Companies with their DCs and per-group object counts, without the nodes."""
+    rows = db.execute(
+        select(
+            models.Company.id,
+            models.Company.name,
+            models.Datacenter.id,
+            models.Datacenter.name,
+            models.Object.type,
+            func.count(models.Object.id),
+        )
+        .select_from(models.Company)
+        .outerjoin(models.Datacenter, models.Datacenter.company_id == models.Company.id)
+        .outerjoin(models.Object, models.Object.dc_id == models.Datacenter.id)
+        .group_by(models.Company.id, models.Company.name, models.Datacenter.id, models.Datacenter.name, models.Object.type)
+        .order_by(models.Company.id, models.Datacenter.id)
+    ).all()
+
+    companies = []
+    company = dc = None
+    for company_id, company_name, dc_id, dc_name, obj_type, count in rows:
+        if company is None or company["id"] != company_id:
+            company = {"id": company_id, "name": company_name, "dcs": []}
+            companies.append(company)
+            dc = None
+        if dc_id is None:
+            continue
+        if dc is None or dc["id"] != dc_id:
+            dc = {"id": dc_id, "name": dc_name}
+            company["dcs"].append(dc)
+        if obj_type is not None:
+            dc[_TREE_GROUPS[obj_type]] = count
+    return schemas.CompanySummaries.model_validate(companies)
+
+
+def get_cached_company_summaries(db: Session) -> CachedResponse:
+    version, recent = _tree_state(db)
+    return tree_cache.get(version, lambda: get_company_summaries(db), view="companies", recent=recent)
+
+
+def _json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def get_datacenter_head(db: Session, dc_id: int) -> tuple[str, int, int] | None:
+    """The DC name, the tree version and the recent change count (see ``_tree_state``), or None if there is no such DC."""
+    name = db.execute(select(models.Datacenter.name).where(models.Datacenter.id == dc_id)).scalar()
+    if name is None:
+        return None
+    return name, *_tree_state(db)
+
+
+def stream_datacenter(dc_id: int, name: str, version: int, chunk: int = 1000) -> Iterator[str]:
+    """A TreeDatacenter (plus ``version``) as JSON text, written while the nodes are read.
+
+    Nodes come ordered by (type, id) from ``ix_objects_dc_id_type_id``, so
+    each group is one contiguous run and no DC is ever held in memory whole.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.Object.type, models.Object.id, models.Object.name, models.Object.status, models.Object.ip)
+            .where(models.Object.dc_id == dc_id)
+            .order_by(models.Object.type, models.Object.id)
+            .execution_options(yield_per=chunk)
+        )
+        parts = [f'{{"version":{version},"id":{dc_id},"name":{_json(name)}']
+        group = None
+        pending = set(_TREE_GROUPS.values())
+        for obj_type, obj_id, obj_name, status, ip in rows:
+            if _TREE_GROUPS[obj_type] != group:
+                if group is not None:
+                    parts.append("]")
+                group = _TREE_GROUPS[obj_type]
+                pending.discard(group)
+                parts.append(f',"{group}":[')
+            else:
+                parts.append(",")
+            parts.append(_json({"id": obj_id, "name": obj_name, "type": obj_type.value, "status": status, "ip": ip}))
+            if len(parts) >= chunk:
+                yield "".join(parts)
+                parts = []
+        if group is not None:
+            parts.append("]")
+        parts.extend(f',"{group}":[]' for group in _TREE_GROUPS.values() if group in pending)
+        parts.append("}")
+        yield "".join(parts)
+    finally:
+        db.close()
+
+
+def get_tree_changes(db: Session, since: int) -> schemas.TreeChanges:
+    """Nodes touched after ``since``, as their current state.
+
+    Rows from the last ``tree_change_overlap_seconds`` are included even at
+    or below ``since``, for ones that committed after the client saw a newer
+    id; sending a node again is harmless. A ``since`` from before the pruned
+    part of the log, or from another database, gets ``reset``.
+    """
+    version, oldest = db.execute(select(func.max(models.ObjectChange.id), func.min(models.ObjectChange.id))).one()
+    version = version or 0
+    if since > version or (oldest is not None and since < oldest - 1):
+        return schemas.TreeChanges(version=version, reset=True)
+    touched = set(
+        db.execute(
+            select(models.ObjectChange.object_id).where(
+                or_(models.ObjectChange.id > since, models.ObjectChange.created_at >= _overlap_start()),
+                models.ObjectChange.id <= version,
             )
-        companies_resp.append(schemas.TreeCompany(id=company.id, name=company.name, dcs=dcs_resp))
-    return schemas.TreeResponse(companies=companies_resp)
+        ).scalars()
+    )
+    if not touched:
+        return schemas.TreeChanges(version=version)
+    if None in touched:
+        # A company or DC was added: the client's summary is stale, not just some nodes.
+        return schemas.TreeChanges(version=version, reset=True)
+    rows = db.execute(
+        select(
+            models.Object.dc_id,
+            models.Object.id,
+            models.Object.name,
+            models.Object.type,
+            models.Object.status,
+            models.Object.ip,
+        )
+        .where(models.Object.id.in_(touched))
+        .order_by(models.Object.id)
+    ).all()
+    upserts = [
+        {"dc_id": dc_id, "node": {"id": obj_id, "name": name, "type": type_, "status": status, "ip": ip}}
+        for dc_id, obj_id, name, type_, status, ip in rows
+    ]
+    removed = sorted(touched.difference(row[1] for row in rows))
+    return schemas.TreeChanges.model_validate({"version": version, "upserts": upserts, "removed": removed})
+
+
+def prune_tree_changes(db: Session) -> int:
+    """Delete change log rows older than the retention window, always keeping the newest one.
+
+    The newest row carries the tree version, which must never go back.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=settings.tree_change_retention_hours)
+    newest = select(func.max(models.ObjectChange.id)).scalar_subquery()
+    deleted = db.execute(
+        delete(models.ObjectChange).where(models.ObjectChange.created_at < cutoff, models.ObjectChange.id < newest)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def _log_change(db: Session, obj: models.Object, action: models.ChangeAction) -> models.ObjectChange:
+    change = models.ObjectChange(object_id=obj.id, dc_id=obj.dc_id, action=action)
+    db.add(change)
+    return change
+
+
+def log_structure_change(db: Session, action: models.ChangeAction, dc_id: int | None = None):
+    """Log a company (``dc_id`` None) or DC change, so it moves the tree version like an object change."""
+    db.execute(insert(models.ObjectChange).values(object_id=None, dc_id=dc_id, action=action))
+
+
+def _publish_tree_change(change: models.ObjectChange, obj: models.Object | None = None):
+    """Push a one-change TreeChanges to live clients; ``obj`` is None for a removal."""
+    upserts, removed = [], []
+    if obj is None:
+        removed.append(change.object_id)
+    else:
+        node = {"id": obj.id, "name": obj.name, "type": obj.type.value, "status": obj.status, "ip": obj.ip}
+        upserts.append({"dc_id": obj.dc_id, "node": node})
+    events.publish("tree", {"version": change.id, "upserts": upserts, "removed": removed})
 
 
 def list_companies(db: Session) -> list[models.Company]:
     return db.execute(select(models.Company)).scalars().all()
 
 
-def get_object_detail(db: Session, object_id: int) -> schemas.ObjectDetail | None:
+def default_page_rows(object_id: int, name: str) -> list[dict]:
+    return [
+        {"object_id": object_id, "section": section, "content_md": f"## {name} — {section.value}\n\nОписание."}
+        for section in models.PageSection
+    ]
+
+
+def default_pages(obj: models.Object) -> list[models.Page]:
+    return [models.Page(**row) for row in default_page_rows(obj.id, obj.name)]
+
+
+OBJECT_SORTS = ("name", "-name", "id", "-id")
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode()).decode().rstrip("=")
+
+
+def _is_id(value) -> bool:
+    return type(value) is int and -(2**63) <= value < 2**63
+
+
+def decode_cursor(cursor: str) -> list:
+    """Inverse of ``encode_cursor``; raises ValueError for anything it did not produce.
+
+    A cursor is ``[sort, name, id]`` for the name sorts and ``[sort, id]``
+    for the id sorts.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or not values or values[0] not in OBJECT_SORTS:
+        raise ValueError("Malformed cursor")
+    if values[0].lstrip("-") == "name":
+        valid = len(values) == 3 and isinstance(values[1], str) and _is_id(values[2])
+    else:
+        valid = len(values) == 2 and _is_id(values[1])
+    if not valid:
+        raise ValueError("Malformed cursor")
+    return values
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def list_objects(
+    db: Session, filters: schemas.ObjectFilter, sort: str = "name", limit: int = 100, cursor: str | None = None
+) -> schemas.ObjectPage:
+    """One page of objects ordered by ``sort``, continuing after ``cursor``.
+
+    Pages are cut with keyset conditions on (name, id) or id instead of
+    OFFSET, so every page costs the same however deep the scan goes.
+    """
+    query = select(*_OBJECT_COLUMNS)
+    if filters.company_id is not None:
+        query = query.join(models.Datacenter, models.Datacenter.id == models.Object.dc_id).where(
+            models.Datacenter.company_id == filters.company_id
+        )
+    if filters.dc_id is not None:
+        query = query.where(models.Object.dc_id == filters.dc_id)
+    if filters.type is not None:
+        query = query.where(models.Object.type == filters.type)
+    if filters.status is not None:
+        query = query.where(models.Object.status == filters.status)
+    if filters.tag:
+        tags = "," + func.replace(func.coalesce(models.Object.tags, ""), " ", "") + ","
+        query = query.where(tags.contains(f",{filters.tag.strip()},", autoescape=True))
+    if filters.ip_prefix:
+        # A range instead of LIKE so the ip index is usable.
+        query = query.where(models.Object.ip >= filters.ip_prefix, models.Object.ip < _prefix_upper_bound(filters.ip_prefix))
+
+    descending = sort.startswith("-")
+    by_name = sort.lstrip("-") == "name"
+    keys = (models.Object.name, models.Object.id) if by_name else (models.Object.id,)
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if values[0] != sort:
+            raise ValueError("Cursor belongs to another sort order")
+        key = tuple_(*keys) if by_name else keys[0]
+        after = tuple_(*values[1:]) if by_name else values[1]
+        query = query.where(key < after if descending else key > after)
+    query = query.order_by(*(k.desc() if descending else k for k in keys)).limit(limit + 1)
+
+    rows = db.execute(query).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([sort, last["name"], last["id"]] if by_name else [sort, last["id"]])
+    return schemas.ObjectPage.model_validate({"items": rows, "next_cursor": next_cursor})
+
+
+def create_object(db: Session, data: schemas.ObjectCreate) -> models.Object | None:
+    if not db.get(models.Datacenter, data.dc_id):
+        return None
+    obj = models.Object(**data.model_dump())
+    db.add(obj)
+    db.flush()
+    pages = default_pages(obj)
+    db.add_all(pages)
+    db.flush()
+    search.index_object(db, obj)
+    for page in pages:
+        search.index_page(db, page, obj.name)
+    change = _log_change(db, obj, models.ChangeAction.added)
+    db.commit()
+    tree_cache.invalidate()
+    db.refresh(obj)
+    _publish_tree_change(change, obj)
+    return obj
+
+
+def update_object(db: Session, object_id: int, data: schemas.ObjectUpdate) -> models.Object | None:
     obj = db.get(models.Object, object_id)
     if not obj:
         return None
-    pages = db.query(models.Page).filter(models.Page.object_id == object_id).all()
-    relations = db.query(models.Relation).filter(models.Relation.src_object_id == object_id).all()
-    documents = db.query(models.Document).filter(models.Document.object_id == object_id).all()
-    incidents = db.query(models.Incident).filter(models.Incident.object_id == object_id).all()
-    return schemas.ObjectDetail(
-        object=obj, pages=pages, relations=relations, documents=documents, incidents=incidents
-    )
+    fields = data.model_dump(exclude_unset=True)
+    if "dc_id" in fields and not db.get(models.Datacenter, fields["dc_id"]):
+        return None
+    tree_changed = any(getattr(obj, key) != fields[key] for key in _TREE_FIELDS if key in fields)
+    renamed = "name" in fields and fields["name"] != obj.name
+    for key, value in fields.items():
+        setattr(obj, key, value)
+    search.index_object(db, obj)
+    if renamed:
+        for page in obj.pages:
+            search.index_page(db, page, obj.name)
+    change = _log_change(db, obj, models.ChangeAction.changed) if tree_changed else None
+    db.commit()
+    tree_cache.invalidate()
+    db.refresh(obj)
+    if change is not None:
+        _publish_tree_change(change, obj)
+    return obj
+
+
+def delete_object(db: Session, object_id: int) -> bool:
+    obj = db.get(models.Object, object_id)
+    if not obj:
+        return False
+    change = _log_change(db, obj, models.ChangeAction.removed)
+    search.remove(db, "object", obj.id)
+    for kind, children in (("page", obj.pages), ("document", obj.documents), ("incident", obj.incidents)):
+        for child in children:
+            search.remove(db, kind, child.id)
+    revisions.remove_pages(db, [page.id for page in obj.pages])
+    db.delete(obj)
+    db.commit()
+    tree_cache.invalidate()
+    relation_graph.remove_object(object_id)
+    _publish_tree_change(change)
+    return True
+
+
+_OBJECT_COLUMNS = (
+    models.Object.id,
+    models.Object.dc_id,
+    models.Object.type,
+    models.Object.name,
+    models.Object.status,
+    models.Object.ip,
+    models.Object.fqdn,
+    models.Object.tags,
+    models.Object.description,
+)
+_PAGE_COLUMNS = (
+    models.Page.id,
+    models.Page.section,
+    models.Page.content_md,
+    models.Page.updated_at,
+    models.Page.updated_by,
+    models.Page.version,
+)
+# Lists shown next to a page tab, with the column that points at the object.
+_SECTION_LISTS = {
+    models.PageSection.links: (
+        "relations",
+        models.Relation.src_object_id,
+        (
+            models.Relation.id,
+            models.Relation.relation_type,
+            models.Relation.note,
+            models.Relation.src_object_id,
+            models.Relation.dst_object_id,
+        ),
+    ),
+    models.PageSection.docs: (
+        "documents",
+        models.Document.object_id,
+        (
+            models.Document.id,
+            models.Document.object_id,
+            models.Document.title,
+            models.Document.file_path,
+            models.Document.file_name,
+            models.Document.content_type,
+            models.Document.url,
+            models.Document.kind,
+            models.Document.uploaded_at,
+        ),
+    ),
+    models.PageSection.inc: (
+        "incidents",
+        models.Incident.object_id,
+        (
+            models.Incident.id,
+            models.Incident.object_id,
+            models.Incident.title,
+            models.Incident.severity,
+            models.Incident.symptom,
+            models.Incident.cause,
+            models.Incident.check,
+            models.Incident.resolution,
+            models.Incident.created_at,
+        ),
+    ),
+}
 
 
-def update_page(db: Session, page_id: int, content_md: str, user: models.User):
+def _json_rows(db: Session, columns, where):
+    """A correlated subquery with the matching rows as one JSON array of objects (NULL when there are none)."""
+    pairs = [part for column in columns for part in (literal(column.key), column)]
+    if db.get_bind().dialect.name == "postgresql":
+        rows = func.json_agg(func.json_build_object(*pairs), type_=JSON)
+    else:
+        rows = func.json_group_array(func.json_object(*pairs), type_=JSON)
+    return select(rows).where(where).scalar_subquery()
+
+
+def get_object_details(
+    db: Session, object_ids: list[int], sections: list[models.PageSection] | None = None
+) -> dict[int, schemas.ObjectDetail]:
+    """Object details built from projected rows, without ORM hydration.
+
+    One statement however many ids are asked for: the pages and the lists
+    come back as JSON arrays from correlated subqueries next to each object
+    row. ``sections`` limits the answer to those page tabs; the links, docs
+    and inc tabs also bring the relations, documents and incidents lists.
+    Lists that were not requested are left unset. Unknown ids are absent
+    from the result, which keeps the order of ``object_ids``. Pages come
+    unrendered; see ``render.fill_pages``.
+    """
+    if sections is None:
+        sections = list(models.PageSection)
+    pages = models.Page.object_id == models.Object.id
+    if len(sections) < len(models.PageSection):
+        pages &= models.Page.section.in_(sections)
+    lists = {"pages": _json_rows(db, _PAGE_COLUMNS, pages)}
+    for section in sections:
+        if section in _SECTION_LISTS:
+            key, fk, columns = _SECTION_LISTS[section]
+            lists[key] = _json_rows(db, columns, fk == models.Object.id)
+    rows = db.execute(
+        select(*_OBJECT_COLUMNS, *(subquery.label(key) for key, subquery in lists.items())).where(
+            models.Object.id.in_(object_ids)
+        )
+    ).mappings()
+
+    details = {}
+    for row in rows:
+        detail = {"object": {column.key: row[column.key] for column in _OBJECT_COLUMNS}}
+        for key in lists:
+            # JSON aggregates do not promise an order.
+            detail[key] = sorted(row[key] or [], key=lambda item: item["id"])
+        details[row["id"]] = schemas.ObjectDetail.model_validate(detail)
+    return {object_id: details[object_id] for object_id in object_ids if object_id in details}
+
+
+def get_object_detail(
+    db: Session, object_id: int, sections: list[models.PageSection] | None = None
+) -> schemas.ObjectDetail | None:
+    return get_object_details(db, [object_id], sections).get(object_id)
+
+
+def get_page(db: Session, page_id: int):
+    return db.get(models.Page, page_id)
+
+
+class VersionConflict(Exception):
+    """The page is no longer at the version the client edited."""
+
+    def __init__(self, version: int):
+        super().__init__(f"page is at version {version}")
+        self.version = version
+
+
+def update_page(db: Session, page_id: int, content_md: str, user: schemas.UserOut, version: int | None = None):
+    """Replace the page text; with ``version`` only if the page is still at that version."""
     page = db.get(models.Page, page_id)
     if not page:
         return None
+    if version is not None and page.version != version:
+        raise VersionConflict(page.version)
+    revisions.record(db, page, content_md, user.id)
     page.content_md = content_md
     page.updated_at = datetime.utcnow()
     page.updated_by = user.id
     db.add(page)
+    try:
+        # UPDATE ... WHERE version = <loaded version>: catches writers that committed after our read.
+        db.flush()
+    except StaleDataError:
+        db.rollback()
+        raise VersionConflict(db.execute(select(models.Page.version).where(models.Page.id == page_id)).scalar_one())
+    object_name = db.execute(select(models.Object.name).where(models.Object.id == page.object_id)).scalar_one()
+    search.index_page(db, page, object_name)
     db.commit()
+    tree_cache.invalidate()
+    render.forget(page_id)
     db.refresh(page)
+    events.publish(
+        "page", {"id": page.id, "object_id": page.object_id, "section": page.section.value, "version": page.version}
+    )
     return page
 
 
-def create_document(db: Session, object_id: int, title: str, kind: models.DocumentKind, path: str | None, url: str | None):
-    doc = models.Document(object_id=object_id, title=title, kind=kind, file_path=path, url=url)
+def patch_page(db: Session, page_id: int, patch: schemas.PagePatch, user: schemas.UserOut, version: int):
+    """Apply range edits or a unified diff made against ``version`` of the page."""
+    page = db.get(models.Page, page_id)
+    if not page:
+        return None
+    if page.version != version:
+        raise VersionConflict(page.version)
+    if patch.edits is not None:
+        content_md = patching.apply_edits(page.content_md or "", patch.edits)
+    else:
+        content_md = patching.apply_unified_diff(page.content_md or "", patch.diff)
+    return update_page(db, page_id, content_md, user, version)
+
+
+def create_document(
+    db: Session,
+    object_id: int,
+    title: str,
+    kind: models.DocumentKind,
+    path: str | None,
+    url: str | None,
+    file_name: str | None = None,
+    content_type: str | None = None,
+):
+    doc = models.Document(
+        object_id=object_id, title=title, kind=kind, file_path=path, url=url, file_name=file_name, content_type=content_type
+    )
     db.add(doc)
+    db.flush()
+    search.index_document(db, doc)
     db.commit()
+    tree_cache.invalidate()
     db.refresh(doc)
+    events.publish("document", {"id": doc.id, "object_id": doc.object_id, "title": doc.title})
     return doc
 
 
-def list_documents(db: Session, object_id: int) -> List[models.Document]:
-    return db.query(models.Document).filter(models.Document.object_id == object_id).all()
+def create_incident(db: Session, object_id: int, data: schemas.IncidentCreate) -> models.Incident | None:
+    if not db.get(models.Object, object_id):
+        return None
+    incident = models.Incident(object_id=object_id, **data.model_dump())
+    db.add(incident)
+    db.flush()
+    search.index_incident(db, incident)
+    db.commit()
+    db.refresh(incident)
+    events.publish(
+        "incident", {"id": incident.id, "object_id": object_id, "title": incident.title, "severity": incident.severity}
+    )
+    return incident
+
+
+def create_relation(db: Session, data: schemas.RelationCreate) -> models.Relation | None:
+    found = db.execute(
+        select(func.count()).where(models.Object.id.in_([data.src_object_id, data.dst_object_id]))
+    ).scalar_one()
+    if found < 2:
+        return None
+    relation = models.Relation(**data.model_dump())
+    db.add(relation)
+    db.commit()
+    db.refresh(relation)
+    relation_graph.add(relation.id, relation.src_object_id, relation.dst_object_id, relation.relation_type)
+    return relation
+
+
+def delete_relation(db: Session, relation_id: int) -> bool:
+    relation = db.get(models.Relation, relation_id)
+    if not relation:
+        return False
+    db.delete(relation)
+    db.commit()
+    relation_graph.remove(relation_id)
+    return True
+
+
+_GRAPH_COLUMNS = (models.Object.id, models.Object.dc_id, models.Object.type, models.Object.name, models.Object.status)
+
+
+def _graph_objects(db: Session, ids) -> dict[int, dict]:
+    rows = db.execute(select(*_GRAPH_COLUMNS).where(models.Object.id.in_(list(ids)))).mappings()
+    return {row["id"]: row for row in rows}
+
+
+def walk_relations(db: Session, object_id: int, direction: str, max_depth: int, limit: int) -> schemas.GraphWalk | None:
+    """Objects that ``object_id`` impacts (direction "in") or depends on ("out"), nearest first."""
+    if not db.get(models.Object, object_id):
+        return None
+    relation_graph.ensure_fresh(db)
+    found, truncated = relation_graph.walk(object_id, direction, max_depth, limit)
+    objects = _graph_objects(db, [node for node, *_ in found])
+    nodes = [
+        schemas.GraphNode(**objects[node], depth=depth, via=via, relation_type=relation_type)
+        for node, depth, via, relation_type in found
+        if node in objects
+    ]
+    return schemas.GraphWalk(
+        object_id=object_id, direction=direction, max_depth=max_depth, total=len(nodes), truncated=truncated, nodes=nodes
+    )
+
+
+def relation_path(db: Session, src: int, dst: int, max_depth: int, directed: bool = True) -> schemas.GraphPath | None:
+    relation_graph.ensure_fresh(db)
+    path = relation_graph.shortest_path(src, dst, max_depth, directed)
+    if path is None:
+        return None
+    objects = _graph_objects(db, [node for node, _ in path])
+    if len(objects) < len(path):
+        return None
+    steps = [schemas.GraphPathStep(**objects[node], relation_id=rel_id) for node, rel_id in path]
+    return schemas.GraphPath(src_object_id=src, dst_object_id=dst, length=len(steps) - 1, steps=steps)
+
+
+def get_document(db: Session, document_id: int) -> models.Document | None:
+    return db.get(models.Document, document_id)
+
+
+def list_documents(db: Session, object_id: int, limit: int | None = None, after: int = 0) -> List[models.Document]:
+    query = db.query(models.Document).filter(models.Document.object_id == object_id, models.Document.id > after)
+    return query.order_by(models.Document.id).limit(limit).all()
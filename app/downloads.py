@@ -0,0 +1,121 @@
+"""Responses for files under ``upload_dir``.
+
+Supports single byte ranges (206/416, If-Range; a malformed or multi-range
+header is ignored, as RFC 9110 allows), ETag/Last-Modified validators with 304 answers, long-lived caching for content-addressed files
+and, when ``upload_sendfile`` is set, handing the transfer to the front proxy
+via X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd).
+"""
+
+import mimetypes
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from . import storage
+from .cache import IMMUTABLE_CACHE, if_none_match
+from .settings import settings
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _not_modified_since(header: Optional[str], mtime: float) -> bool:
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Inclusive (start, end) of a single-range header; None if it cannot be satisfied.
+
+    Raises ValueError for a header to ignore: malformed, another unit or
+    several ranges, which are not supported.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        raise ValueError(f"Unsupported Range header {header!r}")
+    first, last = match.groups()
+    if not first and not last or first and last and int(last) < int(first):
+        raise ValueError(f"Invalid range {header!r}")
+    if not first:
+        if int(last) == 0 or size == 0:
+            return None
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if start >= size:
+        return None
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _iter_file(path: Path, start: int, length: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(settings.upload_chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(
+    request: Request, path: Path, relative_path: str, media_type: Optional[str] = None, filename: Optional[str] = None
+) -> Response:
+    """``media_type`` and ``filename`` come from the document row; hash-named blobs carry neither."""
+    stat = path.stat()
+    if storage.is_content_addressed(path):
+        etag = f'"{path.name.split(".")[0]}"'
+        cache_control = IMMUTABLE_CACHE
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = "no-cache"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(filename)}"
+
+    inm = request.headers.get("if-none-match")
+    if if_none_match(inm, etag) or (inm is None and _not_modified_since(request.headers.get("if-modified-since"), stat.st_mtime)):
+        return Response(status_code=304, headers=headers)
+
+    media_type = media_type or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if settings.upload_sendfile == "x-accel-redirect":
+        # nginx serves the bytes (and ranges) from its internal location.
+        headers["X-Accel-Redirect"] = settings.upload_accel_prefix.rstrip("/") + "/" + quote(relative_path)
+        return Response(headers=headers, media_type=media_type)
+    if settings.upload_sendfile == "x-sendfile":
+        headers["X-Sendfile"] = str(path.resolve())
+        return Response(headers=headers, media_type=media_type)
+
+    size = stat.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if range_header and (not if_range or if_range.strip() == etag or if_range.strip() == headers["Last-Modified"]):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            pass  # Ignored: the whole file goes out.
+        else:
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(_iter_file(path, start, length), status_code=206, headers=headers, media_type=media_type)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(path, 0, size), headers=headers, media_type=media_type)
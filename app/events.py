@@ -0,0 +1,154 @@
+"""Live updates pushed to browsers over Server-Sent Events.
+
+Write paths call ``publish`` after they commit. Every subscriber of this
+worker gets the event through a small bounded queue; a subscriber that falls
+behind has its queue dropped and is sent one ``resync`` event instead, so a
+slow client never holds more than ``event_queue_size`` events.
+
+Workers find each other through Unix datagram sockets named ``<pid>.sock``
+in ``event_socket_dir``: a published event is also sent to every other
+socket there, and each worker hands what it receives to its own subscribers.
+Processes that do not serve requests (``python -m app.inventory``) publish
+to the workers the same way without binding a socket. Delivery is best
+effort; clients catch up through ``/api/tree/changes`` after a resync or a
+reconnect.
+"""
+
+import asyncio
+import json
+import os
+import socket
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from .settings import settings
+
+# Well below the default datagram limit on Linux; events carry ids and short fields only.
+MAX_DATAGRAM = 64 * 1024
+RESYNC = "event: resync\ndata: {}\n\n"
+
+
+def encode(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    __slots__ = ("queue",)
+
+    def __init__(self):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=settings.event_queue_size)
+
+    def put(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sock: Optional[socket.socket] = None
+        self._path: Optional[Path] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def start(self):
+        """Bind this worker's socket and deliver to its subscribers; call from the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        if not hasattr(socket, "AF_UNIX"):
+            return
+        directory = settings.event_socket_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        self._path = directory / f"{os.getpid()}.sock"
+        self._path.unlink(missing_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._sock.bind(str(self._path))
+        self._loop.add_reader(self._sock.fileno(), self._receive)
+
+    def stop(self):
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._path.unlink(missing_ok=True)
+        self._sock = self._path = self._loop = None
+
+    def _receive(self):
+        while True:
+            try:
+                payload = self._sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._deliver(payload.decode("utf-8"))
+
+    def _deliver(self, message: str):
+        for subscriber in self._subscribers:
+            subscriber.put(message)
+
+    def _send_to_peers(self, message: str):
+        if not hasattr(socket, "AF_UNIX") or not settings.event_socket_dir.is_dir():
+            return
+        payload = message.encode("utf-8")
+        sock = self._sock or socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            for entry in os.scandir(settings.event_socket_dir):
+                if not entry.name.endswith(".sock") or (self._path is not None and entry.path == str(self._path)):
+                    continue
+                try:
+                    sock.sendto(payload, entry.path)
+                except ConnectionRefusedError:
+                    # Left behind by a worker that did not shut down cleanly.
+                    Path(entry.path).unlink(missing_ok=True)
+                except OSError:
+                    # Full peer buffer, a socket that just went away: the peer's clients resync later.
+                    pass
+        finally:
+            if sock is not self._sock:
+                sock.close()
+
+    def _publish(self, message: str):
+        self._deliver(message)
+        self._send_to_peers(message)
+
+    def publish(self, event: str, data: dict):
+        """Send ``event`` to subscribers of every worker; safe to call from any thread."""
+        message = encode(event, data)
+        if self._loop is None:
+            self._send_to_peers(message)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, message)
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= settings.event_max_subscribers
+
+    async def stream(self) -> AsyncIterator[str]:
+        """An SSE body: events as they are published, and a comment line as heartbeat so proxies keep the connection.
+
+        The subscription lives exactly as long as the generator runs.
+        """
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), settings.event_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+broadcaster = Broadcaster()
+
+
+def publish(event: str, data: dict):
+    broadcaster.publish(event, data)
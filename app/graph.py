@@ -0,0 +1,162 @@
+"""In-memory adjacency index over ``relations``.
+
+``src -> dst`` means "src depends on dst": walking outbound edges gives an
+object's dependencies, walking inbound edges gives what it impacts.
+
+The index is built on first use and updated in place by relation writes made
+in this process. Writes from other workers are noticed by comparing a
+signature of the table (row count and sums of ids and endpoints), checked at
+most every ``graph_check_interval`` seconds; a mismatch triggers a reload.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .settings import settings
+
+Signature = tuple[int, int, int, int]
+
+
+class RelationGraph:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._edges: dict[int, tuple[int, int, str]] = {}
+        self._out: dict[int, dict[int, int]] = {}
+        self._in: dict[int, dict[int, int]] = {}
+        self._signature: Optional[Signature] = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _db_signature(db: Session) -> Signature:
+        count, ids, srcs, dsts = db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(models.Relation.id), 0),
+                func.coalesce(func.sum(models.Relation.src_object_id), 0),
+                func.coalesce(func.sum(models.Relation.dst_object_id), 0),
+            )
+        ).one()
+        return int(count), int(ids), int(srcs), int(dsts)
+
+    def load(self, db: Session):
+        rows = db.execute(
+            select(models.Relation.id, models.Relation.src_object_id, models.Relation.dst_object_id, models.Relation.relation_type)
+        ).all()
+        with self._lock:
+            self._edges, self._out, self._in = {}, {}, {}
+            self._signature = (0, 0, 0, 0)
+            for rel_id, src, dst, relation_type in rows:
+                self._add(rel_id, src, dst, relation_type or "")
+            self._checked_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session):
+        if self._signature is None:
+            self.load(db)
+            return
+        if time.monotonic() - self._checked_at < settings.graph_check_interval:
+            return
+        signature = self._db_signature(db)
+        with self._lock:
+            fresh = signature == self._signature
+            self._checked_at = time.monotonic()
+        if not fresh:
+            self.load(db)
+
+    def _add(self, rel_id: int, src: int, dst: int, relation_type: str):
+        if rel_id in self._edges:
+            return
+        self._edges[rel_id] = (src, dst, relation_type)
+        self._out.setdefault(src, {})[rel_id] = dst
+        self._in.setdefault(dst, {})[rel_id] = src
+        count, ids, srcs, dsts = self._signature
+        self._signature = (count + 1, ids + rel_id, srcs + src, dsts + dst)
+
+    def _remove(self, rel_id: int):
+        edge = self._edges.pop(rel_id, None)
+        if edge is None:
+            return
+        src, dst, _ = edge
+        self._out.get(src, {}).pop(rel_id, None)
+        self._in.get(dst, {}).pop(rel_id, None)
+        count, ids, srcs, dsts = self._signature
+        self._signature = (count - 1, ids - rel_id, srcs - src, dsts - dst)
+
+    def add(self, rel_id: int, src: int, dst: int, relation_type: str):
+        with self._lock:
+            if self._signature is not None:
+                self._add(rel_id, src, dst, relation_type or "")
+
+    def remove(self, rel_id: int):
+        with self._lock:
+            if self._signature is not None:
+                self._remove(rel_id)
+
+    def remove_object(self, object_id: int):
+        with self._lock:
+            if self._signature is None:
+                return
+            for rel_id in list(self._out.pop(object_id, {})) + list(self._in.pop(object_id, {})):
+                self._remove(rel_id)
+
+    def walk(self, start: int, direction: str, max_depth: int, limit: int) -> tuple[list[tuple[int, int, int, str]], bool]:
+        """Breadth-first walk from ``start``: ``(object_id, depth, via, relation_type)`` per reachable object.
+
+        ``direction`` is "in" (impact) or "out" (dependencies). Each object is
+        reported once, at its shortest depth, so cycles end the walk. The bool
+        tells whether ``limit`` cut the result short.
+        """
+        with self._lock:
+            adjacency = self._in if direction == "in" else self._out
+            seen = {start}
+            found = []
+            queue = deque([(start, 0)])
+            while queue:
+                node, depth = queue.popleft()
+                if depth >= max_depth:
+                    continue
+                for rel_id, neighbour in adjacency.get(node, {}).items():
+                    if neighbour in seen:
+                        continue
+                    if len(found) >= limit:
+                        return found, True
+                    seen.add(neighbour)
+                    found.append((neighbour, depth + 1, node, self._edges[rel_id][2]))
+                    queue.append((neighbour, depth + 1))
+            return found, False
+
+    def shortest_path(self, src: int, dst: int, max_depth: int, directed: bool = True) -> Optional[list[tuple[int, Optional[int]]]]:
+        """Objects from ``src`` to ``dst`` with the relation id used to reach each; None if unreachable."""
+        with self._lock:
+            parents: dict[int, tuple[Optional[int], Optional[int]]] = {src: (None, None)}
+            frontier = [src]
+            depth = 0
+            while frontier and dst not in parents and depth < max_depth:
+                depth += 1
+                next_frontier = []
+                for node in frontier:
+                    neighbours = list(self._out.get(node, {}).items())
+                    if not directed:
+                        neighbours += self._in.get(node, {}).items()
+                    for rel_id, neighbour in neighbours:
+                        if neighbour not in parents:
+                            parents[neighbour] = (node, rel_id)
+                            next_frontier.append(neighbour)
+                frontier = next_frontier
+            if dst not in parents:
+                return None
+            path = []
+            node = dst
+            while node is not None:
+                parent, rel_id = parents[node]
+                path.append((node, rel_id))
+                node = parent
+            return path[::-1]
+
+
+relation_graph = RelationGraph()
@@ -0,0 +1,483 @@
+"""Bulk inventory import and export.
+
+Import reads CSV, a JSON array or NDJSON as a stream and writes it in chunks
+of ``import_chunk_size`` records, one transaction per chunk. Objects are
+upserted by (company, datacenter, name) with executemany inserts/updates,
+new objects get their default pages in the same batch, and the change log and
+search index are updated per chunk. Companies and datacenters are created on
+demand.
+
+Records use the format produced by the export, one JSON object per line::
+
+    {"record": "company", "name": "..."}
+    {"record": "datacenter", "company": "...", "name": "..."}
+    {"record": "object", "company": "...", "dc": "...", "type": "server", "name": "...", "ip": "...", ...}
+    {"record": "relation", "src_company": "...", "src_dc": "...", "src": "...",
+     "dst_company": "...", "dst_dc": "...", "dst": "...", "relation_type": "uses", "note": ""}
+
+``record`` defaults to "object", so a CMDB CSV only needs the object columns.
+Columns a source leaves out (or leaves empty) keep their stored values on
+existing objects; an explicit ``null`` in JSON clears them.
+
+    python -m app.inventory import servers.csv
+    python -m app.inventory export -o inventory.ndjson
+"""
+
+import argparse
+import codecs
+import csv
+import json
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import IO, Callable, Iterable, Iterator, Optional
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
+
+from . import crud, events, models, search
+from .cache import tree_cache
+from .db import SessionLocal
+from .graph import relation_graph
+from .settings import settings
+
+FORMATS = ("csv", "json", "ndjson")
+_OBJECT_FIELDS = ("type", "status", "ip", "fqdn", "tags", "description")
+_MAX_ERRORS = 100
+
+
+class InventoryObject(BaseModel):
+    company: str
+    dc: str
+    type: models.ObjectType
+    name: str
+    status: str = "ok"
+    ip: Optional[str] = None
+    fqdn: Optional[str] = None
+    tags: Optional[str] = None
+    description: Optional[str] = None
+
+
+class InventoryRelation(BaseModel):
+    src_company: str
+    src_dc: str
+    src: str
+    dst_company: str
+    dst_dc: str
+    dst: str
+    relation_type: str = "depends"
+    note: str = ""
+
+
+@dataclass
+class ImportReport:
+    records: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    relations: int = 0
+    chunks: int = 0
+    errors: list[str] = field(default_factory=list)
+    skipped: int = 0
+
+    def error(self, line: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < _MAX_ERRORS:
+            self.errors.append(f"record {line}: {message}")
+
+
+def guess_format(filename: str) -> str:
+    suffix = filename.rsplit(".", 1)[-1].lower()
+    if suffix in ("jsonl", "ndjson"):
+        return "ndjson"
+    return suffix if suffix in FORMATS else "ndjson"
+
+
+def format_for_content_type(content_type: str) -> str:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type == "application/json":
+        return "json"
+    return "ndjson"
+
+
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+def _iter_json_array(stream: IO[str], buffer_size: int = 64 * 1024) -> Iterator[dict]:
+    """Items of a top-level JSON array, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    # "[", then "item" (after "[" or ","), then "," or "]" after each item.
+    expect = "["
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expect == "[":
+                if char != "[":
+                    raise ValueError("JSON input must be an array of records")
+                expect = "first"
+                pos += 1
+                continue
+            if char == "]" and expect in ("first", ","):
+                return
+            if expect == ",":
+                if char != ",":
+                    raise ValueError("Expecting ',' or ']' between records")
+                expect = "item"
+                pos += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number cut at the buffer edge decodes short ("1" of "1.5"); wait for more input.
+                if eof or not _NUMBER_CHARS.issuperset(buffer[end:]):
+                    yield item
+                    pos = end
+                    expect = ","
+                    continue
+        if eof:
+            if expect != "[":
+                raise ValueError("Unterminated JSON array")
+            return
+        chunk = stream.read(buffer_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_records(stream: IO[str], fmt: str) -> Iterator[dict]:
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            # Empty cells are left unset: defaults for a new object, the stored value for an existing one.
+            yield {key: value for key, value in row.items() if key and value not in ("", None)}
+    elif fmt == "json":
+        yield from _iter_json_array(stream)
+    elif fmt == "ndjson":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+class Importer:
+    def __init__(self, db: Session):
+        self.db = db
+        self.report = ImportReport()
+        self._companies: dict[str, int] = {}
+        self._dcs: dict[tuple[str, str], int] = {}
+        # Set when the current chunk logged a tree change.
+        self._tree_changed = False
+
+    def _company_id(self, name: str) -> int:
+        if name not in self._companies:
+            company_id = self.db.execute(select(models.Company.id).where(models.Company.name == name)).scalar()
+            if company_id is None:
+                company_id = self.db.execute(insert(models.Company).values(name=name).returning(models.Company.id)).scalar_one()
+                crud.log_structure_change(self.db, models.ChangeAction.added)
+                self._tree_changed = True
+            self._companies[name] = company_id
+        return self._companies[name]
+
+    def _dc_id(self, company: str, name: str) -> int:
+        key = (company, name)
+        if key not in self._dcs:
+            company_id = self._company_id(company)
+            dc_id = self.db.execute(
+                select(models.Datacenter.id).where(models.Datacenter.company_id == company_id, models.Datacenter.name == name)
+            ).scalar()
+            if dc_id is None:
+                dc_id = self.db.execute(
+                    insert(models.Datacenter).values(company_id=company_id, name=name).returning(models.Datacenter.id)
+                ).scalar_one()
+                crud.log_structure_change(self.db, models.ChangeAction.added, dc_id)
+                self._tree_changed = True
+            self._dcs[key] = dc_id
+        return self._dcs[key]
+
+    def _object_ids(self, keys: set[tuple[int, str]]) -> dict[tuple[int, str], int]:
+        if not keys:
+            return {}
+        rows = self.db.execute(
+            select(models.Object.dc_id, models.Object.name, models.Object.id).where(
+                tuple_(models.Object.dc_id, models.Object.name).in_(list(keys))
+            )
+        )
+        return {(dc_id, name): object_id for dc_id, name, object_id in rows}
+
+    def _write_objects(self, records: list[InventoryObject]):
+        db = self.db
+        # Key -> the record; fields the source left out do not overwrite stored values.
+        wanted: dict[tuple[int, str], InventoryObject] = {}
+        for record in records:
+            wanted[(self._dc_id(record.company, record.dc), record.name)] = record
+        existing = {
+            (row["dc_id"], row["name"]): row
+            for row in db.execute(
+                select(models.Object.id, models.Object.dc_id, models.Object.name, *(getattr(models.Object, f) for f in _OBJECT_FIELDS)).where(
+                    tuple_(models.Object.dc_id, models.Object.name).in_(list(wanted))
+                )
+            ).mappings()
+        }
+
+        updates, changes, new_rows = [], [], []
+        for key, record in wanted.items():
+            current = existing.get(key)
+            if current is None:
+                new_rows.append({"dc_id": key[0], "name": record.name, **record.model_dump(include=set(_OBJECT_FIELDS))})
+                continue
+            values = record.model_dump(include=set(_OBJECT_FIELDS), exclude_unset=True)
+            if all(current[f] == value for f, value in values.items()):
+                self.report.unchanged += 1
+                continue
+            updates.append({"id": current["id"], **values})
+            if any(current[f] != values[f] for f in ("type", "status", "ip") if f in values):
+                changes.append({"object_id": current["id"], "dc_id": current["dc_id"], "action": models.ChangeAction.changed})
+
+        if updates:
+            db.execute(update(models.Object), updates)
+        created = []
+        if new_rows:
+            created = db.execute(insert(models.Object).returning(models.Object.id, models.Object.dc_id, models.Object.name), new_rows).all()
+            db.execute(insert(models.Page), [row for obj in created for row in crud.default_page_rows(obj.id, obj.name)])
+            changes += [{"object_id": obj.id, "dc_id": obj.dc_id, "action": models.ChangeAction.added} for obj in created]
+        if changes:
+            db.execute(insert(models.ObjectChange), changes)
+            self._tree_changed = True
+        search.reindex_objects(db, [row["id"] for row in updates] + [obj.id for obj in created])
+        self.report.updated += len(updates)
+        self.report.created += len(created)
+
+    def _write_relations(self, records: list[tuple[int, InventoryRelation]]) -> list[tuple[int, int, int, str]]:
+        ends = {}
+        for _, record in records:
+            ends[(record.src_company, record.src_dc, record.src)] = None
+            ends[(record.dst_company, record.dst_dc, record.dst)] = None
+        by_dc = {(company, dc, name): (self._dc_id(company, dc), name) for company, dc, name in ends}
+        ids = self._object_ids(set(by_dc.values()))
+        rows = []
+        for line, record in records:
+            src = ids.get(by_dc[(record.src_company, record.src_dc, record.src)])
+            dst = ids.get(by_dc[(record.dst_company, record.dst_dc, record.dst)])
+            if src is None or dst is None:
+                self.report.error(line, f"relation {record.src} -> {record.dst}: object not found")
+                continue
+            rows.append({"src_object_id": src, "dst_object_id": dst, "relation_type": record.relation_type, "note": record.note})
+        if not rows:
+            return []
+        known = set(
+            self.db.execute(
+                select(models.Relation.src_object_id, models.Relation.dst_object_id, models.Relation.relation_type).where(
+                    tuple_(models.Relation.src_object_id, models.Relation.dst_object_id).in_(
+                        [(row["src_object_id"], row["dst_object_id"]) for row in rows]
+                    )
+                )
+            ).all()
+        )
+        new_rows = {(r["src_object_id"], r["dst_object_id"], r["relation_type"]): r for r in rows}
+        new_rows = [row for key, row in new_rows.items() if key not in known]
+        if not new_rows:
+            return []
+        created = self.db.execute(
+            insert(models.Relation).returning(
+                models.Relation.id, models.Relation.src_object_id, models.Relation.dst_object_id, models.Relation.relation_type
+            ),
+            new_rows,
+        ).all()
+        self.report.relations += len(created)
+        return [tuple(row) for row in created]
+
+    def write_chunk(self, chunk: list[dict]):
+        objects, relations = [], []
+        for line, record in chunk:
+            self.report.records += 1
+            kind = record.pop("record", None) or "object"
+            try:
+                if kind == "object":
+                    objects.append(InventoryObject.model_validate(record))
+                elif kind == "relation":
+                    relations.append((line, InventoryRelation.model_validate(record)))
+                elif kind == "company":
+                    self._company_id(record["name"])
+                elif kind == "datacenter":
+                    self._dc_id(record["company"], record["name"])
+                else:
+                    self.report.error(line, f"unknown record type {kind!r}")
+            except ValidationError as exc:
+                error = exc.errors()[0]
+                self.report.error(line, f"{'.'.join(map(str, error['loc']))}: {error['msg']}")
+            except (KeyError, TypeError) as exc:
+                self.report.error(line, f"missing or invalid {exc}")
+        if objects:
+            self._write_objects(objects)
+        created_relations = self._write_relations(relations) if relations else []
+        self.db.commit()
+        self.report.chunks += 1
+        tree_cache.invalidate()
+        if self._tree_changed:
+            self._tree_changed = False
+            # Too many changes to push one by one: live clients fetch them from /api/tree/changes.
+            events.publish("tree", {"version": crud.get_tree_version(self.db), "upserts": [], "removed": []})
+        for edge in created_relations:
+            relation_graph.add(*edge)
+
+    def iter_chunks(self, records: Iterable[dict]) -> Iterator[ImportReport]:
+        """Write ``records`` chunk by chunk, yielding the running report after each commit."""
+        chunk = []
+        try:
+            for line, record in enumerate(records, start=1):
+                if not isinstance(record, dict):
+                    self.report.records += 1
+                    self.report.error(line, "not an object")
+                    continue
+                chunk.append((line, record))
+                if len(chunk) >= settings.import_chunk_size:
+                    self.write_chunk(chunk)
+                    chunk = []
+                    yield self.report
+            if chunk:
+                self.write_chunk(chunk)
+                yield self.report
+        except BaseException:
+            self.db.rollback()
+            # Ids cached during the rolled back chunk may not exist.
+            self._companies.clear()
+            self._dcs.clear()
+            raise
+
+
+def import_stream(stream: IO[bytes], fmt: str, progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """Import a binary stream (UTF-8, BOM allowed); blocking, run it off the event loop."""
+    db = SessionLocal()
+    try:
+        importer = Importer(db)
+        for report in importer.iter_chunks(iter_records(codecs.getreader("utf-8-sig")(stream), fmt)):
+            if progress:
+                progress(report)
+        return importer.report
+    finally:
+        db.close()
+
+
+def import_progress(stream: IO[bytes], fmt: str) -> Iterator[str]:
+    """NDJSON progress lines for an HTTP response; the last one has ``"done": true`` or an ``"error"``.
+
+    Closes ``stream`` when done.
+    """
+    db = SessionLocal()
+    importer = Importer(db)
+    try:
+        for report in importer.iter_chunks(iter_records(codecs.getreader("utf-8-sig")(stream), fmt)):
+            yield json.dumps({**asdict(report), "done": False}, ensure_ascii=False) + "\n"
+        yield json.dumps({**asdict(importer.report), "done": True}, ensure_ascii=False) + "\n"
+    except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+        yield json.dumps({**asdict(importer.report), "done": False, "error": str(exc)}, ensure_ascii=False) + "\n"
+    except SQLAlchemyError as exc:
+        # The chunk being written is rolled back; earlier chunks stay committed, as the report says.
+        error = f"Database error: {getattr(exc, 'orig', None) or exc}"
+        yield json.dumps({**asdict(importer.report), "done": False, "error": error}, ensure_ascii=False) + "\n"
+    finally:
+        db.close()
+        stream.close()
+
+
+def export_records(db: Session) -> Iterator[dict]:
+    """Companies, datacenters, objects and relations, streamed from the database."""
+    partition = settings.import_chunk_size
+    for (name,) in db.execute(select(models.Company.name).order_by(models.Company.id)):
+        yield {"record": "company", "name": name}
+    dcs = db.execute(
+        select(models.Company.name, models.Datacenter.name)
+        .join(models.Datacenter, models.Datacenter.company_id == models.Company.id)
+        .order_by(models.Datacenter.id)
+    )
+    for company, name in dcs:
+        yield {"record": "datacenter", "company": company, "name": name}
+
+    objects = (
+        select(models.Company.name, models.Datacenter.name, models.Object.name, *(getattr(models.Object, f) for f in _OBJECT_FIELDS))
+        .join(models.Datacenter, models.Datacenter.company_id == models.Company.id)
+        .join(models.Object, models.Object.dc_id == models.Datacenter.id)
+        .order_by(models.Object.id)
+        .execution_options(yield_per=partition)
+    )
+    for company, dc, name, *values in db.execute(objects):
+        record = {"record": "object", "company": company, "dc": dc, "name": name, **dict(zip(_OBJECT_FIELDS, values))}
+        record["type"] = record["type"].value
+        yield record
+
+    src, dst = aliased(models.Object), aliased(models.Object)
+    src_dc, dst_dc = aliased(models.Datacenter), aliased(models.Datacenter)
+    src_company, dst_company = aliased(models.Company), aliased(models.Company)
+    relations = (
+        select(
+            src_company.name, src_dc.name, src.name, dst_company.name, dst_dc.name, dst.name,
+            models.Relation.relation_type, models.Relation.note,
+        )
+        .join(src, src.id == models.Relation.src_object_id)
+        .join(src_dc, src_dc.id == src.dc_id)
+        .join(src_company, src_company.id == src_dc.company_id)
+        .join(dst, dst.id == models.Relation.dst_object_id)
+        .join(dst_dc, dst_dc.id == dst.dc_id)
+        .join(dst_company, dst_company.id == dst_dc.company_id)
+        .order_by(models.Relation.id)
+        .execution_options(yield_per=partition)
+    )
+    keys = ("src_company", "src_dc", "src", "dst_company", "dst_dc", "dst", "relation_type", "note")
+    for row in db.execute(relations):
+        yield {"record": "relation", **dict(zip(keys, row))}
+
+
+def export_ndjson() -> Iterator[str]:
+    db = SessionLocal()
+    try:
+        for record in export_records(db):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_cmd = commands.add_parser("import", help="load objects and relations")
+    import_cmd.add_argument("path", help="input file, - for stdin")
+    import_cmd.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    export_cmd = commands.add_parser("export", help="write companies, DCs, objects and relations as NDJSON")
+    export_cmd.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        fmt = args.format or guess_format(args.path)
+
+        def progress(report: ImportReport):
+            print(f"{report.records} records: {report.created} created, {report.updated} updated", file=sys.stderr)
+
+        if args.path == "-":
+            report = import_stream(sys.stdin.buffer, fmt, progress)
+        else:
+            with open(args.path, "rb") as stream:
+                report = import_stream(stream, fmt, progress)
+        print(json.dumps(asdict(report), ensure_ascii=False, indent=2))
+        return
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        out.writelines(export_ndjson())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
+import asyncio
+import contextlib
+import mimetypes
+import tempfile
 from pathlib import Path
 from typing import Optional
 
-from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import crud, models, schemas
-from .auth import login_for_access_token, get_current_user, require_role
-from .db import get_db
+from . import assets, crud, downloads, events, inventory, metrics, models, patching, render, revisions, schemas, search, storage
+from .auth import hash_queue_depth, login_for_access_token, get_current_user, require_role
+from .bodylimit import BodySizeLimitMiddleware
+from .cache import if_none_match
+from .compression import JSONGZipMiddleware
+from .db import SessionLocal, async_engine, get_async_db
 from .settings import settings
 
 app = FastAPI(title="IT Docs")
@@ -21,88 +28,515 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(JSONGZipMiddleware, minimum_size=settings.gzip_minimum_size)
+app.add_middleware(BodySizeLimitMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.gauge("itdocs_password_hash_queue_depth", "Password hash jobs queued or running.", hash_queue_depth)
+metrics.gauge("itdocs_event_subscribers", "Open /api/events streams.", lambda: events.broadcaster.subscribers)
+metrics.gauge(
+    "itdocs_db_pool_checked_out", "Async engine connections in use.", lambda: getattr(async_engine.pool, "checkedout", int)()
+)
+
+
+@app.on_event("startup")
+def build_assets():
+    assets.build()
+
+
+@app.on_event("startup")
+async def start_events():
+    events.broadcaster.start()
+
+
+@app.on_event("shutdown")
+async def stop_events():
+    events.broadcaster.stop()
+
+
+async def prune_tree_changes():
+    while True:
+        await run_in_session(crud.prune_tree_changes)
+        await asyncio.sleep(settings.tree_change_prune_interval)
+
+
+@app.on_event("startup")
+async def start_pruning():
+    app.state.pruner = asyncio.create_task(prune_tree_changes())
+
+
+@app.on_event("shutdown")
+async def stop_pruning():
+    app.state.pruner.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await app.state.pruner
+
+
+def parse_sections(sections: Optional[str]) -> Optional[list[models.PageSection]]:
+    if not sections:
+        return None
+    try:
+        return [models.PageSection(name.strip()) for name in sections.split(",") if name.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unknown section")
+
+
+async def run_in_session(fn, *args):
+    """Run ``fn(db, *args)`` on a sync session in the threadpool.
+
+    For calls that are CPU-bound besides their queries (building and
+    serializing the tree, revision deltas and diffs, patches): through
+    ``AsyncSession.run_sync`` that work would hold the event loop.
+    """
+
+    def call():
+        with SessionLocal(expire_on_commit=False) as db:
+            return fn(db, *args)
+
+    return await run_in_threadpool(call)
 
 
 @app.post("/api/auth/login", response_model=schemas.Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    return await login_for_access_token(form_data, db)
+async def login(
+    request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
+):
+    return await login_for_access_token(request, form_data, db)
 
 
 @app.get("/api/auth/me", response_model=schemas.UserOut)
-def current_user(user: models.User = Depends(get_current_user)):
+async def current_user(user: schemas.UserOut = Depends(get_current_user)):
     return user
 
 
-@app.get("/api/companies", response_model=list[schemas.CompanyOut])
-def list_companies(db: Session = Depends(get_db)):
-    return crud.list_companies(db)
+@app.get("/api/companies", response_model=list[schemas.CompanySummary])
+async def list_companies(request: Request):
+    cached = await run_in_session(crud.get_cached_company_summaries)
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache", "X-Tree-Version": str(cached.version)}
+    if if_none_match(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/datacenters/{dc_id}/objects", response_model=schemas.TreeDatacenter)
+async def datacenter_objects(dc_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    head = await db.run_sync(crud.get_datacenter_head, dc_id)
+    if head is None:
+        raise HTTPException(status_code=404, detail="Datacenter not found")
+    name, version, recent = head
+    # The change log version covers every node change, so it stands in for a body hash.
+    etag = f'W/"dc{dc_id}-{version}-{recent}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Tree-Version": str(version)}
+    if if_none_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(crud.stream_datacenter(dc_id, name, version), media_type="application/json", headers=headers)
 
 
 @app.get("/api/tree", response_model=schemas.TreeResponse)
-def tree(db: Session = Depends(get_db)):
-    return crud.get_tree(db)
+async def tree(request: Request):
+    cached = await run_in_session(crud.get_cached_tree)
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache", "X-Tree-Version": str(cached.version)}
+    if if_none_match(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/events")
+async def live_events():
+    """Server-Sent Events: ``tree`` (a TreeChanges), ``page``, ``incident``, ``document`` and ``resync``."""
+    if events.broadcaster.full:
+        raise HTTPException(status_code=503, detail="Too many live connections", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        events.broadcaster.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/tree/changes", response_model=schemas.TreeChanges)
+async def tree_changes(since: int = Query(0, ge=0), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(crud.get_tree_changes, since)
+
+
+@app.get("/api/objects", response_model=schemas.ObjectPage)
+async def list_objects(
+    filters: schemas.ObjectFilter = Depends(),
+    sort: str = Query("name", pattern="^-?(name|id)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        return await db.run_sync(crud.list_objects, filters, sort, limit, cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.post("/api/objects", response_model=schemas.ObjectOut)
+async def create_object(
+    payload: schemas.ObjectCreate, user: schemas.UserOut = Depends(require_role(models.Role.editor)), db: AsyncSession = Depends(get_async_db)
+):
+    obj = await db.run_sync(crud.create_object, payload)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Datacenter not found")
+    return obj
+
+
+@app.patch("/api/objects/{object_id}", response_model=schemas.ObjectOut)
+async def update_object(
+    object_id: int,
+    payload: schemas.ObjectUpdate,
+    user: schemas.UserOut = Depends(require_role(models.Role.editor)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    obj = await db.run_sync(crud.update_object, object_id, payload)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Object or datacenter not found")
+    return obj
+
+
+@app.delete("/api/objects/{object_id}", status_code=204)
+async def delete_object(object_id: int, user: schemas.UserOut = Depends(require_role(models.Role.admin)), db: AsyncSession = Depends(get_async_db)):
+    if not await db.run_sync(crud.delete_object, object_id):
+        raise HTTPException(status_code=404, detail="Object not found")
+    return Response(status_code=204)
+
+
+async def object_batch(
+    db: AsyncSession, ids: list[int], sections: Optional[list[models.PageSection]], rendered: bool = False
+) -> Response:
+    details = await db.run_sync(crud.get_object_details, ids, sections)
+    if rendered:
+        await run_in_threadpool(render.fill_pages, [page for detail in details.values() for page in detail.pages])
+    batch = schemas.ObjectBatch(objects=details, missing=[i for i in dict.fromkeys(ids) if i not in details])
+    return Response(metrics.dump_json(batch, exclude_unset=True), media_type="application/json")
+
+
+@app.post("/api/objects/batch", response_model=schemas.ObjectBatch)
+async def object_batch_post(payload: schemas.ObjectBatchRequest, rendered: bool = False, db: AsyncSession = Depends(get_async_db)):
+    return await object_batch(db, payload.ids, payload.sections, rendered)
+
+
+@app.get("/api/objects/batch", response_model=schemas.ObjectBatch)
+async def object_batch_get(
+    ids: str, sections: Optional[str] = None, rendered: bool = False, db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        payload = schemas.ObjectBatchRequest(ids=[int(i) for i in ids.split(",") if i.strip()])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be 1 to 500 comma-separated integers")
+    return await object_batch(db, payload.ids, parse_sections(sections), rendered)
+
+
+@app.get("/api/objects/{object_id}/impact", response_model=schemas.GraphWalk)
+async def object_impact(
+    object_id: int,
+    depth: int = Query(10, ge=1, le=50),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    walk = await db.run_sync(crud.walk_relations, object_id, "in", depth, limit)
+    if not walk:
+        raise HTTPException(status_code=404, detail="Object not found")
+    return walk
+
+
+@app.get("/api/objects/{object_id}/dependencies", response_model=schemas.GraphWalk)
+async def object_dependencies(
+    object_id: int,
+    depth: int = Query(10, ge=1, le=50),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    walk = await db.run_sync(crud.walk_relations, object_id, "out", depth, limit)
+    if not walk:
+        raise HTTPException(status_code=404, detail="Object not found")
+    return walk
+
+
+@app.get("/api/relations/path", response_model=schemas.GraphPath)
+async def relation_path(
+    src: int,
+    dst: int,
+    depth: int = Query(10, ge=1, le=50),
+    directed: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+):
+    path = await db.run_sync(crud.relation_path, src, dst, depth, directed)
+    if not path:
+        raise HTTPException(status_code=404, detail="No path between these objects")
+    return path
+
+
+@app.post("/api/relations", response_model=schemas.RelationOut)
+async def create_relation(
+    payload: schemas.RelationCreate, user: schemas.UserOut = Depends(require_role(models.Role.editor)), db: AsyncSession = Depends(get_async_db)
+):
+    relation = await db.run_sync(crud.create_relation, payload)
+    if not relation:
+        raise HTTPException(status_code=404, detail="Object not found")
+    return relation
+
+
+@app.delete("/api/relations/{relation_id}", status_code=204)
+async def delete_relation(
+    relation_id: int, user: schemas.UserOut = Depends(require_role(models.Role.editor)), db: AsyncSession = Depends(get_async_db)
+):
+    if not await db.run_sync(crud.delete_relation, relation_id):
+        raise HTTPException(status_code=404, detail="Relation not found")
+    return Response(status_code=204)
 
 
 @app.get("/api/objects/{object_id}", response_model=schemas.ObjectDetail)
-def object_detail(object_id: int, db: Session = Depends(get_db)):
-    detail = crud.get_object_detail(db, object_id)
+async def object_detail(
+    object_id: int, sections: Optional[str] = None, rendered: bool = False, db: AsyncSession = Depends(get_async_db)
+):
+    detail = await db.run_sync(crud.get_object_detail, object_id, parse_sections(sections))
     if not detail:
         raise HTTPException(status_code=404, detail="Object not found")
-    return detail
+    if rendered:
+        await run_in_threadpool(render.fill_pages, detail.pages)
+    return Response(metrics.dump_json(detail, exclude_unset=True), media_type="application/json")
 
 
-@app.put("/api/pages/{page_id}", response_model=schemas.PageOut)
-def update_page(
-    page_id: int, payload: schemas.PageUpdate, user: models.User = Depends(require_role(models.Role.editor)), db: Session = Depends(get_db)
-):
-    page = crud.update_page(db, page_id, payload.content_md, user)
+async def rendered_page(page: models.Page, anchor: Optional[str] = None) -> schemas.PageOut:
+    result = await run_in_threadpool(render.render_page, page.id, page.updated_at, page.content_md)
+    html = result.html
+    if anchor is not None:
+        html = result.sections.get(anchor)
+        if html is None:
+            raise HTTPException(status_code=404, detail="Heading not found")
+    return schemas.PageOut.model_validate(page).model_copy(update={"html": html, "toc": result.toc})
+
+
+def expected_version(request: Request, version: Optional[int] = None) -> Optional[int]:
+    """Page version from If-Match (``"3"`` as sent back in ETag), else from the body."""
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return version
+    tag = header.strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=412, detail="If-Match must be a page version")
+    return int(tag)
+
+
+async def save_page(response: Response, fn, *args) -> models.Page:
+    try:
+        page = await run_in_session(fn, *args)
+    except crud.VersionConflict as exc:
+        raise HTTPException(status_code=409, detail="Page was changed by someone else", headers={"ETag": f'"{exc.version}"'})
+    except patching.PatchError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
     if not page:
         raise HTTPException(status_code=404, detail="Page not found")
+    response.headers["ETag"] = f'"{page.version}"'
     return page
 
 
+@app.get("/api/pages/{page_id}", response_model=schemas.PageOut)
+async def get_page(
+    page_id: int, response: Response, rendered: bool = False, anchor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)
+):
+    page = await db.run_sync(crud.get_page, page_id)
+    if not page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    response.headers["ETag"] = f'"{page.version}"'
+    if not rendered and anchor is None:
+        return page
+    return await rendered_page(page, anchor)
+
+
+@app.put("/api/pages/{page_id}", response_model=schemas.PageOut)
+async def update_page(
+    page_id: int,
+    payload: schemas.PageUpdate,
+    request: Request,
+    response: Response,
+    rendered: bool = False,
+    user: schemas.UserOut = Depends(require_role(models.Role.editor)),
+):
+    version = expected_version(request, payload.version)
+    page = await save_page(response, crud.update_page, page_id, payload.content_md, user, version)
+    return await rendered_page(page) if rendered else page
+
+
+@app.patch("/api/pages/{page_id}", response_model=schemas.PageOut)
+async def patch_page(
+    page_id: int,
+    payload: schemas.PagePatch,
+    request: Request,
+    response: Response,
+    rendered: bool = False,
+    user: schemas.UserOut = Depends(require_role(models.Role.editor)),
+):
+    version = expected_version(request, payload.version)
+    if version is None:
+        raise HTTPException(status_code=428, detail="If-Match or version is required")
+    page = await save_page(response, crud.patch_page, page_id, payload, user, version)
+    return await rendered_page(page) if rendered else page
+
+
+@app.get("/api/pages/{page_id}/revisions", response_model=list[schemas.PageRevisionOut])
+async def list_page_revisions(
+    page_id: int, limit: int = Query(50, ge=1, le=500), before: Optional[int] = None, db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(revisions.list_revisions, page_id, limit, before)
+
+
+@app.get("/api/pages/{page_id}/revisions/{number}", response_model=schemas.PageRevisionContent)
+async def get_page_revision(page_id: int, number: int):
+    revision = await run_in_session(revisions.get_revision, page_id, number)
+    if not revision:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return revision
+
+
+@app.get("/api/pages/{page_id}/diff", response_model=schemas.PageDiff)
+async def diff_page_revisions(
+    page_id: int, from_number: int = Query(..., alias="from"), to_number: int = Query(..., alias="to")
+):
+    diff = await run_in_session(revisions.diff, page_id, from_number, to_number)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return schemas.PageDiff(page_id=page_id, from_number=from_number, to_number=to_number, diff=diff)
+
+
+@app.post("/api/pages/{page_id}/revisions/{number}/restore", response_model=schemas.PageOut)
+async def restore_page_revision(
+    page_id: int,
+    number: int,
+    request: Request,
+    response: Response,
+    user: schemas.UserOut = Depends(require_role(models.Role.editor)),
+):
+    revision = await run_in_session(revisions.get_revision, page_id, number)
+    if not revision:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return await save_page(response, crud.update_page, page_id, revision["content_md"], user, expected_version(request))
+
+
 @app.post("/api/objects/{object_id}/documents", response_model=schemas.DocumentOut)
-def add_document(
+async def add_document(
     object_id: int,
     title: str = Form(...),
     kind: models.DocumentKind = Form(models.DocumentKind.link),
     url: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    user: models.User = Depends(require_role(models.Role.editor)),
-    db: Session = Depends(get_db),
+    user: schemas.UserOut = Depends(require_role(models.Role.editor)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    path = None
+    path = file_name = content_type = None
     if kind == models.DocumentKind.file:
         if not file:
             raise HTTPException(status_code=400, detail="file is required")
-        dest = settings.upload_dir / file.filename
-        with dest.open("wb") as f:
-            f.write(file.file.read())
-        path = str(dest)
-    doc = crud.create_document(db, object_id, title, kind, path, url)
+        try:
+            stored = await run_in_threadpool(storage.store_stream, file.file)
+        except storage.UploadTooLarge:
+            raise HTTPException(status_code=413, detail="File too large")
+        path = str(stored.path)
+        file_name = Path(file.filename or "").name or None
+        content_type = mimetypes.guess_type(file_name or "")[0] or "application/octet-stream"
+    doc = await db.run_sync(crud.create_document, object_id, title, kind, path, url, file_name, content_type)
     return doc
 
 
 @app.get("/api/objects/{object_id}/documents", response_model=list[schemas.DocumentOut])
-def list_docs(object_id: int, db: Session = Depends(get_db)):
-    return crud.list_documents(db, object_id)
+async def list_docs(
+    object_id: int, limit: int = Query(500, ge=1, le=1000), after: int = 0, db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(crud.list_documents, object_id, limit, after)
+
+
+@app.post("/api/objects/{object_id}/incidents", response_model=schemas.IncidentOut)
+async def add_incident(
+    object_id: int,
+    payload: schemas.IncidentCreate,
+    user: schemas.UserOut = Depends(require_role(models.Role.editor)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    incident = await db.run_sync(crud.create_incident, object_id, payload)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Object not found")
+    return incident
+
+
+@app.post("/api/inventory/import")
+async def import_inventory(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|json|ndjson)$"),
+    user: schemas.UserOut = Depends(require_role(models.Role.admin)),
+):
+    """Import the request body; streams one NDJSON progress line per committed chunk, the last being the final report."""
+    fmt = format or inventory.format_for_content_type(request.headers.get("content-type", ""))
+    # Spool the body first so a slow client does not hold a transaction open.
+    body = tempfile.SpooledTemporaryFile(max_size=8 * settings.upload_chunk_size)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.max_upload_size:
+            body.close()
+            raise HTTPException(status_code=413, detail="File too large")
+        body.write(chunk)
+    body.seek(0)
+    return StreamingResponse(inventory.import_progress(body, fmt), media_type="application/x-ndjson")
+
+
+@app.get("/api/inventory/export")
+async def export_inventory(user: schemas.UserOut = Depends(require_role(models.Role.viewer))):
+    return StreamingResponse(
+        inventory.export_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="inventory.ndjson"'},
+    )
+
+
+@app.get("/api/search", response_model=list[schemas.SearchHit])
+async def full_text_search(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(search.search, q, limit)
+
+
+def upload_file(path: str | Path) -> Optional[Path]:
+    """The file ``path`` names inside ``upload_dir``, or None if it is outside, temporary or missing."""
+    root = settings.upload_dir.resolve()
+    file_path = (root / path).resolve()
+    if root not in file_path.parents or ".tmp" in file_path.relative_to(root).parts or not file_path.is_file():
+        return None
+    return file_path
 
 
 @app.get("/uploads/{path:path}")
-def download_upload(path: str):
-    file_path = settings.upload_dir / path
-    if not file_path.exists():
+async def download_upload(path: str, request: Request):
+    file_path = upload_file(path)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path)
+    return downloads.file_response(request, file_path, file_path.relative_to(settings.upload_dir.resolve()).as_posix())
+
+
+@app.get("/api/documents/{document_id}/file")
+async def download_document(document_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """The uploaded file with its original name and type; documents sharing a blob each get their own."""
+    doc = await db.run_sync(crud.get_document, document_id)
+    file_path = upload_file(doc.file_path) if doc and doc.file_path else None
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    relative = file_path.relative_to(settings.upload_dir.resolve()).as_posix()
+    return downloads.file_response(request, file_path, relative, doc.content_type, doc.file_name)
+
+
+@app.get("/static/{path:path}")
+async def static_file(path: str, request: Request):
+    return assets.static_response(request, path)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
 @app.get("/{full_path:path}")
-def serve_spa(full_path: str):
-    index_path = settings.static_dir / "index.html"
-    if not index_path.exists():
+async def serve_spa(full_path: str, request: Request):
+    response = assets.index_response(request)
+    if response is None:
         raise HTTPException(status_code=500, detail="Frontend missing")
-    return FileResponse(index_path)
-
-
-app.mount("/static", StaticFiles(directory=settings.static_dir), name="static")
+    return response
@@ -0,0 +1,215 @@
+"""Request, SQL and serialization metrics in the Prometheus text format.
+
+``MetricsMiddleware`` times every request under its route template and keeps
+per-request SQL statement counts and time, fed by engine events registered
+with ``instrument_engine``. ``dump_json`` times pydantic serialization. The
+values are per process; scrape each worker, or run one, for totals.
+
+With ``debug_timing_header`` enabled, a request sending ``X-Debug-Timing: 1``
+gets a Server-Timing header with its total, SQL and serialization time and
+an X-Query-Count header.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .settings import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._lock = threading.Lock()
+        # labels -> (per-bucket counts, sum, count)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket = _labels(self.labels, labels, (("le", f"{bound:g}"),))
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                bucket = _labels(self.labels, labels, (("le", "+Inf"),))
+                lines.append(f"{self.name}_bucket{bucket} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total:g}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from ``read``."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name, self.help, self.read = name, help, read
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read():g}"]
+
+
+requests_total = Counter("itdocs_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status"))
+request_seconds = Histogram("itdocs_http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+request_statements = Histogram(
+    "itdocs_http_request_db_statements", "SQL statements issued per request.", ("route",), COUNT_BUCKETS
+)
+request_db_seconds = Histogram("itdocs_http_request_db_seconds", "Time spent in SQL per request.", ("route",))
+statements_total = Counter("itdocs_db_statements_total", "SQL statements executed, in or outside requests.")
+statement_seconds_total = Counter("itdocs_db_statement_seconds_total", "Time spent executing SQL statements.")
+serialization_seconds = Histogram("itdocs_serialization_seconds", "Pydantic JSON serialization time.", ("model",))
+registry: list = [
+    requests_total,
+    request_seconds,
+    request_statements,
+    request_db_seconds,
+    statements_total,
+    statement_seconds_total,
+    serialization_seconds,
+]
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+
+
+# Holds a mutable object so updates made in run_sync greenlets and threadpool copies of the context are seen.
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    statements_total.inc()
+    statement_seconds_total.inc(amount=elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engine(engine):
+    """Count statements of a sync engine (pass ``async_engine.sync_engine`` for the async one)."""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+def gauge(name: str, help: str, read: Callable[[], float]):
+    registry.append(Gauge(name, help, read))
+
+
+def dump_json(model: BaseModel, **kwargs) -> str:
+    start = time.perf_counter()
+    body = model.model_dump_json(**kwargs)
+    elapsed = time.perf_counter() - start
+    serialization_seconds.observe(elapsed, type(model).__name__)
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_seconds += elapsed
+    return body
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        debug = settings.debug_timing_header and Headers(scope=scope).get("x-debug-timing") == "1"
+        status = 500
+
+        async def wrapped_send(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if debug:
+                    headers = MutableHeaders(scope=message)
+                    total = (time.perf_counter() - start) * 1000
+                    headers["Server-Timing"] = (
+                        f'total;dur={total:.2f}, db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", '
+                        f"ser;dur={stats.serialize_seconds * 1000:.2f}"
+                    )
+                    headers["X-Query-Count"] = str(stats.queries)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            request_seconds.observe(time.perf_counter() - start, method, template)
+            requests_total.inc(method, template, str(status))
+            request_statements.observe(stats.queries, template)
+            request_db_seconds.observe(stats.db_seconds, template)
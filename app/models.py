@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, Enum
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, Enum
 from sqlalchemy.orm import relationship
 import enum
 
@@ -52,9 +52,18 @@ class ObjectType(str, enum.Enum):
 
 class Object(Base):
     __tablename__ = "objects"
+    # Inventory import matches objects by (dc, name).
+    __table_args__ = (
+        Index("ix_objects_dc_id_name", "dc_id", "name"),
+        # Keyset pagination in /api/objects.
+        Index("ix_objects_name_id", "name", "id"),
+        Index("ix_objects_ip", "ip"),
+        # Per-DC node lists grouped by type, and the per-type counts of the company summary.
+        Index("ix_objects_dc_id_type_id", "dc_id", "type", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
-    dc_id = Column(Integer, ForeignKey("datacenters.id"), nullable=False)
+    dc_id = Column(Integer, ForeignKey("datacenters.id"), nullable=False, index=True)
     type = Column(Enum(ObjectType), nullable=False)
     name = Column(String, nullable=False)
     status = Column(String, default="ok")
@@ -86,6 +95,7 @@ class PageSection(str, enum.Enum):
 
 class Page(Base):
     __tablename__ = "pages"
+    __table_args__ = (Index("ux_pages_object_section", "object_id", "section", unique=True),)
 
     id = Column(Integer, primary_key=True)
     object_id = Column(Integer, ForeignKey("objects.id"), nullable=False)
@@ -93,17 +103,37 @@ class Page(Base):
     content_md = Column(Text, default="")
     updated_at = Column(DateTime, default=datetime.utcnow)
     updated_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Bumped on every update; a flush against a stale version raises StaleDataError.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     object = relationship("Object", back_populates="pages")
     updated_by_user = relationship("User", back_populates="pages")
 
+    __mapper_args__ = {"version_id_col": version}
+
+
+class PageRevision(Base):
+    """One saved version of a page, see ``app.revisions`` for the ``data`` encoding."""
+
+    __tablename__ = "page_revisions"
+    __table_args__ = (Index("ux_page_revisions_page_number", "page_id", "number", unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    page_id = Column(Integer, ForeignKey("pages.id", ondelete="CASCADE"), nullable=False)
+    number = Column(Integer, nullable=False)
+    snapshot = Column(Boolean, nullable=False, default=False)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
 
 class Relation(Base):
     __tablename__ = "relations"
 
     id = Column(Integer, primary_key=True)
-    src_object_id = Column(Integer, ForeignKey("objects.id"), nullable=False)
-    dst_object_id = Column(Integer, ForeignKey("objects.id"), nullable=False)
+    src_object_id = Column(Integer, ForeignKey("objects.id"), nullable=False, index=True)
+    dst_object_id = Column(Integer, ForeignKey("objects.id"), nullable=False, index=True)
     relation_type = Column(String, default="depends")
     note = Column(String, default="")
 
@@ -120,9 +150,12 @@ class Document(Base):
     __tablename__ = "documents"
 
     id = Column(Integer, primary_key=True)
-    object_id = Column(Integer, ForeignKey("objects.id"), nullable=False)
+    object_id = Column(Integer, ForeignKey("objects.id"), nullable=False, index=True)
     title = Column(String, nullable=False)
     file_path = Column(String, nullable=True)
+    # The uploaded name and type: the stored blob is named by its hash alone.
+    file_name = Column(String, nullable=True)
+    content_type = Column(String, nullable=True)
     url = Column(String, nullable=True)
     kind = Column(Enum(DocumentKind), default=DocumentKind.file)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
@@ -134,7 +167,7 @@ class Incident(Base):
     __tablename__ = "incidents"
 
     id = Column(Integer, primary_key=True)
-    object_id = Column(Integer, ForeignKey("objects.id"), nullable=False)
+    object_id = Column(Integer, ForeignKey("objects.id"), nullable=False, index=True)
     title = Column(String, nullable=False)
     severity = Column(String, default="info")
     symptom = Column(Text, default="")
@@ -144,3 +177,20 @@ class Incident(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     object = relationship("Object", back_populates="incidents")
+
+
+class ChangeAction(str, enum.Enum):
+    added = "added"
+    changed = "changed"
+    removed = "removed"
+
+
+class ObjectChange(Base):
+    __tablename__ = "object_changes"
+
+    id = Column(Integer, primary_key=True)
+    # NULL for a company or DC change (dc_id is NULL too for a company).
+    object_id = Column(Integer, nullable=True)
+    dc_id = Column(Integer, nullable=True)
+    action = Column(Enum(ChangeAction), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
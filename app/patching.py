@@ -0,0 +1,78 @@
+"""Partial page updates: range edits and unified diffs.
+
+Both forms describe changes against one known version of the text and are
+applied strictly, without fuzz: a patch that does not match that text is
+rejected with ``PatchError`` instead of being guessed into place.
+"""
+
+import re
+
+from . import schemas
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    pass
+
+
+def apply_edits(text: str, edits: list[schemas.PageEdit]) -> str:
+    """Replace ``[start, end)`` code point ranges of ``text``; ranges refer to the original text."""
+    ordered = sorted(edits, key=lambda edit: (edit.start, edit.end))
+    parts = []
+    pos = 0
+    for edit in ordered:
+        if edit.start < pos or edit.end < edit.start or edit.end > len(text):
+            raise PatchError("Edits overlap or fall outside the page")
+        parts.append(text[pos : edit.start])
+        parts.append(edit.text)
+        pos = edit.end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """Apply a unified diff (as produced by ``diff -u`` or ``difflib.unified_diff``)."""
+    source = text.splitlines(keepends=True)
+    out = []
+    pos = 0
+    lines = diff.splitlines(keepends=True)
+    i = 0
+    while i < len(lines) and not lines[i].startswith("@@"):
+        i += 1
+    if i == len(lines):
+        raise PatchError("Diff has no hunks")
+    while i < len(lines):
+        match = _HUNK_RE.match(lines[i])
+        if not match:
+            raise PatchError(f"Malformed hunk header: {lines[i].strip()}")
+        old_start, old_len = int(match.group(1)), int(match.group(2) or 1)
+        start = old_start - 1 if old_len else old_start
+        if start < pos or start > len(source):
+            raise PatchError("Hunks overlap or fall outside the page")
+        out.extend(source[pos:start])
+        pos = start
+        i += 1
+        tag = None
+        while i < len(lines) and not lines[i].startswith("@@"):
+            line = lines[i]
+            i += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file" after an added line.
+                if tag == "+" and out[-1].endswith("\n"):
+                    out[-1] = out[-1][:-1]
+                continue
+            # Some editors strip the single space of empty context lines.
+            tag, body = (" ", line) if line in ("\n", "\r\n") else (line[:1], line[1:])
+            if tag == "+":
+                out.append(body)
+                continue
+            if tag not in (" ", "-"):
+                raise PatchError(f"Malformed diff line: {line.strip()}")
+            if pos >= len(source) or source[pos].rstrip("\n") != body.rstrip("\n"):
+                raise PatchError(f"Diff does not match the page at line {pos + 1}")
+            if tag == " ":
+                out.append(source[pos])
+            pos += 1
+    out.extend(source[pos:])
+    return "".join(out)
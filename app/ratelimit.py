@@ -0,0 +1,42 @@
+import threading
+import time
+from collections import deque
+from typing import Hashable, Optional
+
+
+class SlidingWindowLimiter:
+    """Allows at most ``limit`` hits per key within the last ``window`` seconds."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._hits: dict[Hashable, deque] = {}
+
+    def hit(self, key: Hashable) -> Optional[float]:
+        """Record a hit; returns the seconds to wait when ``key`` is over its limit."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                if len(self._hits) >= self.max_keys:
+                    self._prune(now)
+                hits = self._hits[key] = deque()
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return None
+
+    def release(self, key: Hashable):
+        """Take back the latest hit of ``key``, for an attempt that turned out not to count."""
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits:
+                hits.pop()
+
+    def _prune(self, now: float):
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
@@ -0,0 +1,82 @@
+"""Server-side markdown rendering for pages.
+
+Rendered, sanitized HTML and the heading outline are cached by
+``(page_id, updated_at)``; ``crud.update_page`` bumps ``updated_at`` and drops
+the old entry, so a page is rendered again only after it changes.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import markdown
+import nh3
+
+from . import schemas
+from .cache import TTLCache
+from .settings import settings
+
+_TAGS = nh3.ALLOWED_TAGS | {"h1", "h2", "h3", "h4", "h5", "h6", "p", "pre", "code", "table", "thead", "tbody", "tr", "th", "td", "hr", "img", "span"}
+_ATTRIBUTES = {
+    **{tag: {"id"} for tag in ("h1", "h2", "h3", "h4", "h5", "h6")},
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title"},
+    "th": {"align"},
+    "td": {"align"},
+    "code": {"class"},
+}
+_HEADING_RE = re.compile(r'(?=<h[1-6] id="[^"]*">)')
+_ANCHOR_RE = re.compile(r'^<h[1-6] id="([^"]*)">')
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    page_id: int
+    html: str
+    toc: list[schemas.TocEntry]
+    # Anchor -> HTML from that heading up to the next one; "" is the text before the first heading.
+    sections: dict[str, str]
+
+
+render_cache = TTLCache(maxsize=settings.render_cache_size, ttl=float("inf"))
+
+
+def _toc(tokens: list[dict]) -> list[schemas.TocEntry]:
+    entries = []
+    for token in tokens:
+        entries.append(schemas.TocEntry(level=token["level"], title=token["name"], anchor=token["id"]))
+        entries.extend(_toc(token["children"]))
+    return entries
+
+
+def _render(page_id: int, content_md: str) -> RenderedPage:
+    md = markdown.Markdown(extensions=["toc", "tables", "fenced_code", "sane_lists"])
+    html = nh3.clean(md.convert(content_md or ""), tags=_TAGS, attributes=_ATTRIBUTES, link_rel="noopener noreferrer")
+    sections = {}
+    for part in _HEADING_RE.split(html):
+        match = _ANCHOR_RE.match(part)
+        anchor = match.group(1) if match else ""
+        if part.strip():
+            sections[anchor] = part
+    return RenderedPage(page_id=page_id, html=html, toc=_toc(md.toc_tokens), sections=sections)
+
+
+def render_page(page_id: int, updated_at: Optional[datetime], content_md: str) -> RenderedPage:
+    key = (page_id, updated_at)
+    rendered = render_cache.get(key)
+    if rendered is None:
+        rendered = _render(page_id, content_md)
+        render_cache.put(key, rendered)
+    return rendered
+
+
+def fill_pages(pages: list[schemas.PageOut]):
+    """Set ``html`` and ``toc`` on each page; CPU-bound, so the API runs it in a worker thread."""
+    for page in pages:
+        rendered = render_page(page.id, page.updated_at, page.content_md)
+        page.html, page.toc = rendered.html, rendered.toc
+
+
+def forget(page_id: int):
+    render_cache.discard_where(lambda rendered: rendered.page_id == page_id)
@@ -0,0 +1,184 @@
+"""Page revision history.
+
+Every saved version of a page is a ``page_revisions`` row numbered from 1.
+Most rows hold a zlib-compressed line delta against the previous revision;
+every ``revision_snapshot_interval`` revisions, or whenever the delta would
+not be smaller, the full text is stored instead. Rebuilding any revision reads
+one snapshot and at most ``revision_snapshot_interval - 1`` deltas. The
+current text stays in ``pages.content_md``, so reading a page never touches
+this table.
+
+A delta is a JSON list of operations applied to the previous text's lines:
+a positive int copies that many lines, a negative int skips that many and a
+list of strings inserts those lines.
+"""
+
+import difflib
+import json
+import zlib
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .settings import settings
+
+_REVISION_COLUMNS = (
+    models.PageRevision.number,
+    models.PageRevision.snapshot,
+    models.PageRevision.size,
+    models.PageRevision.created_at,
+    models.PageRevision.created_by,
+)
+
+
+def make_delta(old: str, new: str) -> list:
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(b[j1:j2])
+    return ops
+
+
+def apply_delta(old: str, ops: list) -> str:
+    lines = old.splitlines(keepends=True)
+    out = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, list):
+            out.extend(op)
+        elif op > 0:
+            out.extend(lines[pos : pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def _snapshot(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 9)
+
+
+def _delta(old: str, new: str) -> bytes:
+    ops = make_delta(old, new)
+    return zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def record(db: Session, page: models.Page, content_md: str, user_id: Optional[int]) -> Optional[models.PageRevision]:
+    """Add a revision for ``content_md`` before it replaces ``page.content_md``.
+
+    A page without history first gets its current text as revision 1. Returns
+    None when the text does not change. The caller commits.
+    """
+    old = page.content_md or ""
+    if content_md == old:
+        return None
+    last, last_snapshot = db.execute(
+        select(
+            func.max(models.PageRevision.number),
+            func.max(models.PageRevision.number).filter(models.PageRevision.snapshot.is_(True)),
+        ).where(models.PageRevision.page_id == page.id)
+    ).one()
+    if last is None:
+        db.add(
+            models.PageRevision(
+                page_id=page.id,
+                number=1,
+                snapshot=True,
+                data=_snapshot(old),
+                size=len(old),
+                created_at=page.updated_at,
+                created_by=page.updated_by,
+            )
+        )
+        last = last_snapshot = 1
+
+    number = last + 1
+    data = _snapshot(content_md)
+    snapshot = number - last_snapshot >= settings.revision_snapshot_interval
+    if not snapshot:
+        delta = _delta(old, content_md)
+        snapshot = len(delta) >= len(data)
+        if not snapshot:
+            data = delta
+    revision = models.PageRevision(
+        page_id=page.id,
+        number=number,
+        snapshot=snapshot,
+        data=data,
+        size=len(content_md),
+        created_at=datetime.utcnow(),
+        created_by=user_id,
+    )
+    db.add(revision)
+    return revision
+
+
+def list_revisions(db: Session, page_id: int, limit: int = 50, before: Optional[int] = None) -> list:
+    """Newest first; pass the last ``number`` seen as ``before`` for the next page."""
+    query = select(*_REVISION_COLUMNS).where(models.PageRevision.page_id == page_id)
+    if before is not None:
+        query = query.where(models.PageRevision.number < before)
+    return db.execute(query.order_by(models.PageRevision.number.desc()).limit(limit)).mappings().all()
+
+
+def get_revision(db: Session, page_id: int, number: int) -> Optional[dict]:
+    """Revision metadata plus its rebuilt ``content_md``, or None if it does not exist."""
+    base = db.execute(
+        select(models.PageRevision.number, models.PageRevision.data)
+        .where(
+            models.PageRevision.page_id == page_id,
+            models.PageRevision.snapshot.is_(True),
+            models.PageRevision.number <= number,
+        )
+        .order_by(models.PageRevision.number.desc())
+        .limit(1)
+    ).first()
+    if base is None:
+        return None
+    rows = db.execute(
+        select(*_REVISION_COLUMNS, models.PageRevision.data)
+        .where(
+            models.PageRevision.page_id == page_id,
+            models.PageRevision.number >= base.number,
+            models.PageRevision.number <= number,
+        )
+        .order_by(models.PageRevision.number)
+    ).mappings().all()
+    if rows[-1]["number"] != number:
+        return None
+    text = zlib.decompress(base.data).decode("utf-8")
+    for row in rows[1:]:
+        text = apply_delta(text, json.loads(zlib.decompress(row["data"])))
+    meta = {key: rows[-1][key] for key in rows[-1].keys() if key != "data"}
+    return {**meta, "content_md": text}
+
+
+def diff(db: Session, page_id: int, from_number: int, to_number: int) -> Optional[str]:
+    """Unified diff between two revisions, or None if either is missing."""
+    old = get_revision(db, page_id, from_number)
+    new = get_revision(db, page_id, to_number)
+    if old is None or new is None:
+        return None
+    return "".join(
+        difflib.unified_diff(
+            old["content_md"].splitlines(keepends=True),
+            new["content_md"].splitlines(keepends=True),
+            fromfile=f"r{from_number}",
+            tofile=f"r{to_number}",
+        )
+    )
+
+
+def remove_pages(db: Session, page_ids: list[int]):
+    if page_ids:
+        db.execute(delete(models.PageRevision).where(models.PageRevision.page_id.in_(page_ids)))
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, RootModel, model_validator
 
 from .models import Role, ObjectType, PageSection, DocumentKind
 
@@ -55,16 +55,104 @@ class ObjectOut(ORMBase):
     description: Optional[str]
 
 
+class ObjectFilter(BaseModel):
+    company_id: Optional[int] = None
+    dc_id: Optional[int] = None
+    type: Optional[ObjectType] = None
+    status: Optional[str] = None
+    tag: Optional[str] = None
+    ip_prefix: Optional[str] = None
+
+
+class ObjectPage(BaseModel):
+    items: List[ObjectOut]
+    # Pass back as ``cursor`` for the next page; None on the last page.
+    next_cursor: Optional[str] = None
+
+
+class ObjectCreate(BaseModel):
+    dc_id: int
+    type: ObjectType
+    name: str
+    status: str = "ok"
+    ip: Optional[str] = None
+    fqdn: Optional[str] = None
+    tags: Optional[str] = None
+    description: Optional[str] = None
+
+
+class ObjectUpdate(BaseModel):
+    dc_id: Optional[int] = None
+    type: Optional[ObjectType] = None
+    name: Optional[str] = None
+    status: Optional[str] = None
+    ip: Optional[str] = None
+    fqdn: Optional[str] = None
+    tags: Optional[str] = None
+    description: Optional[str] = None
+
+
+class TocEntry(BaseModel):
+    level: int
+    title: str
+    anchor: str
+
+
 class PageOut(ORMBase):
     id: int
     section: PageSection
     content_md: str
     updated_at: datetime
     updated_by: Optional[int]
+    version: int
+    # Sanitized HTML and heading outline, only when rendering was requested.
+    html: Optional[str] = None
+    toc: Optional[list[TocEntry]] = None
 
 
 class PageUpdate(BaseModel):
     content_md: str
+    # Expected current version; the If-Match header can be used instead.
+    version: Optional[int] = None
+
+
+class PageEdit(BaseModel):
+    """Replace the ``[start, end)`` code point range of the base text with ``text``."""
+
+    start: int = Field(ge=0)
+    end: int = Field(ge=0)
+    text: str = ""
+
+
+class PagePatch(BaseModel):
+    version: Optional[int] = None
+    edits: Optional[list[PageEdit]] = None
+    diff: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _one_form(self):
+        if (self.edits is None) == (self.diff is None):
+            raise ValueError("Send either edits or diff")
+        return self
+
+
+class PageRevisionOut(ORMBase):
+    number: int
+    snapshot: bool
+    size: int
+    created_at: Optional[datetime]
+    created_by: Optional[int]
+
+
+class PageRevisionContent(PageRevisionOut):
+    content_md: str
+
+
+class PageDiff(BaseModel):
+    page_id: int
+    from_number: int
+    to_number: int
+    diff: str
 
 
 class RelationOut(ORMBase):
@@ -75,11 +163,61 @@ class RelationOut(ORMBase):
     dst_object_id: int
 
 
+class RelationCreate(BaseModel):
+    src_object_id: int
+    dst_object_id: int
+    relation_type: str = "depends"
+    note: str = ""
+
+    @model_validator(mode="after")
+    def _no_self_loop(self):
+        if self.src_object_id == self.dst_object_id:
+            raise ValueError("An object cannot depend on itself")
+        return self
+
+
+class GraphObject(BaseModel):
+    id: int
+    dc_id: int
+    type: ObjectType
+    name: str
+    status: str
+
+
+class GraphNode(GraphObject):
+    depth: int
+    # The object this one was reached from, and the relation between them.
+    via: int
+    relation_type: str
+
+
+class GraphWalk(BaseModel):
+    object_id: int
+    direction: str
+    max_depth: int
+    total: int
+    truncated: bool
+    nodes: List[GraphNode]
+
+
+class GraphPathStep(GraphObject):
+    relation_id: Optional[int]
+
+
+class GraphPath(BaseModel):
+    src_object_id: int
+    dst_object_id: int
+    length: int
+    steps: List[GraphPathStep]
+
+
 class DocumentOut(ORMBase):
     id: int
     object_id: int
     title: str
     file_path: Optional[str]
+    file_name: Optional[str] = None
+    content_type: Optional[str] = None
     url: Optional[str]
     kind: DocumentKind
     uploaded_at: datetime
@@ -103,12 +241,31 @@ class IncidentOut(ORMBase):
     created_at: datetime
 
 
+class IncidentCreate(BaseModel):
+    title: str
+    severity: str = "info"
+    symptom: str = ""
+    cause: str = ""
+    check: str = ""
+    resolution: str = ""
+
+
 class ObjectDetail(BaseModel):
     object: ObjectOut
     pages: List[PageOut]
-    relations: List[RelationOut]
-    documents: List[DocumentOut]
-    incidents: List[IncidentOut]
+    relations: Optional[List[RelationOut]] = None
+    documents: Optional[List[DocumentOut]] = None
+    incidents: Optional[List[IncidentOut]] = None
+
+
+class ObjectBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=500)
+    sections: Optional[List[PageSection]] = None
+
+
+class ObjectBatch(BaseModel):
+    objects: Dict[int, ObjectDetail]
+    missing: List[int]
 
 
 class TreeNode(BaseModel):
@@ -134,4 +291,47 @@ class TreeCompany(BaseModel):
 
 
 class TreeResponse(BaseModel):
+    version: int = 0
     companies: List[TreeCompany]
+
+
+class DatacenterSummary(BaseModel):
+    """A DC without its nodes: object counts per tree group."""
+
+    id: int
+    name: str
+    services: int = 0
+    servers: int = 0
+    network: int = 0
+
+
+class CompanySummary(BaseModel):
+    id: int
+    name: str
+    dcs: List[DatacenterSummary]
+
+
+class CompanySummaries(RootModel[List[CompanySummary]]):
+    pass
+
+
+class TreeUpsert(BaseModel):
+    dc_id: int
+    node: TreeNode
+
+
+class TreeChanges(BaseModel):
+    version: int
+    reset: bool = False
+    upserts: List[TreeUpsert] = []
+    removed: List[int] = []
+
+
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    object_id: int
+    tab: str
+    title: str
+    snippet: str
+    score: float
@@ -0,0 +1,185 @@
+"""Full-text search over objects, pages, documents and incidents.
+
+Everything lives in one ``search_index`` table: an FTS5 virtual table on
+SQLite, a table with a generated tsvector and a GIN index on PostgreSQL. Each
+entity maps to a fixed rowid (``ref_id * len(KINDS) + kind``), so the write
+paths in ``crud`` can replace a single entry by primary key instead of
+scanning the index.
+"""
+
+import re
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+KINDS = ("object", "page", "document", "incident")
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+
+_CREATE_SQL = {
+    "sqlite": (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, object_id UNINDEXED, tab UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ),
+    "postgresql": (
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "rowid BIGINT PRIMARY KEY, kind VARCHAR NOT NULL, ref_id INTEGER NOT NULL, object_id INTEGER NOT NULL, "
+        "tab VARCHAR NOT NULL, title TEXT NOT NULL, body TEXT NOT NULL, "
+        "document TSVECTOR GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')) STORED)",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)",
+    ),
+}
+
+_INSERT = "INSERT INTO search_index(rowid, kind, ref_id, object_id, tab, title, body) "
+_OBJECT_ROWS = (
+    _INSERT + "SELECT id * 4, 'object', id, id, 'overview', name, "
+    "coalesce(ip, '') || ' ' || coalesce(fqdn, '') || ' ' || coalesce(tags, '') || ' ' || coalesce(description, '') "
+    "FROM objects"
+)
+_PAGE_ROWS = (
+    _INSERT + "SELECT p.id * 4 + 1, 'page', p.id, p.object_id, CAST(p.section AS VARCHAR), "
+    "o.name || ' / ' || CAST(p.section AS VARCHAR), coalesce(p.content_md, '') "
+    "FROM pages p JOIN objects o ON o.id = p.object_id"
+)
+_REBUILD_SQL = (
+    "DELETE FROM search_index",
+    _OBJECT_ROWS,
+    _PAGE_ROWS,
+    _INSERT + "SELECT id * 4 + 2, 'document', id, object_id, 'docs', title, coalesce(url, file_path, '') "
+    "FROM documents",
+    _INSERT + "SELECT id * 4 + 3, 'incident', id, object_id, 'inc', title, "
+    "coalesce(symptom, '') || ' ' || coalesce(cause, '') || ' ' || coalesce(\"check\", '') || ' ' || coalesce(resolution, '') "
+    "FROM incidents",
+)
+_REINDEX_OBJECTS_SQL = (
+    text("DELETE FROM search_index WHERE rowid IN :rowids").bindparams(bindparam("rowids", expanding=True)),
+    text(_OBJECT_ROWS + " WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+    text(_PAGE_ROWS + " WHERE o.id IN :ids").bindparams(bindparam("ids", expanding=True)),
+)
+
+# Both queries return higher scores for better hits.
+_SEARCH_SQL = {
+    "sqlite": text(
+        "SELECT kind, ref_id, object_id, tab, title, "
+        "snippet(search_index, -1, :open, :close, '…', 12), "
+        "-bm25(search_index, 0.0, 0.0, 0.0, 0.0, 10.0, 1.0) AS score "
+        "FROM search_index WHERE search_index MATCH :query ORDER BY score DESC LIMIT :limit"
+    ),
+    "postgresql": text(
+        "SELECT kind, ref_id, object_id, tab, title, "
+        "ts_headline('simple', body, q, 'StartSel=' || :open || ', StopSel=' || :close || ', MaxWords=12, MinWords=4'), "
+        "ts_rank(document, q) AS score "
+        "FROM search_index, to_tsquery('simple', :query) AS q WHERE document @@ q ORDER BY score DESC LIMIT :limit"
+    ),
+}
+
+
+def _dialect(db) -> str:
+    bind = db.get_bind() if isinstance(db, Session) else db
+    return bind.dialect.name
+
+
+def _rowid(kind: str, ref_id: int) -> int:
+    return ref_id * len(KINDS) + KINDS.index(kind)
+
+
+def _join(*parts) -> str:
+    return " ".join(p for p in parts if p)
+
+
+def create_index(db):
+    for statement in _CREATE_SQL[_dialect(db)]:
+        db.execute(text(statement))
+
+
+def rebuild(db):
+    for statement in _REBUILD_SQL:
+        db.execute(text(statement))
+
+
+def reindex_objects(db, object_ids: list[int]):
+    """Refresh the object and page entries of ``object_ids`` with set-based statements, for bulk writes."""
+    if not object_ids:
+        return
+    page_ids = db.execute(select(models.Page.id).where(models.Page.object_id.in_(object_ids))).scalars().all()
+    rowids = [_rowid("object", i) for i in object_ids] + [_rowid("page", i) for i in page_ids]
+    delete_sql, objects_sql, pages_sql = _REINDEX_OBJECTS_SQL
+    db.execute(delete_sql, {"rowids": rowids})
+    db.execute(objects_sql, {"ids": object_ids})
+    db.execute(pages_sql, {"ids": object_ids})
+
+
+def remove(db, kind: str, ref_id: int):
+    db.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), {"rowid": _rowid(kind, ref_id)})
+
+
+def _upsert(db, kind: str, ref_id: int, object_id: int, tab: str, title: str, body: str):
+    remove(db, kind, ref_id)
+    db.execute(
+        text(
+            "INSERT INTO search_index(rowid, kind, ref_id, object_id, tab, title, body) "
+            "VALUES (:rowid, :kind, :ref_id, :object_id, :tab, :title, :body)"
+        ),
+        {
+            "rowid": _rowid(kind, ref_id),
+            "kind": kind,
+            "ref_id": ref_id,
+            "object_id": object_id,
+            "tab": tab,
+            "title": title,
+            "body": body,
+        },
+    )
+
+
+def index_object(db, obj: models.Object):
+    _upsert(db, "object", obj.id, obj.id, "overview", obj.name, _join(obj.ip, obj.fqdn, obj.tags, obj.description))
+
+
+def index_page(db, page: models.Page, object_name: str):
+    section = page.section.value
+    _upsert(db, "page", page.id, page.object_id, section, f"{object_name} / {section}", page.content_md or "")
+
+
+def index_document(db, doc: models.Document):
+    _upsert(db, "document", doc.id, doc.object_id, "docs", doc.title, doc.url or doc.file_path or "")
+
+
+def index_incident(db, incident: models.Incident):
+    _upsert(
+        db,
+        "incident",
+        incident.id,
+        incident.object_id,
+        "inc",
+        incident.title,
+        _join(incident.symptom, incident.cause, incident.check, incident.resolution),
+    )
+
+
+def build_query(q: str, dialect: str = "sqlite") -> str:
+    """Turn free user input into a full-text query: every word must match as a prefix."""
+    words = re.findall(r"\w+", q)
+    if dialect == "postgresql":
+        return " & ".join(f"{word}:*" for word in words)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(db, q: str, limit: int = 20) -> list[schemas.SearchHit]:
+    dialect = _dialect(db)
+    query = build_query(q, dialect)
+    if not query:
+        return []
+    rows = db.execute(
+        _SEARCH_SQL[dialect], {"query": query, "limit": limit, "open": SNIPPET_OPEN, "close": SNIPPET_CLOSE}
+    ).all()
+    return [
+        schemas.SearchHit(
+            kind=kind, id=ref_id, object_id=object_id, tab=tab, title=title, snippet=snippet, score=score
+        )
+        for kind, ref_id, object_id, tab, title, snippet, score in rows
+    ]
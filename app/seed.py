@@ -1,118 +1,191 @@
-from datetime import datetime
+import argparse
+import time
+
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
-from .db import SessionLocal, engine
-from . import models
-from .auth import get_password_hash
+from .db import SessionLocal
+from . import models, search
+from .cache import tree_cache
+from .crud import default_page_rows, log_structure_change
+from .auth import get_password_hash, invalidate_user, verify_password
+
+CHUNK = 5000
+
+USERS = (
+    ("admin", "admin", models.Role.admin, "Admin"),
+    ("editor", "editor", models.Role.editor, "Editor"),
+    ("viewer", "viewer", models.Role.viewer, "Viewer"),
+)
+
+# company -> datacenter -> (type, name, status, ip)
+FIXTURE = {
+    "Первый Дом": {
+        "Прохорова": [
+            (models.ObjectType.service, "RDS (Terminal Farm)", "ok", None),
+            (models.ObjectType.service, "Exchange", "ok", None),
+            (models.ObjectType.service, "VPN", "warn", None),
+            (models.ObjectType.server, "PD-RDCB01", "ok", "10.98.10.10"),
+            (models.ObjectType.server, "PD-RDGW01", "ok", "10.98.10.11"),
+            (models.ObjectType.server, "PD-RDSH01", "ok", "10.98.10.21"),
+            (models.ObjectType.server, "PD-RDSH02", "ok", "10.98.10.22"),
+            (models.ObjectType.server, "PD-EXCH01", "ok", "10.98.20.10"),
+            (models.ObjectType.server, "PD-DC01", "ok", "10.98.1.71"),
+            (models.ObjectType.server, "PD-FS01", "ok", "10.98.30.10"),
+            (models.ObjectType.network, "PD-FW-01", "warn", "10.98.0.1"),
+            (models.ObjectType.network, "PD-SW-CORE-01", "ok", "10.98.0.2"),
+        ],
+    },
+    "Первая приемная": {
+        "Машкова": [
+            (models.ObjectType.service, "1C (App + DB)", "ok", None),
+            (models.ObjectType.service, "RDS (Office)", "warn", None),
+            (models.ObjectType.service, "Backup", "ok", None),
+            (models.ObjectType.server, "PP-1C01", "ok", "10.96.3.11"),
+            (models.ObjectType.server, "PP-PG01", "ok", "10.96.3.12"),
+            (models.ObjectType.server, "PP-RDSH01", "ok", "10.96.4.21"),
+            (models.ObjectType.server, "PP-DC01", "ok", "10.96.11.71"),
+            (models.ObjectType.server, "PP-FS01", "ok", "10.96.5.10"),
+            (models.ObjectType.network, "PP-FW-01", "ok", "10.96.0.1"),
+            (models.ObjectType.network, "PP-SW-CORE-01", "ok", "10.96.0.2"),
+        ],
+    },
+}
+
+# (src name, dst name, relation type)
+RELATIONS = [
+    ("RDS (Terminal Farm)", "PD-RDCB01", "uses"),
+    ("Exchange", "PD-EXCH01", "uses"),
+    ("VPN", "PD-FW-01", "uses"),
+]
+
+INCIDENTS = [
+    {"object": "RDS (Terminal Farm)", "title": "Проблемы с сессиями", "severity": "high", "symptom": "Пользователи не могут подключиться", "cause": "RDCB", "check": "Проверить службы", "resolution": "Перезапуск"},
+    {"object": "PD-RDSH01", "title": "Высокая нагрузка", "severity": "medium", "symptom": "CPU 100%", "cause": "Много сессий", "check": "Проверить процессы", "resolution": "Добавить узел"},
+]
+
+DOCUMENTS = [
+    {"object": "RDS (Terminal Farm)", "title": "Схема RDS", "url": "https://example.com/rds"},
+    {"object": "Exchange", "title": "Exchange plan", "url": "https://example.com/exch"},
+]
 
 
 def create_user(db: Session, username: str, password: str, role: models.Role, full_name: str):
+    """Create or update a user; the password is rehashed only when the stored hash does not match it.
+
+    Keeping a matching hash also keeps the token fingerprint, so reseeding
+    does not log everyone out.
+    """
     user = db.query(models.User).filter_by(username=username).first()
-    hashed = get_password_hash(password)
-    if user:
+    if user and verify_password(password, user.hashed_password):
+        if (user.role, user.full_name) == (role, full_name):
+            return
+        user.role = role
+        user.full_name = full_name
+    elif user:
         user.role = role
         user.full_name = full_name
-        user.hashed_password = hashed
+        user.hashed_password = get_password_hash(password)
     else:
-        user = models.User(username=username, hashed_password=hashed, role=role, full_name=full_name)
+        user = models.User(username=username, hashed_password=get_password_hash(password), role=role, full_name=full_name)
         db.add(user)
     db.commit()
-
-
-def seed_core():
-    db = SessionLocal()
-    models.Base.metadata.create_all(bind=engine)
-
-    create_user(db, "admin", "admin", models.Role.admin, "Admin")
-    create_user(db, "editor", "editor", models.Role.editor, "Editor")
-    create_user(db, "viewer", "viewer", models.Role.viewer, "Viewer")
-
-    if db.query(models.Company).count() > 0:
-        db.close()
-        return
-
-    pd = models.Company(name="Первый Дом")
-    pp = models.Company(name="Первая приемная")
-    db.add_all([pd, pp])
-    db.commit()
-
-    dc_pd = models.Datacenter(company_id=pd.id, name="Прохорова")
-    dc_pp = models.Datacenter(company_id=pp.id, name="Машкова")
-    db.add_all([dc_pd, dc_pp])
-    db.commit()
-
-    def add_object(dc, type_, name, status="ok", ip=None):
-        obj = models.Object(dc_id=dc.id, type=type_, name=name, status=status, ip=ip)
-        db.add(obj)
-        db.commit()
-        for section in models.PageSection:
-            db.add(models.Page(object_id=obj.id, section=section, content_md=f"## {name} — {section.value}\n\nОписание."))
-        db.commit()
-        return obj
-
-    # PD objects
-    pd_services = [
-        ("RDS (Terminal Farm)", "ok"),
-        ("Exchange", "ok"),
-        ("VPN", "warn"),
-    ]
-    pd_servers = [
-        ("PD-RDCB01", "10.98.10.10"),
-        ("PD-RDGW01", "10.98.10.11"),
-        ("PD-RDSH01", "10.98.10.21"),
-        ("PD-RDSH02", "10.98.10.22"),
-        ("PD-EXCH01", "10.98.20.10"),
-        ("PD-DC01", "10.98.1.71"),
-        ("PD-FS01", "10.98.30.10"),
+    invalidate_user(username)
+
+
+def synthetic_objects(dc_id: int, dc_name: str, count: int) -> list[dict]:
+    types = list(models.ObjectType)
+    prefix = "".join(ch for ch in dc_name if ch.isalnum())[:8].upper() or f"DC{dc_id}"
+    return [
+        {
+            "dc_id": dc_id,
+            "type": types[n % len(types)],
+            "name": f"{prefix}-{types[n % len(types)].value.upper()}-{n:06d}",
+            "status": "ok",
+            "ip": None if types[n % len(types)] == models.ObjectType.service else f"10.{dc_id % 256}.{n >> 8 & 255}.{n & 255}",
+        }
+        for n in range(count)
     ]
-    pd_network = [
-        ("PD-FW-01", "10.98.0.1", "warn"),
-        ("PD-SW-CORE-01", "10.98.0.2", "ok"),
-    ]
-
-    svc_objs = [add_object(dc_pd, models.ObjectType.service, n, status=s) for n, s in pd_services]
-    srv_objs = [add_object(dc_pd, models.ObjectType.server, n, ip=ip) for n, ip in pd_servers]
-    net_objs = [add_object(dc_pd, models.ObjectType.network, n, status=s, ip=ip) for n, ip, s in pd_network]
 
-    # Relations example
-    db.add_all([
-        models.Relation(src_object_id=svc_objs[0].id, dst_object_id=srv_objs[0].id, relation_type="uses"),
-        models.Relation(src_object_id=svc_objs[1].id, dst_object_id=srv_objs[4].id, relation_type="uses"),
-        models.Relation(src_object_id=svc_objs[2].id, dst_object_id=net_objs[0].id, relation_type="uses"),
-    ])
-    db.commit()
 
-    # incidents
-    db.add(models.Incident(object_id=svc_objs[0].id, title="Проблемы с сессиями", severity="high", symptom="Пользователи не могут подключиться", cause="RDCB", check="Проверить службы", resolution="Перезапуск"))
-    db.add(models.Incident(object_id=srv_objs[2].id, title="Высокая нагрузка", severity="medium", symptom="CPU 100%", cause="Много сессий", check="Проверить процессы", resolution="Добавить узел"))
-    db.commit()
-
-    # documents
-    db.add(models.Document(object_id=svc_objs[0].id, title="Схема RDS", url="https://example.com/rds", kind=models.DocumentKind.link))
-    db.add(models.Document(object_id=svc_objs[1].id, title="Exchange plan", url="https://example.com/exch", kind=models.DocumentKind.link))
-    db.commit()
-
-    # PP objects
-    pp_services = [("1C (App + DB)", "ok"), ("RDS (Office)", "warn"), ("Backup", "ok")]
-    pp_servers = [
-        ("PP-1C01", "10.96.3.11"),
-        ("PP-PG01", "10.96.3.12"),
-        ("PP-RDSH01", "10.96.4.21"),
-        ("PP-DC01", "10.96.11.71"),
-        ("PP-FS01", "10.96.5.10"),
-    ]
-    pp_network = [("PP-FW-01", "10.96.0.1", "ok"), ("PP-SW-CORE-01", "10.96.0.2", "ok")]
+def _insert_objects(db: Session, rows: list[dict]) -> dict[str, int]:
+    """Insert objects with their default pages and change-log rows; returns ids by name."""
+    # Core statements on the session's connection: ORM bulk INSERT .. RETURNING is quadratic in the row count.
+    conn = db.connection()
+    ids = {}
+    for start in range(0, len(rows), CHUNK):
+        created = conn.execute(
+            insert(models.Object).returning(models.Object.id, models.Object.name, models.Object.dc_id),
+            rows[start : start + CHUNK],
+        ).all()
+        conn.execute(insert(models.Page), [row for obj in created for row in default_page_rows(obj.id, obj.name)])
+        conn.execute(
+            insert(models.ObjectChange),
+            [{"object_id": obj.id, "dc_id": obj.dc_id, "action": models.ChangeAction.added} for obj in created],
+        )
+        ids.update((obj.name, obj.id) for obj in created)
+    return ids
+
+
+def seed_fixture(db: Session, objects_per_dc: int = 0) -> int:
+    """Insert the demo companies with bulk statements; the caller commits. Returns the number of objects."""
+    rows = []
+    for company_name, datacenters in FIXTURE.items():
+        company_id = db.execute(insert(models.Company).values(name=company_name).returning(models.Company.id)).scalar_one()
+        log_structure_change(db, models.ChangeAction.added)
+        for dc_name, objects in datacenters.items():
+            dc_id = db.execute(
+                insert(models.Datacenter).values(company_id=company_id, name=dc_name).returning(models.Datacenter.id)
+            ).scalar_one()
+            log_structure_change(db, models.ChangeAction.added, dc_id)
+            rows += [{"dc_id": dc_id, "type": t, "name": n, "status": s, "ip": ip} for t, n, s, ip in objects]
+            rows += synthetic_objects(dc_id, dc_name, objects_per_dc)
+    ids = _insert_objects(db, rows)
+
+    db.execute(
+        insert(models.Relation),
+        [{"src_object_id": ids[src], "dst_object_id": ids[dst], "relation_type": kind} for src, dst, kind in RELATIONS],
+    )
+    db.execute(
+        insert(models.Incident),
+        [{**{k: v for k, v in row.items() if k != "object"}, "object_id": ids[row["object"]]} for row in INCIDENTS],
+    )
+    db.execute(
+        insert(models.Document),
+        [
+            {"object_id": ids[row["object"]], "title": row["title"], "url": row["url"], "kind": models.DocumentKind.link}
+            for row in DOCUMENTS
+        ],
+    )
+    search.rebuild(db)
+    return len(rows)
+
+
+def seed_core(objects_per_dc: int = 0):
+    """Seed a database already brought up to date by ``alembic upgrade head``."""
+    with SessionLocal() as db:
+        for username, password, role, full_name in USERS:
+            create_user(db, username, password, role, full_name)
+
+        if db.execute(select(models.Company.id).limit(1)).first() is not None:
+            return 0
+        count = seed_fixture(db, objects_per_dc)
+        db.commit()
+    tree_cache.invalidate()
+    return count
 
-    add_object(dc_pp, models.ObjectType.service, pp_services[0][0], status=pp_services[0][1])
-    add_object(dc_pp, models.ObjectType.service, pp_services[1][0], status=pp_services[1][1])
-    add_object(dc_pp, models.ObjectType.service, pp_services[2][0], status=pp_services[2][1])
-    for n, ip in pp_servers:
-        add_object(dc_pp, models.ObjectType.server, n, ip=ip)
-    for n, ip, s in pp_network:
-        add_object(dc_pp, models.ObjectType.network, n, status=s, ip=ip)
 
-    db.close()
+def main():
+    parser = argparse.ArgumentParser(description="Create the default users and, on an empty database, the demo inventory.")
+    parser.add_argument(
+        "--objects-per-dc", type=int, default=0, help="also generate this many synthetic objects in every demo DC"
+    )
+    args = parser.parse_args()
+    started = time.perf_counter()
+    count = seed_core(args.objects_per_dc)
+    if count:
+        print(f"Seeded {count} objects in {time.perf_counter() - started:.1f}s")
 
 
 if __name__ == "__main__":
-    seed_core()
+    main()
@@ -0,0 +1,71 @@
+"""Content-addressed storage for uploaded files.
+
+Uploads are copied in chunks into a temporary file while being hashed, then
+moved to ``<upload_dir>/<sha[:2]>/<sha[2:4]>/<sha>``. A file that is already
+stored under that name is not written again, whatever it was called: the
+original name and type live on the document row. Files stored by older
+versions keep their ``<sha><suffix>`` names.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from .settings import settings
+
+_CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{64}(\.[A-Za-z0-9]{1,10})?$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    path: Path
+    sha256: str
+    size: int
+    created: bool
+
+
+def content_path(sha256: str) -> Path:
+    return settings.upload_dir / sha256[:2] / sha256[2:4] / sha256
+
+
+def is_content_addressed(path: Path) -> bool:
+    """True for files stored by ``store_stream``: their bytes never change."""
+    return bool(_CONTENT_NAME_RE.match(path.name)) and path.parent.name == path.name[2:4]
+
+
+def store_stream(stream: BinaryIO, max_size: int | None = None) -> StoredFile:
+    """Copy ``stream`` into the store; blocking, run it off the event loop."""
+    max_size = settings.max_upload_size if max_size is None else max_size
+    tmp_dir = settings.upload_dir / ".tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := stream.read(settings.upload_chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"upload exceeds {max_size} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        dest = content_path(sha256)
+        if dest.exists():
+            os.unlink(tmp_name)
+            return StoredFile(path=dest, sha256=sha256, size=size, created=False)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, dest)
+        return StoredFile(path=dest, sha256=sha256, size=size, created=True)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
@@ -0,0 +1,4 @@
+"""Benchmarks for IT Docs: synthetic inventories, crud micro-benchmarks and an HTTP load test.
+
+    python -m benchmarks --companies 10 --dcs 50 --objects 1000 --output bench.json
+"""
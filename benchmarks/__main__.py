@@ -0,0 +1,118 @@
+"""Build a synthetic inventory, run the micro-benchmarks and an HTTP load scenario, print JSON.
+
+The app is pointed at a scratch SQLite database (or at ``--database-url``,
+which must be an empty database), since the benchmarks write to it. Pass an
+earlier result as ``--baseline`` to add median and throughput ratios against
+it; values above 1 are slower (for latency) or faster (for rps).
+
+    python -m benchmarks --companies 10 --dcs 50 --objects 1000 --output bench.json
+    python -m benchmarks --output after.json --baseline bench.json --skip-datagen --workdir /tmp/itdocs-bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .scale import add_arguments, scale_from
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(result: dict, baseline: dict) -> dict:
+    ratios = {}
+    for name, case in result.get("micro", {}).items():
+        old = baseline.get("micro", {}).get(name)
+        if old and old["median_ms"]:
+            ratios[f"micro.{name}.median_ms"] = round(case["median_ms"] / old["median_ms"], 3)
+    old_http = baseline.get("http")
+    if result.get("http") and old_http and old_http["rps"]:
+        ratios["http.rps"] = round(result["http"]["rps"] / old_http["rps"], 3)
+        if old_http["p95_ms"]:
+            ratios["http.p95_ms"] = round(result["http"]["p95_ms"] / old_http["p95_ms"], 3)
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--workdir", help="directory for the database and uploads (default: a new temp dir)")
+    parser.add_argument("--database-url", help="benchmark this empty database instead of a SQLite file in --workdir")
+    parser.add_argument("--skip-datagen", action="store_true", help="reuse the inventory already in the database")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per micro-benchmark")
+    parser.add_argument("--case", dest="cases", action="append", help="run only these micro-benchmarks")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", help="write the JSON result here as well as to stdout")
+    parser.add_argument("--baseline", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+    scale = scale_from(args)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="itdocs-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    # app.settings reads the environment on import, so this has to happen before any app module is loaded.
+    os.environ["DATABASE_URL"] = args.database_url or ""
+    os.environ["DATABASE_PATH"] = str(workdir / "bench.db")
+    os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+    os.environ["ASSET_BUILD_DIR"] = str(workdir / "static-build")
+    # Keeps the benchmark's page edits from reaching live workers of a real deployment.
+    os.environ["EVENT_SOCKET_DIR"] = str(workdir / "events")
+
+    from app.db import engine
+    from app.main import app
+
+    from . import datagen, load_test, micro
+
+    result = {
+        "meta": {
+            "commit": _commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "scale": asdict(scale),
+        }
+    }
+    if not args.skip_datagen:
+        print(f"generating inventory in {workdir}", file=sys.stderr)
+        result["datagen"] = datagen.generate(engine, scale)
+    print("running micro-benchmarks", file=sys.stderr)
+    result["micro"] = micro.run(args.repeat, scale.seed, args.cases)
+
+    if not args.skip_http:
+        rnd = random.Random(scale.seed)
+        objects = scale.companies * scale.dcs * scale.objects
+        paths = ["/api/tree", "/api/objects?status=warn&limit=100"]
+        paths += [f"/api/objects/{rnd.randint(1, objects)}" for _ in range(20)]
+        paths += [f"/api/search?q={word}" for word in rnd.sample(datagen.WORDS, 5)]
+        print(f"running HTTP load for {args.duration:g}s", file=sys.stderr)
+        with load_test.serve(app) as url:
+            result["http"] = asyncio.run(load_test.run(url, paths, args.concurrency, args.duration, {}))
+
+    if args.baseline:
+        result["vs_baseline"] = _compare(result, json.loads(Path(args.baseline).read_text()))
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Synthetic inventories for benchmarks.
+
+Rows are generated deterministically from ``--seed`` and written with
+executemany inserts in chunks, so large inventories build in seconds and the
+same scale always produces the same data. Unlike ``app.seed`` nothing goes
+through the ORM.
+
+    python -m benchmarks.datagen data/bench.db --companies 10 --dcs 50 --objects 1000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import create_engine, insert
+
+from app import models, search
+from app.auth import get_password_hash
+from app.crud import default_page_rows
+
+from .scale import Scale, add_arguments, scale_from
+
+CHUNK = 5000
+STATUSES = ("ok", "ok", "ok", "ok", "warn", "down")
+SEVERITIES = ("info", "medium", "high")
+WORDS = (
+    "backup cluster database exchange firewall gateway kerberos ldap monitoring nginx postgres proxy "
+    "replication router storage switch terminal vlan vpn web"
+).split()
+USERS = (("admin", models.Role.admin), ("editor", models.Role.editor), ("viewer", models.Role.viewer))
+
+
+def _chunks(rows: Iterator[dict]) -> Iterator[list[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(words))
+
+
+def _page_body(rnd: random.Random, pool: list[str], title: str, paragraphs: int) -> str:
+    parts = [title]
+    for n, paragraph in enumerate(rnd.choices(pool, k=paragraphs)):
+        if n % 3 == 0:
+            parts.append(f"### {WORDS[n % len(WORDS)].capitalize()} {n // 3 + 1}")
+        parts.append(paragraph)
+    return "\n\n".join(parts)
+
+
+def _name(i: int, type_: models.ObjectType) -> str:
+    return f"{type_.value[:3].upper()}-{i:07d}"
+
+
+def generate(engine, scale: Scale) -> dict:
+    """Create the schema in ``engine`` and fill it; returns row counts and the elapsed time."""
+    rnd = random.Random(scale.seed)
+    types = list(models.ObjectType)
+    dc_total = scale.companies * scale.dcs
+    object_total = dc_total * scale.objects
+    counts = {}
+    started = time.perf_counter()
+    # Picking whole paragraphs from a pool keeps page generation cheap at hundreds of thousands of pages.
+    pool = [_text(rnd, 30) + "." for _ in range(1000)]
+
+    def objects():
+        for i in range(object_total):
+            type_ = types[i % len(types)]
+            yield {
+                "id": i + 1,
+                "dc_id": i // scale.objects + 1,
+                "type": type_,
+                "name": _name(i, type_),
+                "status": rnd.choice(STATUSES),
+                "ip": None if type_ == models.ObjectType.service else f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                "tags": ",".join(rnd.sample(WORDS, 2)),
+            }
+
+    def pages():
+        for i in range(object_total):
+            for row in default_page_rows(i + 1, _name(i, types[i % len(types)])):
+                row["content_md"] = _page_body(rnd, pool, row["content_md"].split("\n", 1)[0], scale.page_paragraphs)
+                yield row
+
+    def relations():
+        # Edges only go to lower ids inside the same DC, so the graph is a DAG with realistic fan-in.
+        for i in range(object_total):
+            first = i // scale.objects * scale.objects
+            if i == first:
+                continue
+            whole, fraction = divmod(scale.relations, 1)
+            for _ in range(int(whole) + (rnd.random() < fraction)):
+                yield {"src_object_id": i + 1, "dst_object_id": rnd.randrange(first, i) + 1, "relation_type": "depends"}
+
+    def incidents():
+        now = datetime(2024, 1, 1)
+        for _ in range(int(object_total * scale.incidents)):
+            yield {
+                "object_id": rnd.randrange(object_total) + 1,
+                "title": _text(rnd, 4),
+                "severity": rnd.choice(SEVERITIES),
+                "symptom": _text(rnd, 12),
+                "cause": _text(rnd, 8),
+                "check": _text(rnd, 8),
+                "resolution": _text(rnd, 8),
+                "created_at": now - timedelta(minutes=rnd.randrange(500000)),
+            }
+
+    def documents():
+        for n in range(int(object_total * scale.documents)):
+            yield {
+                "object_id": rnd.randrange(object_total) + 1,
+                "title": _text(rnd, 3),
+                "url": f"https://docs.example.com/{n}",
+                "kind": models.DocumentKind.link,
+            }
+
+    models.Base.metadata.create_all(bind=engine)
+    hashed = get_password_hash("bench")
+    with engine.begin() as conn:
+        search.create_index(conn)
+        conn.execute(
+            insert(models.User),
+            [{"username": name, "hashed_password": hashed, "role": role, "full_name": name} for name, role in USERS],
+        )
+        conn.execute(insert(models.Company), [{"id": c + 1, "name": f"Company {c:03d}"} for c in range(scale.companies)])
+        conn.execute(
+            insert(models.Datacenter),
+            [{"id": d + 1, "company_id": d // scale.dcs + 1, "name": f"DC {d:04d}"} for d in range(dc_total)],
+        )
+        for table, rows in (
+            (models.Object, objects()),
+            (models.Page, pages()),
+            (models.Relation, relations()),
+            (models.Incident, incidents()),
+            (models.Document, documents()),
+        ):
+            counts[table.__tablename__] = 0
+            for chunk in _chunks(rows):
+                conn.execute(insert(table), chunk)
+                counts[table.__tablename__] += len(chunk)
+        search.rebuild(conn)
+    counts.update(companies=scale.companies, datacenters=dc_total)
+    return {"rows": counts, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", help="SQLite file to create")
+    add_arguments(parser)
+    args = parser.parse_args()
+    engine = create_engine(f"sqlite:///{args.database}")
+    print(generate(engine, scale_from(args)))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
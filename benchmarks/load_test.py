@@ -0,0 +1,108 @@
+"""HTTP load test for a running IT Docs server.
+
+Keeps ``--concurrency`` requests in flight against the given paths for
+``--duration`` seconds and reports throughput and latency percentiles.
+Needs httpx, which is not part of the application requirements.
+
+    uvicorn app.main:app --port 8000 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 500 \\
+        --path /api/tree --path /api/objects/1
+
+``serve`` runs the app in a uvicorn server on a background thread of the
+current process; ``python -m benchmarks`` uses it for its HTTP scenario.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(url: str, paths: list[str], concurrency: int, duration: float, headers: dict) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: list[float] = []
+    errors = 0
+    cycle = itertools.cycle(paths)
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0, headers=headers) as client:
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(next(cycle))
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "url": url,
+        "paths": paths,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+@contextlib.contextmanager
+def serve(app, host: str = "127.0.0.1"):
+    """Run ``app`` on a free port for the duration of the block; yields its base URL."""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", dest="paths", action="append")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--token", help="bearer token sent with every request")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    result = asyncio.run(run(args.url, args.paths or ["/api/tree"], args.concurrency, args.duration, headers))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Micro-benchmarks of the crud and search functions behind the hot endpoints.
+
+Each case runs against the application's sync engine, with a fresh session
+per call, and reports latency percentiles and the SQL statements per call.
+Object, page and query choices come from a seeded RNG, so two runs over the
+same inventory do the same work. ``get_tree_legacy`` is the lazy-loading tree
+builder that ``crud.get_tree`` replaced, kept as a baseline for it.
+"""
+
+import random
+import statistics
+import time
+from typing import Callable
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app import crud, models, render, schemas, search
+from app.cache import tree_cache
+from app.db import SessionLocal, engine
+from app.graph import relation_graph
+
+from .datagen import WORDS
+
+Case = Callable[[Session, random.Random], object]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def legacy_get_tree(db: Session) -> schemas.TreeResponse:
+    companies_resp = []
+    for company in db.execute(select(models.Company)).scalars().all():
+        dcs_resp = []
+        for dc in company.datacenters:
+            groups = {}
+            for key, type_ in (
+                ("services", models.ObjectType.service),
+                ("servers", models.ObjectType.server),
+                ("network", models.ObjectType.network),
+            ):
+                groups[key] = [
+                    schemas.TreeNode(id=o.id, name=o.name, type=o.type, status=o.status, ip=o.ip)
+                    for o in dc.objects
+                    if o.type == type_
+                ]
+            dcs_resp.append(schemas.TreeDatacenter(id=dc.id, name=dc.name, **groups))
+        companies_resp.append(schemas.TreeCompany(id=company.id, name=company.name, dcs=dcs_resp))
+    return schemas.TreeResponse(companies=companies_resp)
+
+
+def _cases(db: Session) -> dict[str, Case]:
+    max_object = db.execute(select(func.max(models.Object.id))).scalar_one()
+    max_page = db.execute(select(func.max(models.Page.id))).scalar_one()
+    editor = schemas.UserOut.model_validate(
+        db.execute(select(models.User).where(models.User.role == models.Role.editor)).scalars().first()
+    )
+
+    def tree(db, rnd):
+        return crud.get_tree(db)
+
+    def tree_legacy(db, rnd):
+        return legacy_get_tree(db)
+
+    def tree_cached(db, rnd):
+        return crud.get_cached_tree(db)
+
+    def object_detail(db, rnd):
+        return crud.get_object_detail(db, rnd.randint(1, max_object))
+
+    def object_detail_rendered(db, rnd):
+        detail = crud.get_object_detail(db, rnd.randint(1, max_object))
+        render.fill_pages(detail.pages)
+        return detail
+
+    def update_page(db, rnd):
+        page_id = rnd.randint(1, max_page)
+        text = db.execute(select(models.Page.content_md).where(models.Page.id == page_id)).scalar_one()
+        return crud.update_page(db, page_id, text + f"\n{rnd.choice(WORDS)} {rnd.random()}\n", editor)
+
+    def full_text_search(db, rnd):
+        return search.search(db, " ".join(rnd.sample(WORDS, 2)), 20)
+
+    def impact(db, rnd):
+        return crud.walk_relations(db, rnd.randint(1, max_object), "in", 3, 500)
+
+    def list_objects(db, rnd):
+        return crud.list_objects(db, schemas.ObjectFilter(status="warn"), "name", 100, None)
+
+    return {
+        "get_tree": tree,
+        "get_tree_legacy": tree_legacy,
+        "get_cached_tree": tree_cached,
+        "get_object_detail": object_detail,
+        "get_object_detail_rendered": object_detail_rendered,
+        "update_page": update_page,
+        "search": full_text_search,
+        "walk_relations": impact,
+        "list_objects": list_objects,
+    }
+
+
+def measure(case: Case, repeat: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    statements = {"n": 0}
+
+    def _count(*_args):
+        statements["n"] += 1
+
+    timings, queries = [], []
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        for _ in range(repeat):
+            with SessionLocal() as db:
+                statements["n"] = 0
+                start = time.perf_counter()
+                case(db, rnd)
+                timings.append((time.perf_counter() - start) * 1000)
+                queries.append(statements["n"])
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    return {
+        "calls": repeat,
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "queries": statistics.median(queries),
+    }
+
+
+def run(repeat: int = 20, seed: int = 1, only: list[str] | None = None) -> dict:
+    tree_cache.invalidate()
+    with SessionLocal() as db:
+        cases = _cases(db)
+        # The first graph query loads the whole relation index; keep that out of the per-call numbers.
+        relation_graph.load(db)
+    results = {}
+    for name, case in cases.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(case, repeat, seed)
+    return results
@@ -0,0 +1,32 @@
+"""Inventory size options, kept free of app imports so the CLI can parse them before configuring the app."""
+
+import argparse
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class Scale:
+    companies: int = 2
+    dcs: int = 5
+    objects: int = 200
+    relations: float = 2.0
+    incidents: float = 0.1
+    documents: float = 0.2
+    page_paragraphs: int = 8
+    seed: int = 1
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = Scale()
+    parser.add_argument("--companies", type=int, default=defaults.companies)
+    parser.add_argument("--dcs", type=int, default=defaults.dcs, help="datacenters per company")
+    parser.add_argument("--objects", type=int, default=defaults.objects, help="objects per datacenter")
+    parser.add_argument("--relations", type=float, default=defaults.relations, help="outgoing relations per object")
+    parser.add_argument("--incidents", type=float, default=defaults.incidents, help="incidents per object")
+    parser.add_argument("--documents", type=float, default=defaults.documents, help="documents per object")
+    parser.add_argument("--page-paragraphs", type=int, default=defaults.page_paragraphs)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def scale_from(args: argparse.Namespace) -> Scale:
+    return Scale(**{key: getattr(args, key) for key in asdict(Scale())})
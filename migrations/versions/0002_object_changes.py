@@ -0,0 +1,32 @@
+"""object change log
+
+Revision ID: 0002_object_changes
+Revises: 0001_init
+Create Date: 2024-02-01 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import app.models as models
+
+# revision identifiers, used by Alembic.
+revision = '0002_object_changes'
+down_revision = '0001_init'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'object_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('object_id', sa.Integer(), nullable=False),
+        sa.Column('dc_id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.Enum(models.ChangeAction), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('object_changes')
@@ -0,0 +1,25 @@
+"""full-text search index
+
+Revision ID: 0003_search_index
+Revises: 0002_object_changes
+Create Date: 2024-02-15 00:00:00.000000
+"""
+
+from alembic import op
+from app import search
+
+# revision identifiers, used by Alembic.
+revision = '0003_search_index'
+down_revision = '0002_object_changes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    search.create_index(bind)
+    search.rebuild(bind)
+
+
+def downgrade():
+    op.execute('DROP TABLE search_index')
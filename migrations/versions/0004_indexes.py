@@ -0,0 +1,32 @@
+"""secondary indexes for detail lookups
+
+Revision ID: 0004_indexes
+Revises: 0003_search_index
+Create Date: 2024-03-01 00:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0004_indexes'
+down_revision = '0003_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_objects_dc_id', 'objects', ['dc_id'])
+    op.create_index('ux_pages_object_section', 'pages', ['object_id', 'section'], unique=True)
+    op.create_index('ix_relations_src_object_id', 'relations', ['src_object_id'])
+    op.create_index('ix_relations_dst_object_id', 'relations', ['dst_object_id'])
+    op.create_index('ix_documents_object_id', 'documents', ['object_id'])
+    op.create_index('ix_incidents_object_id', 'incidents', ['object_id'])
+
+
+def downgrade():
+    op.drop_index('ix_incidents_object_id', 'incidents')
+    op.drop_index('ix_documents_object_id', 'documents')
+    op.drop_index('ix_relations_dst_object_id', 'relations')
+    op.drop_index('ix_relations_src_object_id', 'relations')
+    op.drop_index('ux_pages_object_section', 'pages')
+    op.drop_index('ix_objects_dc_id', 'objects')
@@ -0,0 +1,38 @@
+"""page revision history
+
+Revision ID: 0005_page_revisions
+Revises: 0004_indexes
+Create Date: 2024-03-15 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_page_revisions'
+down_revision = '0004_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'page_revisions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('page_id', sa.Integer(), nullable=False),
+        sa.Column('number', sa.Integer(), nullable=False),
+        sa.Column('snapshot', sa.Boolean(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['page_id'], ['pages.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ux_page_revisions_page_number', 'page_revisions', ['page_id', 'number'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_page_revisions_page_number', 'page_revisions')
+    op.drop_table('page_revisions')
@@ -0,0 +1,24 @@
+"""page version for optimistic locking
+
+Revision ID: 0006_page_version
+Revises: 0005_page_revisions
+Create Date: 2024-03-20 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_page_version'
+down_revision = '0005_page_revisions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('pages', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('pages') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,22 @@
+"""index objects by (dc_id, name) for inventory import
+
+Revision ID: 0007_objects_dc_name
+Revises: 0006_page_version
+Create Date: 2024-04-01 00:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0007_objects_dc_name'
+down_revision = '0006_page_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_objects_dc_id_name', 'objects', ['dc_id', 'name'])
+
+
+def downgrade():
+    op.drop_index('ix_objects_dc_id_name', 'objects')
@@ -0,0 +1,24 @@
+"""indexes for keyset pagination of objects
+
+Revision ID: 0008_objects_keyset
+Revises: 0007_objects_dc_name
+Create Date: 2024-04-10 00:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0008_objects_keyset'
+down_revision = '0007_objects_dc_name'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_objects_name_id', 'objects', ['name', 'id'])
+    op.create_index('ix_objects_ip', 'objects', ['ip'])
+
+
+def downgrade():
+    op.drop_index('ix_objects_ip', 'objects')
+    op.drop_index('ix_objects_name_id', 'objects')
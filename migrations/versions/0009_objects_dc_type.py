@@ -0,0 +1,22 @@
+"""index for per-datacenter node lists
+
+Revision ID: 0009_objects_dc_type
+Revises: 0008_objects_keyset
+Create Date: 2024-04-18 00:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0009_objects_dc_type'
+down_revision = '0008_objects_keyset'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_objects_dc_id_type_id', 'objects', ['dc_id', 'type', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_objects_dc_id_type_id', 'objects')
@@ -0,0 +1,28 @@
+"""log company and datacenter changes in object_changes
+
+Revision ID: 0010_structure_changes
+Revises: 0009_objects_dc_type
+Create Date: 2024-05-06 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_structure_changes'
+down_revision = '0009_objects_dc_type'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('object_changes') as batch_op:
+        batch_op.alter_column('object_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('dc_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM object_changes WHERE object_id IS NULL OR dc_id IS NULL")
+    with op.batch_alter_table('object_changes') as batch_op:
+        batch_op.alter_column('object_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('dc_id', existing_type=sa.Integer(), nullable=False)
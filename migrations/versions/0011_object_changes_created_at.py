@@ -0,0 +1,22 @@
+"""index object_changes.created_at for the overlap window and pruning
+
+Revision ID: 0011_object_changes_created_at
+Revises: 0010_structure_changes
+Create Date: 2024-05-20 00:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0011_object_changes_created_at'
+down_revision = '0010_structure_changes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_object_changes_created_at', 'object_changes', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_object_changes_created_at', 'object_changes')
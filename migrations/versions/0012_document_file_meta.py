@@ -0,0 +1,26 @@
+"""original name and type of uploaded documents
+
+Revision ID: 0012_document_file_meta
+Revises: 0011_object_changes_created_at
+Create Date: 2024-05-27 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012_document_file_meta'
+down_revision = '0011_object_changes_created_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('file_name', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('content_type', sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.drop_column('content_type')
+        batch_op.drop_column('file_name')
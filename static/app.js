@@ -4,8 +4,18 @@ const state = {
   companies: [],
   currentCompany: null,
   currentDc: null,
-  tree: null,
+  currentDcId: null,
+  treeLoaded: false,
+  treeVersion: 0,
+  dcSummary: new Map(),
+  dcIndex: new Map(),
+  nodeDc: new Map(),
   currentObjectId: null,
+  detail: null,
+  detailCache: new Map(),
+  live: false,
+  syncing: false,
+  syncAgain: false,
   currentTab: 'overview',
 };
 
@@ -117,25 +127,160 @@ loginModal.addEventListener('click', (e)=>{ if(e.target===loginModal) loginModal
 function esc(str){return (str||'').replace(/[&<>]/g, c=>({'&':'&amp;','<':'&lt;','>':'&gt;'}[c]));}
 function dot(status){ if(status==='ok') return 'good'; if(status==='warn') return 'warn'; if(status==='bad') return 'bad'; return ''; }
 
+const TREE_GROUPS = {service:'services', server:'servers', network:'network'};
+const TREE_POLL_MS = 30000;
+
+const DC_STORE_PREFIX = 'dc:';
+
+// Loaded DCs are kept in localStorage with the tree version they match, so a reload can skip refetching them.
+function storeDc(dc){try{localStorage.setItem(DC_STORE_PREFIX+dc.id, JSON.stringify(dc));}catch(err){}}
+
+function storedDc(id, version){
+  try{
+    const dc = JSON.parse(localStorage.getItem(DC_STORE_PREFIX+id) || 'null');
+    return dc && dc.version===version ? dc : null;
+  }catch(err){return null;}
+}
+
+function indexDc(dc){
+  state.dcIndex.set(dc.id, dc);
+  Object.values(TREE_GROUPS).forEach(k=>dc[k].forEach(n=>state.nodeDc.set(n.id, dc)));
+}
+
+// Only the company summary is loaded up front; DC nodes come from openDc when a DC is shown.
 async function loadTree(){
   try{
-    const data = await fetchJSON('/api/tree');
-    state.tree = data;
-    state.companies = data.companies || [];
-    state.currentCompany = state.currentCompany || state.companies[0] || null;
-    state.currentDc = state.currentCompany?.dcs?.[0] || null;
+    const res = await fetch('/api/companies');
+    if(!res.ok) throw new Error(`${res.status}`);
+    state.companies = await res.json();
+    state.treeVersion = Number(res.headers.get('X-Tree-Version')) || 0;
+    state.treeLoaded = true;
+    state.dcSummary = new Map(state.companies.flatMap(c=>c.dcs.map(d=>[d.id, d])));
+    state.dcIndex = new Map();
+    state.nodeDc = new Map();
+    state.currentCompany = state.companies.find(c=>c.id===state.currentCompany?.id) || state.companies[0] || null;
+    const dcs = state.currentCompany?.dcs || [];
     renderCompanySwitcher();
-    renderTree();
+    await openDc((dcs.find(d=>d.id===state.currentDcId) || dcs[0])?.id ?? null);
   }catch(err){
-    state.tree = {companies: []};
     state.companies = [];
+    state.dcSummary = new Map();
     state.currentCompany = null;
     state.currentDc = null;
+    state.currentDcId = null;
     renderCompanySwitcher();
     renderTree();
   }
 }
 
+async function openDc(id){
+  state.currentDcId = id;
+  if(id===null){state.currentDc = null; renderTree(); return;}
+  let dc = state.dcIndex.get(id) || storedDc(id, state.treeVersion);
+  if(!dc){
+    treeEl.innerHTML = '<div class="card">Загрузка…</div>';
+    try{
+      dc = await fetchJSON(`/api/datacenters/${id}/objects`);
+    }catch(err){
+      if(state.currentDcId===id){state.currentDc = null; renderTree();}
+      return;
+    }
+    // Changes newer than the summary reach this DC through syncTree like any other loaded DC.
+    dc.version = state.treeVersion;
+    storeDc(dc);
+  }
+  indexDc(dc);
+  if(state.currentDcId!==id) return;
+  state.currentDc = dc;
+  state.detailCache.clear();
+  renderTree(searchInput.value);
+}
+
+function dropNode(id){
+  const dc = state.nodeDc.get(id);
+  if(!dc) return null;
+  for(const key of Object.values(TREE_GROUPS)){
+    const i = dc[key].findIndex(n=>n.id===id);
+    if(i>=0){dc[key].splice(i,1); break;}
+  }
+  state.nodeDc.delete(id);
+  return dc;
+}
+
+// Patches the loaded DCs in place; returns false when a change targets a DC missing from the summary.
+function applyTreeChanges(changes){
+  const touched = new Set();
+  changes.removed.forEach(forgetDetail);
+  changes.upserts.forEach(({node})=>forgetDetail(node.id));
+  changes.removed.forEach(id=>{const dc=dropNode(id); if(dc) touched.add(dc);});
+  for(const {dc_id, node} of changes.upserts){
+    if(!state.dcSummary.has(dc_id)) return false;
+    const dc = state.dcIndex.get(dc_id);
+    if(!dc){
+      const prev = dropNode(node.id);
+      if(prev) touched.add(prev);
+      continue;
+    }
+    const group = dc[TREE_GROUPS[node.type]];
+    const existing = state.nodeDc.get(node.id)===dc ? group.find(n=>n.id===node.id) : null;
+    if(existing){
+      Object.assign(existing, node);
+    } else {
+      const prev = dropNode(node.id);
+      if(prev) touched.add(prev);
+      const at = group.findIndex(n=>n.id>node.id);
+      group.splice(at<0?group.length:at, 0, node);
+      state.nodeDc.set(node.id, dc);
+    }
+    touched.add(dc);
+  }
+  if(changes.version!==state.treeVersion){
+    state.treeVersion = changes.version;
+    state.dcIndex.forEach(dc=>{dc.version = changes.version; storeDc(dc);});
+  }
+  if(touched.has(state.currentDc)) renderTree(searchInput.value);
+  return true;
+}
+
+async function syncTree(){
+  if(document.hidden || !state.treeLoaded) return;
+  // One request at a time; a call that arrives meanwhile runs once more afterwards.
+  if(state.syncing){state.syncAgain = true; return;}
+  state.syncing = true;
+  try{
+    const changes = await fetchJSON(`/api/tree/changes?since=${state.treeVersion}`);
+    if(changes.reset || !applyTreeChanges(changes)) await loadTree();
+  }catch(err){}
+  finally{state.syncing = false;}
+  if(state.syncAgain){state.syncAgain = false; syncTree();}
+}
+
+// Server-pushed updates; the poll only runs while the stream is down.
+function connectEvents(){
+  if(!window.EventSource) return;
+  const source = new EventSource('/api/events');
+  // Also fires on reconnect: fetch whatever changed while the stream was down.
+  source.onopen = ()=>{state.live = true; syncTree();};
+  source.onerror = ()=>{state.live = false;};
+  source.addEventListener('tree', e=>{
+    const changes = JSON.parse(e.data);
+    // An older version committed after a newer one: the server resends its node from the overlap window.
+    if(changes.version<=state.treeVersion){syncTree(); return;}
+    const next = changes.version===state.treeVersion+1 && (changes.upserts.length || changes.removed.length);
+    if(!next || !applyTreeChanges(changes)) syncTree();
+  });
+  source.addEventListener('resync', ()=>{state.detailCache.clear(); syncTree();});
+  ['page','incident','document'].forEach(type=>source.addEventListener(type, e=>objectTouched(type, JSON.parse(e.data))));
+}
+
+function objectTouched(type, data){
+  forgetDetail(data.object_id);
+  if(Number(state.currentObjectId)!==data.object_id || editModal.classList.contains('open')) return;
+  // Our own save already reloaded the object.
+  if(type==='page' && state.detail?.pages?.some(p=>p.id===data.id && p.version>=data.version)) return;
+  loadObject(state.currentObjectId);
+}
+
 function renderCompanySwitcher(){
   companyNameEl.textContent = state.currentCompany?.name || '—';
   companyMenuList.innerHTML = state.companies.map(c=>`<div class="menuItem ${state.currentCompany && c.id===state.currentCompany.id?'active':''}" data-id="${c.id}"><div class="menuDot"></div><div class="mName">${esc(c.name)}</div><div class="mMeta">DC: ${c.dcs?.[0]?.name||''}</div></div>`).join('');
@@ -143,10 +288,9 @@ function renderCompanySwitcher(){
     el.onclick=()=>{
       const id=Number(el.dataset.id);
       state.currentCompany = state.companies.find(c=>c.id===id);
-      state.currentDc = state.currentCompany?.dcs?.[0] || null;
       closeMenu();
       renderCompanySwitcher();
-      renderTree();
+      openDc(state.currentCompany?.dcs?.[0]?.id ?? null);
       navigate('/');
     }
   });
@@ -171,41 +315,148 @@ function renderTree(filter=''){
     const inner = items.filter(filterFn).map(n=>`<div class="node small" data-open="${n.id}"><div class="icon"><div class="dot ${dot(n.status)}"></div></div><div class="label">${esc(n.name)}</div><div class="meta">${esc(n.ip||'')}</div></div>`).join('') || `<div class="node small"><div class="label" style="color:var(--muted)">пусто</div></div>`;
     return `<div class="node small" data-toggle="${key}"><div class="icon">${icon}</div><div class="label">${label}</div><div class="meta">▾</div></div><div class="children open" data-children="${key}">${inner}</div>`;
   };
-  treeEl.innerHTML = `<div class="node" data-open="dashboard"><div class="icon">📦</div><div class="label">${esc(dc.name)}</div><div class="meta">DC</div></div><div class="children open">${renderGroup('IT-сервисы','🧩','svc',dc.services)}${renderGroup('Серверы','🖥️','srv',dc.servers)}${renderGroup('Сеть','🌐','net',dc.network)}</div>`;
+  const current = `<div class="node" data-open="dashboard"><div class="icon">📦</div><div class="label">${esc(dc.name)}</div><div class="meta">DC</div></div><div class="children open">${renderGroup('IT-сервисы','🧩','svc',dc.services)}${renderGroup('Серверы','🖥️','srv',dc.servers)}${renderGroup('Сеть','🌐','net',dc.network)}</div>`;
+  // Other DCs of the company are listed collapsed, with counts from the summary, and loaded on click.
+  const dcs = state.currentCompany?.dcs || [];
+  treeEl.innerHTML = dcs.length>1 ? dcs.map(d=>d.id===dc.id ? current : `<div class="node" data-dc="${d.id}"><div class="icon">📦</div><div class="label">${esc(d.name)}</div><div class="meta">${d.services+d.servers+d.network}</div></div>`).join('') : current;
+  treeEl.querySelectorAll('.node[data-dc]').forEach(el=>{el.onclick=async()=>{await openDc(Number(el.dataset.dc)); navigate('/');};});
   treeEl.querySelectorAll('[data-toggle]').forEach(el=>{el.onclick=()=>{const key=el.dataset.toggle;treeEl.querySelector(`[data-children="${key}"]`).classList.toggle('open');};});
   treeEl.querySelectorAll('.node[data-open]').forEach(el=>{el.onclick=()=>{const id=el.dataset.open; if(id==='dashboard'){navigate('/'); return;} navigate(`/object/${id}`);};});
 }
 
-  searchInput.addEventListener('input',()=>{renderTree(searchInput.value);});
+const searchState = { timer: null, seq: 0 };
+
+function renderSnippet(snippet){return esc(snippet).replace(/&lt;mark&gt;/g,'<mark>').replace(/&lt;\/mark&gt;/g,'</mark>');}
+
+async function runSearch(q){
+  const seq = ++searchState.seq;
+  try{
+    const hits = await fetchJSON(`/api/search?q=${encodeURIComponent(q)}&limit=30`);
+    if(seq!==searchState.seq) return;
+    const items = hits.map(h=>`<div class="item" data-hit="${h.object_id}" data-tab="${h.tab}"><div class="dot"></div><div class="name">${esc(h.title)}<div class="sub" style="margin:4px 0 0 0;font-family:var(--sans)">${renderSnippet(h.snippet)}</div></div><div class="sub">${h.kind}</div></div>`).join('');
+    pageEl.innerHTML = `<div class="crumbs"><span>🔎 Поиск</span></div><div class="card"><h3>Результаты: ${esc(q)}</h3><div class="list">${items||'Ничего не найдено'}</div></div>`;
+    pageEl.querySelectorAll('.item[data-hit]').forEach(el=>{el.onclick=()=>navigate(`/object/${el.dataset.hit}?tab=${el.dataset.tab}`);});
+  }catch(err){}
+}
+
+  searchInput.addEventListener('input',()=>{
+    renderTree(searchInput.value);
+    clearTimeout(searchState.timer);
+    const q = searchInput.value.trim();
+    if(q.length<2) return;
+    searchState.timer = setTimeout(()=>runSearch(q), 250);
+  });
 
 function markdownToHtml(md){return DOMPurify.sanitize(marked.parse(md||''));}
 
+// Pages come pre-rendered and sanitized by the server; older responses fall back to marked.
+function pageHtml(page){
+  const html = page.html ?? markdownToHtml(page.content_md);
+  if(!page.toc || page.toc.length<4) return html;
+  const toc = page.toc.map(h=>`<div class="tocItem" style="padding-left:${(h.level-1)*12}px"><a href="#${esc(h.anchor)}">${esc(h.title)}</a></div>`).join('');
+  return `<nav class="toc">${toc}</nav>${html}`;
+}
+
+const TABS = ['overview','links','arch','net','inc','docs'];
+
+const DETAIL_CACHE_MS = 60000;
+// Objects on each side of the opened one, in tree order, fetched ahead without rendered HTML.
+const PREFETCH_NEIGHBOURS = 10;
+
+function cachedDetail(id){
+  const hit = state.detailCache.get(Number(id));
+  if(!hit || Date.now()-hit.at > DETAIL_CACHE_MS) return null;
+  return hit.detail;
+}
+
+function forgetDetail(id){state.detailCache.delete(Number(id));}
+
+// Warms the detail cache with the tree neighbours of the opened object, in one background request.
+async function prefetchNeighbours(id){
+  const dc = state.currentDc;
+  if(!dc || Number(state.currentObjectId)!==Number(id)) return;
+  const nodes = Object.values(TREE_GROUPS).flatMap(k=>dc[k]);
+  const at = nodes.findIndex(n=>n.id===Number(id));
+  if(at<0) return;
+  const ids = nodes.slice(Math.max(0, at-PREFETCH_NEIGHBOURS), at+PREFETCH_NEIGHBOURS+1).map(n=>n.id).filter(n=>n!==Number(id) && !cachedDetail(n));
+  if(!ids.length) return;
+  try{
+    const res = await fetch('/api/objects/batch',{method:'POST',headers: apiHeaders(),body: JSON.stringify({ids})});
+    if(!res.ok) return;
+    const batch = await res.json();
+    const now = Date.now();
+    Object.values(batch.objects).forEach(d=>{d.loaded = new Set(TABS); state.detailCache.set(d.object.id, {detail: d, at: now});});
+  }catch(err){}
+}
+
+// Prefetched pages come without HTML: the open tab gets it from the server, marked stands in meanwhile.
+async function renderSection(tab){
+  const detail = state.detail;
+  const page = detail?.pages.find(p=>p.section===tab);
+  if(!page || page.html!=null) return;
+  try{
+    const data = await fetchJSON(`/api/pages/${page.id}?rendered=true`);
+    if(data.version!==page.version) return;
+    page.html = data.html;
+    page.toc = data.toc;
+    if(state.detail===detail && state.currentTab===tab) renderObjectPage(detail);
+  }catch(err){}
+}
+
 async function loadObject(id){
+  const tab = TABS.includes(state.currentTab) ? state.currentTab : 'overview';
+  const cached = cachedDetail(id);
+  if(cached){
+    state.currentObjectId = id;
+    state.detail = cached;
+    renderObjectPage(cached);
+    renderSection(tab);
+    setTimeout(()=>prefetchNeighbours(id), 500);
+    return;
+  }
   try{
-    const data = await fetchJSON(`/api/objects/${id}`);
+    const data = await fetchJSON(`/api/objects/${id}?sections=${tab}&rendered=true`);
+    data.loaded = new Set([tab]);
     state.currentObjectId = id;
+    state.detail = data;
     renderObjectPage(data);
+    setTimeout(()=>prefetchNeighbours(id), 500);
   }catch(err){
     pageEl.innerHTML = '<div class="card">Не удалось загрузить объект</div>';
   }
 }
 
+// Fetches a tab the current object was opened without and merges it into state.detail.
+async function loadSection(tab){
+  const detail = state.detail;
+  if(!detail || detail.loaded.has(tab)) return;
+  try{
+    const data = await fetchJSON(`/api/objects/${detail.object.id}?sections=${tab}&rendered=true`);
+    if(state.detail!==detail) return;
+    detail.pages = detail.pages.filter(p=>p.section!==tab).concat(data.pages);
+    ['relations','documents','incidents'].forEach(k=>{if(data[k]) detail[k]=data[k];});
+    detail.loaded.add(tab);
+    renderObjectPage(detail);
+  }catch(err){}
+}
+
 function renderTabs(tabs){
   const tabEls = pageEl.querySelectorAll('.tab');
-  tabEls.forEach(t=>t.onclick=()=>{const id=t.dataset.tab; state.currentTab=id; tabEls.forEach(x=>x.classList.remove('active')); t.classList.add('active'); pageEl.querySelectorAll('.tabPanel').forEach(p=>p.style.display=p.dataset.panel===id?'block':'none'); history.replaceState({},'',`?tab=${id}`);});
+  tabEls.forEach(t=>t.onclick=()=>{const id=t.dataset.tab; state.currentTab=id; tabEls.forEach(x=>x.classList.remove('active')); t.classList.add('active'); pageEl.querySelectorAll('.tabPanel').forEach(p=>p.style.display=p.dataset.panel===id?'block':'none'); history.replaceState({},'',`?tab=${id}`); loadSection(id); renderSection(id);});
 }
 
 function renderObjectPage(detail){
   const obj = detail.object;
   const statusBadge = obj.status==='ok'?{k:'good',t:'🟢 ok'}:obj.status==='warn'?{k:'warn',t:'🟡 warn'}:{k:'bad',t:'🔴 issue'};
-  const tabs = ['overview','links','arch','net','inc','docs'];
+  const tabs = TABS;
   const tabHtml = tabs.map(t=>`<div class="tab ${state.currentTab===t?'active':''}" data-tab="${t}">${t}</div>`).join('');
   const panels = tabs.map(t=>{
+    if(!detail.loaded.has(t)) return `<div class="tabPanel" data-panel="${t}" style="display:${state.currentTab===t?'block':'none'}"><div class="card"><p>Загрузка…</p></div></div>`;
     const page = detail.pages.find(p=>p.section===t);
-    const content = page?markdownToHtml(page.content_md):'<p>Нет данных</p>';
+    const content = page?pageHtml(page):'<p>Нет данных</p>';
     const editBtn = canEdit()?`<div style="margin-bottom:10px"><button class="btn" data-edit="${page?.id||''}">Редактировать</button></div>`:'';
     if(t==='docs'){
-      const docs = detail.documents.map(d=>`<div class="item"><div class="dot ${dot(obj.status)}"></div><div class="name">${esc(d.title)}</div><div class="sub">${d.kind==='file'?d.file_path:d.url||''}</div></div>`).join('');
+      const docs = detail.documents.map(d=>`<div class="item"><div class="dot ${dot(obj.status)}"></div><div class="name">${esc(d.title)}</div><div class="sub">${d.kind==='file'?`<a href="/api/documents/${d.id}/file" target="_blank" rel="noopener">${esc(d.file_name||d.file_path)}</a>`:esc(d.url||'')}</div></div>`).join('');
       return `<div class="tabPanel" data-panel="${t}" style="display:${state.currentTab===t?'block':'none'}">${editBtn}<div class="card"><h3>Документы</h3><div class="list">${docs||'Нет документов'}</div><form id="docForm"><div style="display:flex;gap:8px;flex-wrap:wrap;margin-top:10px"><input style="flex:1" name="title" placeholder="Название" required /><input style="flex:1" name="url" placeholder="URL" /><select name="kind"><option value="link">Ссылка</option><option value="file">Файл</option></select><input type="file" name="file" /><button class="btn primary" type="submit">Добавить</button></div></form></div>${content}</div>`;
     }
     if(t==='links'){
@@ -219,21 +470,38 @@ function renderObjectPage(detail){
   pageEl.querySelectorAll('[data-edit]').forEach(btn=>{btn.onclick=()=>openEdit(detail.pages.find(p=>p.id==btn.dataset.edit));});
   pageEl.querySelectorAll('.item[data-open]').forEach(el=>{el.onclick=()=>navigate(`/object/${el.dataset.open}`);});
       const docForm = document.getElementById('docForm');
-    if(docForm){docForm.onsubmit=async(e)=>{e.preventDefault(); if(!state.token){showError('Нужен логин'); return;} const fd=new FormData(docForm); try{const res=await fetch(`/api/objects/${obj.id}/documents`,{method:'POST',headers: state.token?{'Authorization':'Bearer '+state.token}:undefined,body:fd}); if(!res.ok) throw new Error(); await loadObject(obj.id);}catch(err){showError('Ошибка загрузки документа');}};}
+    if(docForm){docForm.onsubmit=async(e)=>{e.preventDefault(); if(!state.token){showError('Нужен логин'); return;} const fd=new FormData(docForm); try{const res=await fetch(`/api/objects/${obj.id}/documents`,{method:'POST',headers: state.token?{'Authorization':'Bearer '+state.token}:undefined,body:fd}); if(!res.ok) throw new Error(); forgetDetail(obj.id); await loadObject(obj.id);}catch(err){showError('Ошибка загрузки документа');}};}
   }
 
 function canEdit(){return state.user && (state.user.role==='admin' || state.user.role==='editor');}
 
-function openEdit(page){if(!page){alert('Страница не найдена'); return;} editTarget.textContent = `Секция: ${page.section}`; editArea.value = page.content_md; editModal.dataset.pageId = page.id; editModal.classList.add('open');}
+function openEdit(page){if(!page){alert('Страница не найдена'); return;} editTarget.textContent = `Секция: ${page.section}`; editArea.value = page.content_md; editModal.dataset.pageId = page.id; state.editBase = {text: page.content_md, version: page.version}; editModal.classList.add('open');}
+
+// Smallest single range edit turning base into text; offsets are code points, as the API expects.
+function rangeEdit(base, text){
+  let start = 0;
+  const max = Math.min(base.length, text.length);
+  while(start<max && base[start]===text[start]) start++;
+  let tail = 0;
+  while(tail<max-start && base[base.length-1-tail]===text[text.length-1-tail]) tail++;
+  // Do not split a surrogate pair.
+  if(start>0 && /[\ud800-\udbff]/.test(base[start-1])) start--;
+  if(tail>0 && /[\udc00-\udfff]/.test(base[base.length-tail])) tail--;
+  const cp = s=>[...s].length;
+  const prefix = cp(base.slice(0, start));
+  return {start: prefix, end: prefix+cp(base.slice(start, base.length-tail)), text: text.slice(start, text.length-tail)};
+}
 closeEdit.onclick=()=>editModal.classList.remove('open');
 editModal.addEventListener('click',(e)=>{if(e.target===editModal) editModal.classList.remove('open');});
   saveEdit.onclick=async ()=>{
   const id = editModal.dataset.pageId;
   try{
-    const res = await fetch(`/api/pages/${id}`,{method:'PUT',headers: apiHeaders(),body: JSON.stringify({content_md: editArea.value})});
+    const base = state.editBase;
+    const res = await fetch(`/api/pages/${id}`,{method:'PATCH',headers: {...apiHeaders(),'If-Match':`"${base.version}"`},body: JSON.stringify({edits: [rangeEdit(base.text, editArea.value)]})});
+    if(res.status===409){showError('Страницу уже изменил другой пользователь. Скопируйте правки и откройте её заново'); return;}
     if(!res.ok) throw new Error();
     editModal.classList.remove('open');
-    if(state.currentObjectId) await loadObject(state.currentObjectId);
+    if(state.currentObjectId){forgetDetail(state.currentObjectId); await loadObject(state.currentObjectId);}
   }catch(err){showError('Не удалось сохранить');}
   };
 
@@ -260,11 +528,11 @@ function router(){
   renderDashboard();
 }
 
-function highlight(id){
+function highlight(id, retry=true){
   treeEl.querySelectorAll('.node').forEach(n=>n.classList.remove('active'));
   if(!id){const dcNode=treeEl.querySelector('.node[data-open="dashboard"]'); dcNode?.classList.add('active'); return;}
   const node = treeEl.querySelector(`.node[data-open="${id}"]`);
-  if(node){node.classList.add('active'); let p=node.parentElement; while(p && p!==treeEl){if(p.classList.contains('children')) p.classList.add('open'); p=p.parentElement;} node.scrollIntoView({block:'nearest'});} else {renderTree(''); highlight(id);} }
+  if(node){node.classList.add('active'); let p=node.parentElement; while(p && p!==treeEl){if(p.classList.contains('children')) p.classList.add('open'); p=p.parentElement;} node.scrollIntoView({block:'nearest'});} else if(retry){renderTree(''); highlight(id, false);} }
 
 window.addEventListener('error', (event)=>{showError(`Runtime error: ${event.message}`);});
 window.addEventListener('unhandledrejection', (event)=>{
@@ -280,6 +548,9 @@ window.addEventListener('DOMContentLoaded', async ()=>{
     pageEl.innerHTML='<div class="card">Ошибка загрузки API</div>';
   }
   router();
+  connectEvents();
+  setInterval(()=>{if(!state.live) syncTree();}, TREE_POLL_MS);
+  document.addEventListener('visibilitychange', ()=>{if(!document.hidden) syncTree();});
 });
 
 window.navigate=navigate;
@@ -0,0 +1,129 @@
+"""The suite runs against a scratch SQLite file, or against ``TEST_DATABASE_URL``.
+
+    python -m pytest
+    TEST_DATABASE_URL=postgresql+psycopg://postgres@localhost/itdocs_test python -m pytest
+
+The PostgreSQL database is wiped: the public schema is dropped and the
+migrations are run from scratch. Settings are read when ``app`` is first
+imported, so the environment is set up here before anything imports it.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+_TMP = Path(tempfile.mkdtemp(prefix="itdocs-tests-"))
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{_TMP / 'itdocs.db'}"
+os.environ["DATABASE_PATH"] = str(_TMP / "itdocs.db")
+os.environ["UPLOAD_DIR"] = str(_TMP / "uploads")
+os.environ["ASSET_BUILD_DIR"] = str(_TMP / "static-build")
+os.environ["EVENT_SOCKET_DIR"] = str(_TMP / "events")
+os.environ["STATIC_DIR"] = str(ROOT / "static")
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert, text  # noqa: E402
+
+from app import crud, models, render, schemas  # noqa: E402
+from app.auth import create_access_token, principal_cache, token_claims  # noqa: E402
+from app.cache import tree_cache  # noqa: E402
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app.graph import relation_graph  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+    config = Config()
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    command.upgrade(config, "head")
+    yield
+    engine.dispose()
+
+
+def _clear_tables():
+    tables = [table.name for table in reversed(Base.metadata.sorted_tables)] + ["search_index"]
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE"))
+        else:
+            for table in tables:
+                conn.execute(text(f"DELETE FROM {table}"))
+
+
+@pytest.fixture
+def db():
+    """A session over empty tables and empty in-process caches."""
+    _clear_tables()
+    tree_cache.invalidate()
+    render.render_cache.clear()
+    relation_graph.__init__()
+    principal_cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements():
+    """The SQL statements run on the sync engine while the test runs."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def dc(db):
+    """An empty datacenter of a new company."""
+    company_id = db.execute(insert(models.Company).values(name="Acme").returning(models.Company.id)).scalar_one()
+    dc_id = db.execute(
+        insert(models.Datacenter).values(company_id=company_id, name="Main").returning(models.Datacenter.id)
+    ).scalar_one()
+    db.commit()
+    return db.get(models.Datacenter, dc_id)
+
+
+@pytest.fixture
+def make_object(db, dc):
+    """Creates objects in ``dc`` through ``crud``, as the API does."""
+
+    def make(name, type_=models.ObjectType.server, **fields):
+        return crud.create_object(db, schemas.ObjectCreate(dc_id=fields.pop("dc_id", dc.id), type=type_, name=name, **fields))
+
+    return make
+
+
+@pytest.fixture
+def editor(db):
+    user = models.User(username="editor", hashed_password="-", role=models.Role.editor, full_name="Editor")
+    db.add(user)
+    db.commit()
+    return schemas.UserOut.model_validate(user)
+
+
+@pytest.fixture(scope="session")
+def client(schema):
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def admin_headers(db):
+    user = models.User(username="admin", hashed_password="-", role=models.Role.admin, full_name="Admin")
+    db.add(user)
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
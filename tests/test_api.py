@@ -0,0 +1,225 @@
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+from app import auth, crud, downloads, models
+from app.settings import settings
+
+
+def test_tree_etag_and_304(client, db, dc, make_object):
+    make_object("srv-1")
+    first = client.get("/api/tree")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert client.get("/api/tree", headers={"If-None-Match": etag}).status_code == 304
+
+    make_object("srv-2")
+    second = client.get("/api/tree", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert int(second.headers["x-tree-version"]) > int(first.headers["x-tree-version"])
+
+
+def test_companies_and_streamed_datacenter(client, db, dc, make_object):
+    make_object("srv-1")
+    [company] = client.get("/api/companies").json()
+    assert company["dcs"] == [{"id": dc.id, "name": "Main", "services": 0, "servers": 1, "network": 0}]
+
+    response = client.get(f"/api/datacenters/{dc.id}/objects")
+    assert [n["name"] for n in response.json()["servers"]] == ["srv-1"]
+    cached = client.get(f"/api/datacenters/{dc.id}/objects", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get(f"/api/datacenters/{dc.id + 1}/objects").status_code == 404
+
+
+def test_only_failed_logins_count(client, db, monkeypatch):
+    db.add(models.User(username="ops", hashed_password=auth.get_password_hash("secret"), role=models.Role.viewer))
+    db.commit()
+    monkeypatch.setattr(auth.login_user_limiter, "limit", 2)
+    monkeypatch.setattr(auth.login_user_limiter, "_hits", {})
+    monkeypatch.setattr(auth.login_ip_limiter, "_hits", {})
+
+    def login(password):
+        return client.post("/api/auth/login", data={"username": "ops", "password": password}).status_code
+
+    assert [login("secret") for _ in range(3)] == [200, 200, 200]
+    assert [login("wrong"), login("wrong"), login("secret")] == [401, 401, 429]
+
+
+def test_logins_refused_before_a_password_check_do_not_count(client, db, monkeypatch):
+    db.add(models.User(username="ops", hashed_password=auth.get_password_hash("secret"), role=models.Role.viewer))
+    db.commit()
+    monkeypatch.setattr(auth.login_user_limiter, "limit", 1)
+    monkeypatch.setattr(auth.login_user_limiter, "_hits", {})
+    monkeypatch.setattr(auth.login_ip_limiter, "_hits", {})
+
+    def login(password):
+        return client.post("/api/auth/login", data={"username": "ops", "password": password}).status_code
+
+    assert [login("wrong"), login("wrong"), login("wrong")] == [401, 429, 429]
+    monkeypatch.setattr(settings, "password_hash_queue_limit", 0)
+    monkeypatch.setattr(auth.login_user_limiter, "_hits", {})
+    assert login("secret") == 503
+    assert sum(map(len, auth.login_ip_limiter._hits.values())) == 1
+    assert sum(map(len, auth.login_user_limiter._hits.values())) == 0
+
+
+def test_object_detail(client, db, make_object):
+    obj = make_object("srv-1")
+
+    body = client.get(f"/api/objects/{obj.id}", params={"sections": "overview,inc"}).json()
+
+    assert [p["section"] for p in body["pages"]] == ["overview", "inc"]
+    assert body["incidents"] == [] and "documents" not in body
+    assert client.get(f"/api/objects/{obj.id}", params={"sections": "nope"}).status_code == 400
+    rendered = client.get(f"/api/objects/{obj.id}", params={"sections": "overview", "rendered": "true"}).json()
+    assert rendered["pages"][0]["html"].startswith("<h2 id=\"srv-1-overview\">")
+    assert client.get(f"/api/objects/{obj.id + 1}").status_code == 404
+
+
+def test_object_batch(client, db, make_object):
+    ids = [make_object(f"srv-{n}").id for n in range(3)]
+
+    body = client.post("/api/objects/batch", json={"ids": [ids[2], 999, ids[0]], "sections": ["links"]}).json()
+
+    assert list(body["objects"]) == [str(ids[2]), str(ids[0])]
+    assert body["missing"] == [999]
+
+
+def test_object_listing_cursor(client, db, make_object):
+    for n in range(5):
+        make_object(f"srv-{n}")
+    first = client.get("/api/objects", params={"limit": 3}).json()
+    rest = client.get("/api/objects", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    assert [o["name"] for o in first["items"] + rest["items"]] == [f"srv-{n}" for n in range(5)]
+    assert rest["next_cursor"] is None
+    for cursor in ["garbage", crud.encode_cursor(["name", {"a": 1}, 2]), crud.encode_cursor(["id", [1, 2]])]:
+        assert client.get("/api/objects", params={"cursor": cursor}).status_code == 400
+
+
+def test_page_edit_conflict(client, db, make_object, admin_headers):
+    page = make_object("srv-1").pages[0]
+    url = f"/api/pages/{page.id}"
+
+    saved = client.put(url, json={"content_md": "one"}, headers={**admin_headers, "If-Match": '"1"'})
+    assert (saved.status_code, saved.headers["etag"]) == (200, '"2"')
+    stale = client.patch(url, json={"edits": [{"start": 0, "end": 0, "text": "x"}]}, headers={**admin_headers, "If-Match": '"1"'})
+    assert (stale.status_code, stale.headers["etag"]) == (409, '"2"')
+    assert client.patch(url, json={"diff": "@@ -1 +1 @@\n-one\n+two\n"}, headers=admin_headers).status_code == 428
+
+
+def test_page_revisions_and_diff(client, db, make_object, admin_headers):
+    page = make_object("srv-1").pages[0]
+    for text in ("one\ntwo\n", "one\nthree\n"):
+        client.put(f"/api/pages/{page.id}", json={"content_md": text}, headers=admin_headers)
+
+    assert client.get(f"/api/pages/{page.id}/revisions/2").json()["content_md"] == "one\ntwo\n"
+    diff = client.get(f"/api/pages/{page.id}/diff", params={"from": 2, "to": 3}).json()["diff"]
+    assert diff.splitlines()[-2:] == ["-two", "+three"]
+    restored = client.post(f"/api/pages/{page.id}/revisions/2/restore", headers=admin_headers)
+    assert (restored.json()["content_md"], restored.headers["etag"]) == ("one\ntwo\n", '"4"')
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=10-", (10, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=1000-", None),
+        ("bytes=-0", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert downloads.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=5-4", "bytes=-", "bytes=0-1,5-6", "items=0-1", "bytes=a-b"])
+def test_ignored_ranges(header):
+    with pytest.raises(ValueError):
+        downloads.parse_range(header, 1000)
+
+
+def test_upload_and_ranged_download(client, db, make_object, admin_headers):
+    obj = make_object("srv-1")
+    data = bytes(range(256)) * 40
+
+    doc = client.post(
+        f"/api/objects/{obj.id}/documents",
+        data={"title": "dump", "kind": "file"},
+        files={"file": ("dump.bin", data)},
+        headers=admin_headers,
+    ).json()
+
+    url = "/uploads/" + doc["file_path"].split("uploads/", 1)[1]
+    full = client.get(url)
+    assert full.content == data
+    assert full.headers["cache-control"].endswith("immutable")
+    part = client.get(url, headers={"Range": "bytes=100-199"})
+    assert (part.status_code, part.content) == (206, data[100:200])
+    assert client.get(url, headers={"Range": "bytes=99999-"}).status_code == 416
+    ignored = client.get(url, headers={"Range": "bytes=0-1,5-6"})
+    assert (ignored.status_code, ignored.content) == (200, data)
+    assert client.get(url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+
+
+def test_same_bytes_are_stored_once(client, db, make_object, admin_headers):
+    obj = make_object("srv-1")
+
+    def upload(name):
+        return client.post(
+            f"/api/objects/{obj.id}/documents",
+            data={"title": name, "kind": "file"},
+            files={"file": (name, b"%PDF-1.4 same bytes")},
+            headers=admin_headers,
+        ).json()
+
+    docs = [upload(name) for name in ("a.pdf", "a.PDF", "отчёт.bin")]
+
+    assert {Path(doc["file_path"]).name for doc in docs} == {hashlib.sha256(b"%PDF-1.4 same bytes").hexdigest()}
+    pdf = client.get(f"/api/documents/{docs[0]['id']}/file")
+    assert (pdf.headers["content-type"], pdf.headers["content-disposition"]) == ("application/pdf", "inline; filename*=UTF-8''a.pdf")
+    other = client.get(f"/api/documents/{docs[2]['id']}/file")
+    assert other.headers["content-disposition"] == "inline; filename*=UTF-8''%D0%BE%D1%82%D1%87%D1%91%D1%82.bin"
+    assert other.content == b"%PDF-1.4 same bytes"
+    assert client.get(f"/api/documents/{docs[2]['id'] + 1}/file").status_code == 404
+
+
+def test_oversize_upload_is_refused_before_parsing(client, db, make_object, admin_headers, monkeypatch):
+    obj = make_object("srv-1")
+    monkeypatch.setattr(settings, "max_upload_size", 1000)
+    url = f"/api/objects/{obj.id}/documents"
+    form = {"data": {"title": "dump", "kind": "file"}, "files": {"file": ("dump.bin", b"x" * 2000)}, "headers": admin_headers}
+
+    assert client.post(url, **form).status_code == 413
+
+    def chunked():
+        yield b"x" * 600
+        yield b"x" * 600
+
+    response = client.post(url, content=chunked(), headers={**admin_headers, "Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+    assert db.query(models.Document).count() == 0
+
+
+def test_accel_redirect_is_url_quoted(client, monkeypatch):
+    monkeypatch.setattr(settings, "upload_sendfile", "x-accel-redirect")
+    (settings.upload_dir / "план ЦОД 1.txt").write_text("x")
+
+    response = client.get("/uploads/план ЦОД 1.txt")
+
+    assert response.headers["x-accel-redirect"] == "/protected-uploads/%D0%BF%D0%BB%D0%B0%D0%BD%20%D0%A6%D0%9E%D0%94%201.txt"
+
+
+def test_inventory_import_streams_progress(client, db, admin_headers):
+    body = "\n".join(
+        json.dumps({"company": "Acme", "dc": "Main", "type": "server", "name": f"srv-{n}"}) for n in range(3)
+    )
+    response = client.post("/api/inventory/import", content=body, headers={**admin_headers, "Content-Type": "application/x-ndjson"})
+
+    last = json.loads(response.text.strip().splitlines()[-1])
+    assert (last["done"], last["created"]) == (True, 3)
+    assert db.query(models.Object).count() == 3
@@ -0,0 +1,68 @@
+import asyncio
+import gzip
+import json
+
+from app.compression import JSONGZipMiddleware
+
+
+def _run(app, accept="gzip", sent=None):
+    sent = [] if sent is None else sent
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept.encode())]}
+    asyncio.run(JSONGZipMiddleware(app, minimum_size=100)(scope, receive, send))
+    return sent
+
+
+def _json_app(*chunks, on_last=None):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        for n, chunk in enumerate(chunks):
+            last = n == len(chunks) - 1
+            if last and on_last:
+                on_last()
+            await send({"type": "http.response.body", "body": chunk, "more_body": not last})
+
+    return app
+
+
+def test_small_and_large_single_bodies():
+    small = _run(_json_app(b'{"a": 1}'))
+    assert dict(small[0]["headers"])[b"content-length"] == b"8"
+    assert b"content-encoding" not in dict(small[0]["headers"])
+
+    body = json.dumps(list(range(200))).encode()
+    large = _run(_json_app(body))
+    headers = dict(large[0]["headers"])
+    assert (headers[b"content-encoding"], headers[b"vary"]) == (b"gzip", b"Accept-Encoding")
+    assert gzip.decompress(large[1]["body"]) == body
+    assert int(headers[b"content-length"]) == len(large[1]["body"])
+
+
+def test_streamed_body_is_compressed_as_it_goes():
+    # Incompressible chunks, so the compressor has output before the stream ends.
+    chunks = [bytes(range(256)) * 400 + str(n).encode() for n in range(3)]
+    sent, forwarded_early = [], []
+
+    _run(_json_app(*chunks, on_last=lambda: forwarded_early.append(len(sent))), sent=sent)
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    assert forwarded_early[0] > 1
+    assert [m["more_body"] for m in sent[1:]] == [True] * (len(sent) - 2) + [False]
+    assert gzip.decompress(b"".join(m["body"] for m in sent[1:])) == b"".join(chunks)
+
+
+def test_other_types_and_clients_pass_through():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        await send({"type": "http.response.body", "body": b"x" * 500, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    assert [m.get("body") for m in _run(app)[1:]] == [b"x" * 500, b""]
+    assert _run(_json_app(b"y" * 500), accept="identity")[1]["body"] == b"y" * 500
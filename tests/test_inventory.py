@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import crud, inventory, models, schemas, search
+from app.settings import settings
+
+OBJECTS = [
+    {"company": "Acme", "dc": "Main", "type": "server", "name": "db-1", "ip": "10.0.0.1", "tags": "db"},
+    {"company": "Acme", "dc": "Main", "type": "service", "name": "crm", "description": "Многострочное\nописание"},
+    {"company": "Beta", "dc": "Edge", "type": "network", "name": "fw-1", "status": "warn"},
+]
+RELATION = {
+    "record": "relation", "src_company": "Acme", "src_dc": "Main", "src": "crm",
+    "dst_company": "Acme", "dst_dc": "Main", "dst": "db-1", "relation_type": "uses", "note": "",
+}
+
+
+class Trickle(io.StringIO):
+    """Hands out at most ``size`` characters per read, like a slow socket."""
+
+    def __init__(self, text: str, size: int):
+        super().__init__(text)
+        self.size = size
+
+    def read(self, size=-1):
+        return super().read(self.size)
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64 * 1024])
+def test_json_array_decodes_across_read_boundaries(size):
+    records = [{"n": 12345, "s": "a,b]c"}, [1, 2], 3.25, {"nested": {"x": [None, True]}}]
+    text = " [ " + " , ".join(json.dumps(r) for r in records) + " ]\n"
+    assert list(inventory._iter_json_array(Trickle(text, size), buffer_size=size)) == records
+
+
+@pytest.mark.parametrize("text", ["{}", "[1, 2", "[1 2]", "[1,,2]", "[1,]"])
+def test_json_array_errors(text):
+    with pytest.raises(ValueError):
+        list(inventory._iter_json_array(io.StringIO(text), buffer_size=2))
+
+
+def test_csv_records_skip_empty_cells():
+    stream = io.StringIO("company,dc,type,name,ip\nAcme,Main,server,db-1,\n")
+    assert list(inventory.iter_records(stream, "csv")) == [{"company": "Acme", "dc": "Main", "type": "server", "name": "db-1"}]
+
+
+def _import(lines, fmt="ndjson"):
+    body = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines) if fmt == "ndjson" else lines
+    return inventory.import_stream(io.BytesIO(body.encode("utf-8")), fmt)
+
+
+def test_import_upserts_by_company_dc_and_name(db, monkeypatch):
+    monkeypatch.setattr(settings, "import_chunk_size", 2)
+
+    report = _import([*OBJECTS, RELATION, {"type": "server", "name": "no-dc"}, {"record": "zone"}])
+
+    assert (report.records, report.created, report.relations, report.chunks, report.skipped) == (6, 3, 1, 3, 2)
+    assert db.query(models.Page).count() == 3 * len(models.PageSection)
+    assert "crm" in [hit.title for hit in search.search(db, "crm")]
+
+    changed = {**OBJECTS[0], "status": "down"}
+    report = _import([changed, OBJECTS[1], RELATION])
+    assert (report.created, report.updated, report.unchanged, report.relations) == (0, 1, 1, 0)
+    statuses = [o.status for o in crud.list_objects(db, schemas.ObjectFilter(), "name", 10).items]
+    assert statuses == ["ok", "down", "warn"]
+
+
+def test_columns_missing_from_the_source_keep_their_values(db):
+    _import([*OBJECTS[:2], {**OBJECTS[2], "ip": "10.0.0.9", "tags": "edge"}])
+
+    csv_text = "company,dc,type,name,status\nAcme,Main,server,db-1,down\nBeta,Edge,network,fw-1,\nAcme,Main,service,crm,ok\n"
+    report = _import(csv_text, "csv")
+
+    assert (report.updated, report.unchanged) == (1, 2)
+    # Updates in one batch that set different columns.
+    keys = ("company", "dc", "type", "name")
+    report = _import([{**{k: OBJECTS[0][k] for k in keys}, "tags": "pg"}, {**{k: OBJECTS[2][k] for k in keys}, "ip": None}])
+    assert report.updated == 2
+
+    objects = {o.name: o for o in crud.list_objects(db, schemas.ObjectFilter(), "name", 10).items}
+    assert (objects["db-1"].status, objects["db-1"].ip, objects["db-1"].tags) == ("down", "10.0.0.1", "pg")
+    assert (objects["fw-1"].status, objects["fw-1"].ip, objects["fw-1"].tags) == ("warn", None, "edge")
+
+
+def test_import_json_array_with_bom(db):
+    body = "﻿" + json.dumps(OBJECTS)
+    report = inventory.import_stream(io.BytesIO(body.encode("utf-8")), "json")
+    assert report.created == 3
+
+
+def test_export_round_trips(db):
+    _import([*OBJECTS, RELATION])
+    exported = list(inventory.export_records(db))
+
+    assert [r["record"] for r in exported] == ["company", "company", "datacenter", "datacenter", "object", "object", "object", "relation"]
+    assert exported[-1] == RELATION
+
+    report = _import(exported)
+    assert (report.created, report.updated, report.relations, report.skipped) == (0, 0, 0, 0)
+    assert report.unchanged == 3
+
+
+def test_import_progress_reports_bad_input(db):
+    lines = list(inventory.import_progress(io.BytesIO(b'[{"company": "A", "dc": "B", "type": "server", "name": "x"}'), "json"))
+    last = json.loads(lines[-1])
+    assert last["error"] == "Unterminated JSON array"
+    assert not last["done"]
+
+
+def test_import_progress_reports_csv_and_database_errors(db, monkeypatch):
+    huge = b"company,dc,type,name,description\nA,B,server,x," + b"y" * (csv.field_size_limit() + 1) + b"\n"
+    last = json.loads(list(inventory.import_progress(io.BytesIO(huge), "csv"))[-1])
+    assert "field larger than field limit" in last["error"]
+
+    def fail(*args):
+        raise OperationalError("INSERT", {}, Exception("disk full"))
+
+    monkeypatch.setattr(search, "reindex_objects", fail)
+    body = "".join(json.dumps(line) + "\n" for line in OBJECTS).encode()
+    last = json.loads(list(inventory.import_progress(io.BytesIO(body), "ndjson"))[-1])
+    assert (last["error"], last["done"], last["created"]) == ("Database error: disk full", False, 0)
+    assert db.query(models.Object).count() == 0
@@ -0,0 +1,110 @@
+import pytest
+
+from app import crud, models, render, schemas
+
+
+def test_object_details_in_one_statement(db, dc, make_object, statements):
+    a = make_object("a")
+    b = make_object("b")
+    db.add(models.Relation(src_object_id=a.id, dst_object_id=b.id, relation_type="uses"))
+    db.add(models.Document(object_id=a.id, title="runbook", url="https://example.com", kind=models.DocumentKind.link))
+    crud.create_incident(db, a.id, schemas.IncidentCreate(title="down", severity="high"))
+    a_id, b_id = a.id, b.id
+    statements.clear()
+
+    details = crud.get_object_details(db, [b_id, 999, a_id])
+
+    assert len(statements) == 1
+    assert list(details) == [b_id, a_id]
+    detail = details[a_id]
+    assert [p.section for p in detail.pages] == list(models.PageSection)
+    assert [(r.src_object_id, r.dst_object_id) for r in detail.relations] == [(a_id, b_id)]
+    assert [d.title for d in detail.documents] == ["runbook"]
+    assert [i.title for i in detail.incidents] == ["down"]
+    assert details[b_id].relations == []
+
+
+def test_object_detail_sections(db, make_object):
+    obj = make_object("a")
+
+    detail = crud.get_object_detail(db, obj.id, [models.PageSection.overview, models.PageSection.docs])
+
+    assert [p.section for p in detail.pages] == [models.PageSection.overview, models.PageSection.docs]
+    assert detail.documents == []
+    assert detail.model_dump(exclude_unset=True).keys() == {"object", "pages", "documents"}
+    assert crud.get_object_detail(db, obj.id + 1) is None
+
+
+def test_fill_pages(db, make_object, editor):
+    obj = make_object("a")
+    page = obj.pages[0]
+    crud.update_page(db, page.id, "# Title\n\nSome *text*.", editor)
+
+    detail = crud.get_object_detail(db, obj.id, [page.section])
+    render.fill_pages(detail.pages)
+
+    assert detail.pages[0].html == '<h1 id="title">Title</h1>\n<p>Some <em>text</em>.</p>'
+    assert [t.anchor for t in detail.pages[0].toc] == ["title"]
+
+
+@pytest.fixture
+def inventory(db, dc, make_object):
+    for n in range(25):
+        make_object(f"host-{n % 5}", ip=f"10.1.{n}.1", status="warn" if n % 2 else "ok", tags="db, linux" if n % 3 == 0 else "web")
+
+
+def _walk(db, filters, sort, limit):
+    pages, cursor = [], None
+    while True:
+        page = crud.list_objects(db, filters, sort, limit, cursor)
+        pages.append(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("sort", crud.OBJECT_SORTS)
+def test_keyset_pages_cover_every_object_once(db, inventory, sort):
+    pages = _walk(db, schemas.ObjectFilter(), sort, 7)
+
+    assert [len(items) for items in pages] == [7, 7, 7, 4]
+    rows = [(o.name, o.id) if "name" in sort else o.id for items in pages for o in items]
+    assert rows == sorted(rows, reverse=sort.startswith("-"))
+    assert len(set(rows)) == 25
+
+
+def test_list_objects_filters(db, dc, inventory):
+    def names(**filters):
+        return [o.ip for o in crud.list_objects(db, schemas.ObjectFilter(**filters), "id", 100).items]
+
+    assert len(names(status="warn")) == 12
+    assert len(names(tag="db")) == 9
+    assert names(ip_prefix="10.1.1") == ["10.1.1.1", *(f"10.1.{n}.1" for n in range(10, 20))]
+    assert len(names(company_id=dc.company_id, dc_id=dc.id)) == 25
+    assert names(dc_id=dc.id + 1) == []
+
+
+def test_cursor_round_trip():
+    values = ["name", "сервер-1", 42]
+    assert crud.decode_cursor(crud.encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize(
+    "values",
+    [[], ["size", 1], ["name", {"a": 1}, 2], ["name", "x"], ["name", "x", "2"], ["id", [1, 2]], ["id", True], ["-id", 2**70], ["id", 1, 2]],
+)
+def test_cursors_of_the_wrong_shape(values):
+    with pytest.raises(ValueError):
+        crud.decode_cursor(crud.encode_cursor(values))
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", crud.encode_cursor({"id": 1})])
+def test_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_cursor(cursor)
+
+
+def test_cursor_of_another_sort(db, inventory):
+    cursor = crud.list_objects(db, schemas.ObjectFilter(), "name", 5).next_cursor
+    with pytest.raises(ValueError):
+        crud.list_objects(db, schemas.ObjectFilter(), "id", 5, cursor)
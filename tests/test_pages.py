@@ -0,0 +1,108 @@
+import pytest
+
+from app import crud, models, patching, revisions, schemas
+from app.settings import settings
+
+
+@pytest.fixture
+def page(db, make_object):
+    return make_object("srv-1").pages[0]
+
+
+def _texts(n):
+    lines = [f"line {i}\n" for i in range(40)]
+    for version in range(n):
+        lines[version % 40] = f"line {version % 40} edited {version}\n"
+        yield "".join(lines)
+
+
+def test_delta_round_trip():
+    old = "a\nb\nc\nd\n"
+    new = "a\nB\nc\nd\ne\n"
+    ops = revisions.make_delta(old, new)
+    assert revisions.apply_delta(old, ops) == new
+    assert ops == [1, -1, ["B\n"], 2, ["e\n"]]
+
+
+def test_every_revision_rebuilds(db, page, editor, monkeypatch):
+    monkeypatch.setattr(settings, "revision_snapshot_interval", 4)
+    original = page.content_md
+    texts = list(_texts(10))
+    for text in texts:
+        crud.update_page(db, page.id, text, editor)
+
+    listed = revisions.list_revisions(db, page.id, limit=100)
+
+    assert [r["number"] for r in listed] == list(range(11, 0, -1))
+    # Revision 2 replaces the whole default text, so a delta would not be smaller than the snapshot.
+    assert [r["number"] for r in listed if r["snapshot"]] == [10, 6, 2, 1]
+    for number, text in enumerate([original, *texts], start=1):
+        assert revisions.get_revision(db, page.id, number)["content_md"] == text
+    assert revisions.get_revision(db, page.id, 12) is None
+    assert [r["number"] for r in revisions.list_revisions(db, page.id, limit=3, before=5)] == [4, 3, 2]
+
+
+def test_unchanged_text_adds_no_revision(db, page, editor):
+    crud.update_page(db, page.id, page.content_md, editor)
+    assert revisions.list_revisions(db, page.id) == []
+
+
+def test_revision_diff(db, page, editor):
+    crud.update_page(db, page.id, "one\ntwo\n", editor)
+    crud.update_page(db, page.id, "one\nthree\n", editor)
+
+    diff = revisions.diff(db, page.id, 2, 3)
+
+    assert diff.splitlines()[2:] == ["@@ -1,2 +1,2 @@", " one", "-two", "+three"]
+    assert revisions.diff(db, page.id, 2, 9) is None
+
+
+def test_stale_version_is_rejected(db, page, editor):
+    updated = crud.update_page(db, page.id, "first", editor, version=1)
+    assert updated.version == 2
+    with pytest.raises(crud.VersionConflict) as conflict:
+        crud.update_page(db, page.id, "second", editor, version=1)
+    assert conflict.value.version == 2
+    assert db.get(models.Page, page.id).content_md == "first"
+
+
+def test_patch_page_with_edits_and_diff(db, page, editor):
+    crud.update_page(db, page.id, "alpha\nbeta\ngamma\n", editor)
+
+    edited = crud.patch_page(db, page.id, schemas.PagePatch(edits=[{"start": 6, "end": 10, "text": "BETA"}]), editor, 2)
+    assert edited.content_md == "alpha\nBETA\ngamma\n"
+
+    diff = "--- a\n+++ b\n@@ -2,2 +2,2 @@\n BETA\n-gamma\n+delta\n"
+    patched = crud.patch_page(db, page.id, schemas.PagePatch(diff=diff), editor, 3)
+    assert patched.content_md == "alpha\nBETA\ndelta\n"
+
+
+def _edit(start, end, text=""):
+    return schemas.PageEdit(start=start, end=end, text=text)
+
+
+def test_apply_edits():
+    text = "héllo wörld"
+    assert patching.apply_edits(text, [_edit(6, 11, "there"), _edit(0, 1, "H")]) == "Héllo there"
+    assert patching.apply_edits(text, [_edit(5, 5, ",")]) == "héllo, wörld"
+    for edits in ([_edit(0, 3), _edit(2, 4)], [_edit(3, 2)], [_edit(0, 12)]):
+        with pytest.raises(patching.PatchError):
+            patching.apply_edits(text, edits)
+
+
+def test_apply_unified_diff():
+    text = "a\nb\nc\nd\ne\n"
+    diff = "@@ -1,2 +1,2 @@\n-a\n+A\n b\n@@ -5 +5,2 @@\n e\n+f\n"
+    assert patching.apply_unified_diff(text, diff) == "A\nb\nc\nd\ne\nf\n"
+    # Insertion at the top and an empty context line stripped by an editor.
+    assert patching.apply_unified_diff("x\n\ny\n", "@@ -0,0 +1 @@\n+top\n@@ -1,3 +2,3 @@\n x\n\n-y\n+z\n") == "top\nx\n\nz\n"
+    assert patching.apply_unified_diff("a\n", "@@ -1 +1 @@\n-a\n+b\n\\ No newline at end of file\n") == "b"
+
+
+@pytest.mark.parametrize(
+    "diff",
+    ["no hunks here", "@@ -1 +1 @@\n-x\n+y\n", "@@ -9 +9 @@\n-a\n", "@@ bad @@\n", "@@ -1 +1 @@\n?a\n"],
+)
+def test_unified_diff_mismatch(diff):
+    with pytest.raises(patching.PatchError):
+        patching.apply_unified_diff("a\nb\n", diff)
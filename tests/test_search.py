@@ -0,0 +1,36 @@
+from app import crud, models, schemas, search
+
+
+def test_search_objects_pages_and_incidents(db, make_object, editor):
+    obj = make_object("mail-gw", ip="10.9.0.1", tags="exchange")
+    overview = next(page for page in obj.pages if page.section == models.PageSection.overview)
+    crud.update_page(db, overview.id, "Почтовый шлюз принимает почту для домена.", editor)
+    crud.create_incident(db, obj.id, schemas.IncidentCreate(title="Очередь писем растёт", symptom="задержка почты"))
+
+    hits = search.search(db, "почт")
+
+    assert {(hit.kind, hit.object_id) for hit in hits} == {("page", obj.id), ("incident", obj.id)}
+    page_hit = next(hit for hit in hits if hit.kind == "page")
+    assert page_hit.tab == "overview"
+    assert search.SNIPPET_OPEN in page_hit.snippet
+    assert [hit.kind for hit in search.search(db, "exch")] == ["object"]
+
+
+def test_every_word_must_match(db, make_object):
+    make_object("core-switch", tags="network floor2")
+    make_object("edge-switch", tags="network")
+
+    assert [hit.title for hit in search.search(db, "switch floor")] == ["core-switch"]
+    assert search.search(db, "  ***  ") == []
+
+
+def test_index_follows_renames_and_deletes(db, make_object):
+    obj = make_object("old-name")
+    crud.update_object(db, obj.id, schemas.ObjectUpdate(name="new-name"))
+
+    # Page bodies keep the old name in their heading; titles follow the object.
+    assert {hit.title for hit in search.search(db, "old")} == {f"new-name / {section.value}" for section in models.PageSection}
+    assert "new-name" in {hit.title for hit in search.search(db, "new")}
+
+    crud.delete_object(db, obj.id)
+    assert search.search(db, "new") == []
@@ -0,0 +1,157 @@
+import json
+from datetime import datetime, timedelta
+
+from app import crud, inventory, models, schemas, seed
+from app.settings import settings
+
+
+def test_tree_groups_nodes_by_company_dc_and_type(db, dc, make_object, statements):
+    server = make_object("srv-1", ip="10.0.0.1")
+    service = make_object("svc-1", models.ObjectType.service)
+    statements.clear()
+
+    tree = crud.get_tree(db)
+
+    assert len(statements) == 2  # the version and the tree
+    [company] = tree.companies
+    [tree_dc] = company.dcs
+    assert (company.name, tree_dc.id) == ("Acme", dc.id)
+    assert [n.id for n in tree_dc.servers] == [server.id]
+    assert [n.id for n in tree_dc.services] == [service.id]
+    assert tree_dc.network == []
+    assert tree.version == crud.get_tree_version(db)
+
+
+def test_every_tree_write_moves_the_version(db, make_object):
+    versions = [crud.get_tree_version(db)]
+    obj = make_object("srv-1")
+    versions.append(crud.get_tree_version(db))
+    crud.update_object(db, obj.id, schemas.ObjectUpdate(status="warn"))
+    versions.append(crud.get_tree_version(db))
+    crud.delete_object(db, obj.id)
+    versions.append(crud.get_tree_version(db))
+    assert versions == sorted(set(versions))
+
+    # Fields outside the tree do not.
+    obj = make_object("srv-2")
+    version = crud.get_tree_version(db)
+    crud.update_object(db, obj.id, schemas.ObjectUpdate(description="rack 4"))
+    assert crud.get_tree_version(db) == version
+
+
+def test_new_company_and_dc_move_the_version_and_reset_clients(db):
+    version = crud.get_tree_version(db)
+    records = inventory.iter_records(
+        iter(['{"record": "company", "name": "New"}\n', '{"record": "datacenter", "company": "New", "name": "DC"}\n']),
+        "ndjson",
+    )
+    list(inventory.Importer(db).iter_chunks(records))
+
+    assert crud.get_tree_version(db) > version
+    changes = crud.get_tree_changes(db, version)
+    assert changes.reset
+    assert [c.name for c in crud.get_company_summaries(db).root] == ["New"]
+
+
+def test_seeded_objects_are_in_the_change_log(db):
+    count = seed.seed_fixture(db, objects_per_dc=3)
+    db.commit()
+
+    logged = db.query(models.ObjectChange).filter(models.ObjectChange.object_id.isnot(None)).count()
+    assert logged == count == db.query(models.Object).count()
+    assert crud.get_tree_changes(db, 0).reset
+    assert crud.get_tree_version(db) == db.query(models.ObjectChange).count()
+
+
+def test_tree_changes_since_a_version(db, make_object, monkeypatch):
+    monkeypatch.setattr(settings, "tree_change_overlap_seconds", 0)
+    # Not the newest row: SQLite hands out the highest id again after it is deleted.
+    gone = make_object("gone")
+    kept = make_object("kept")
+    since = crud.get_tree_version(db)
+    crud.update_object(db, kept.id, schemas.ObjectUpdate(status="down"))
+    crud.delete_object(db, gone.id)
+    added = make_object("added")
+
+    changes = crud.get_tree_changes(db, since)
+
+    assert not changes.reset
+    assert changes.version == crud.get_tree_version(db)
+    assert {u.node.id: u.node.status for u in changes.upserts} == {kept.id: "down", added.id: "ok"}
+    assert changes.removed == [gone.id]
+    assert crud.get_tree_changes(db, changes.version).upserts == []
+    assert crud.get_tree_changes(db, changes.version + 100).reset
+
+
+def test_changes_committed_late_are_sent_again(db, make_object):
+    obj = make_object("srv-1")
+    make_object("srv-2")
+    # Free an id below the version: the row of a transaction that got its id first and commits last.
+    late_id = db.query(models.ObjectChange).filter_by(object_id=obj.id).one().id
+    db.query(models.ObjectChange).filter_by(id=late_id).delete()
+    db.commit()
+    seen = crud.get_tree_version(db)
+    tree = crud.get_cached_tree(db)
+
+    db.query(models.Object).filter_by(id=obj.id).update({"status": "down"})
+    db.add(models.ObjectChange(id=late_id, object_id=obj.id, dc_id=obj.dc_id, action=models.ChangeAction.changed))
+    db.commit()
+
+    assert crud.get_tree_version(db) == seen
+    changes = crud.get_tree_changes(db, seen)
+    assert [(u.node.id, u.node.status) for u in changes.upserts if u.node.id == obj.id] == [(obj.id, "down")]
+    assert crud.get_cached_tree(db).etag != tree.etag
+
+
+def test_pruned_log_resets_clients_that_are_behind(db, make_object):
+    make_object("srv-1")
+    old = crud.get_tree_version(db)
+    make_object("srv-2")
+    make_object("srv-3")
+    stale = datetime.utcnow() - timedelta(hours=settings.tree_change_retention_hours + 1)
+    db.query(models.ObjectChange).update({"created_at": stale})
+    db.commit()
+    version = crud.get_tree_version(db)
+
+    assert crud.prune_tree_changes(db) == version - 1
+    assert crud.get_tree_version(db) == version
+    assert crud.get_tree_changes(db, old).reset
+    assert not crud.get_tree_changes(db, version).reset
+
+
+def test_cached_tree_follows_the_version(db, make_object):
+    first = crud.get_cached_tree(db)
+    assert crud.get_cached_tree(db) is first
+    make_object("srv-1")
+    second = crud.get_cached_tree(db)
+    assert second.etag != first.etag
+    assert json.loads(second.body)["companies"][0]["dcs"][0]["servers"][0]["name"] == "srv-1"
+
+
+def test_company_summaries_count_nodes_per_group(db, make_object):
+    for n in range(3):
+        make_object(f"srv-{n}")
+    make_object("net-1", models.ObjectType.network)
+
+    [company] = crud.get_company_summaries(db).root
+
+    [summary] = company.dcs
+    assert (summary.servers, summary.network, summary.services) == (3, 1, 0)
+
+
+def test_streamed_datacenter_matches_the_tree(db, dc, make_object):
+    for n in range(5):
+        make_object(f"srv-{n}")
+    make_object("svc-1", models.ObjectType.service)
+    db.commit()
+    version = crud.get_tree_version(db)
+
+    body = json.loads("".join(crud.stream_datacenter(dc.id, dc.name, version, chunk=2)))
+
+    expected = crud.get_tree(db).companies[0].dcs[0].model_dump(mode="json")
+    assert body == {"version": version, **expected}
+
+
+def test_streamed_empty_datacenter(db, dc):
+    body = json.loads("".join(crud.stream_datacenter(dc.id, dc.name, 0)))
+    assert body == {"version": 0, "id": dc.id, "name": "Main", "services": [], "servers": [], "network": []}